@@ -0,0 +1,83 @@
+"""
+Benchmark for XmlFactory.append_rows.
+
+Appends rows with a few attributes and children one path at a time (`factory['rows/row+/...']`
+through a sub-factory per row) and with a single append_rows call from lists and from NumPy arrays
+(if available), reporting the rows per second of each approach and checking that all of them
+produce the same output.
+
+Usage:
+    python benchmarks/bench_append_rows.py [row_count]
+"""
+from __future__ import unicode_literals, print_function
+
+from collections import OrderedDict
+import sys
+import time
+
+from zerotk.xml_factory import NodeBackend, XmlFactory
+
+
+def make_columns(count):
+    return OrderedDict([
+        ('@id', list(range(count))),
+        ('name', ['Row %d' % i for i in range(count)]),
+        ('value', [i * 0.25 for i in range(count)]),
+        ('value@unit', ['m'] * count),
+        ('count', [i % 100 for i in range(count)]),
+    ])
+
+
+def per_path(factory, columns):
+    count = len(columns['@id'])
+    names = list(columns)
+    for i in range(count):
+        row = factory['rows/row+']
+        for i_name in names:
+            row[i_name] = columns[i_name][i]
+
+
+def append_rows(factory, columns):
+    factory.append_rows('rows/row', columns)
+
+
+def append_rows_numpy(factory, columns):
+    import numpy
+
+    factory.append_rows('rows/row', OrderedDict([
+        ('@id', numpy.arange(len(columns['@id']))),
+        ('name', columns['name']),
+        ('value', numpy.array(columns['value'])),
+        ('value@unit', columns['value@unit']),
+        ('count', numpy.array(columns['count'])),
+    ]))
+
+
+def main(count=100000):
+    try:
+        import numpy  # noqa
+    except ImportError:
+        numpy = None
+
+    columns = make_columns(count)
+    approaches = [('per path', per_path), ('append_rows', append_rows)]
+    if numpy is not None:
+        approaches.append(('append_rows numpy', append_rows_numpy))
+
+    print('%d rows' % count)
+    print('%-10s %-20s %10s %14s' % ('backend', 'approach', 'seconds', 'rows/s'))
+    for i_backend in (None, NodeBackend):
+        outputs = []
+        for j_name, j_function in approaches:
+            factory = XmlFactory('root', backend=i_backend)
+            start = time.time()
+            j_function(factory, columns)
+            elapsed = time.time() - start
+            outputs.append(factory.get_contents())
+            print('%-10s %-20s %10.3f %14.0f' % (
+                'Node' if i_backend else 'Element', j_name, elapsed, count / elapsed))
+        assert all(i == outputs[0] for i in outputs), 'Output differs'
+
+
+if __name__ == '__main__':
+    main(*[int(i) for i in sys.argv[1:]])
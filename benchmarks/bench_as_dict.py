@@ -0,0 +1,103 @@
+"""
+Benchmark for XmlFactory.as_dict.
+
+Compares the iterative ElementToDict against the previous recursive recipe (kept here as
+`recursive_as_dict`) on a tree with about 1M nodes, and times the explicit list modes and plain
+dict output.
+
+Usage:
+    python benchmarks/bench_as_dict.py [records]
+"""
+from __future__ import unicode_literals, print_function
+
+from collections import OrderedDict
+from xml.etree import ElementTree
+import sys
+import timeit
+
+from zerotk.xml_factory import XmlFactory
+
+
+def recursive_as_dict(root):
+    """
+    The previous XmlFactory.as_dict implementation.
+    """
+
+    def xml_to_list(aList):
+        result = []
+        for element in aList:
+            if len(element):
+                if len(element) == 1 or element[0].tag != element[1].tag:
+                    result.append(xml_to_dict(element))
+                elif element[0].tag == element[1].tag:
+                    result.append(xml_to_list(element))
+            elif element.text:
+                text = element.text.strip()
+                if text:
+                    result.append(text)
+        return result
+
+    def xml_to_dict(parent_element):
+        def _dict(*values):
+            return OrderedDict(values)
+
+        result = _dict()
+        if parent_element.items():
+            result.update(dict(parent_element.items()))
+        for element in parent_element:
+            if len(element):
+                if len(element) == 1 or element[0].tag != element[1].tag:
+                    aDict = xml_to_dict(element)
+                else:
+                    aDict = _dict((element[0].tag, xml_to_list(element)))
+                if element.items():
+                    aDict.update(dict(element.items()))
+                result.update(_dict((element.tag, aDict)))
+            elif element.items():
+                result.update(_dict((element.tag, OrderedDict(sorted(element.items())))))
+            else:
+                result.update(_dict((element.tag, element.text)))
+        return result
+
+    return xml_to_dict(root)
+
+
+def build(count):
+    """
+    A tree with count * 5 + 2 nodes.
+    """
+    root = ElementTree.Element('root')
+    records = ElementTree.SubElement(root, 'records')
+    for i in range(count):
+        record = ElementTree.SubElement(records, 'record', id=str(i))
+        ElementTree.SubElement(record, 'name').text = 'Record %d' % i
+        ElementTree.SubElement(record, 'value').text = str(i)
+        tags = ElementTree.SubElement(record, 'tags')
+        ElementTree.SubElement(tags, 'tag').text = 'tag'
+    return XmlFactory(root)
+
+
+def timed(function):
+    return min(timeit.repeat(function, number=1, repeat=3))
+
+
+def main(count=200000):
+    factory = build(count)
+    assert recursive_as_dict(factory.root) == factory.as_dict()
+
+    print('%d nodes' % (count * 5 + 2))
+    previous = timed(lambda: recursive_as_dict(factory.root))
+    print('%-40s %10.3f' % ('previous (recursive)', previous))
+    cases = [
+        ('as_dict()', {}),
+        ('as_dict(dict_class=dict)', {'dict_class': dict}),
+        ('as_dict(lists=True)', {'lists': True}),
+        ('as_dict(lists=["record", "tag"])', {'lists': ['record', 'tag']}),
+    ]
+    for i_name, i_kwargs in cases:
+        elapsed = timed(lambda: factory.as_dict(**i_kwargs))
+        print('%-40s %10.3f %7.2fx' % (i_name, elapsed, previous / elapsed))
+
+
+if __name__ == '__main__':
+    main(*[int(i) for i in sys.argv[1:]])
@@ -0,0 +1,66 @@
+"""
+Benchmark for XmlFactory.as_json/write_json.
+
+Compares the previous approach (`json.dumps(factory.as_dict())`) with the streaming encoder
+(`write_json`), reporting time and peak memory (tracemalloc) on top of the tree itself.
+
+Usage:
+    python benchmarks/bench_as_json.py [records]
+"""
+from __future__ import unicode_literals, print_function
+
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from zerotk.xml_factory import XmlFactory
+
+
+class NullStream(object):
+
+    def write(self, text):
+        pass
+
+
+def build(count):
+    factory = XmlFactory('root')
+    for i in range(count):
+        record = factory['records/record+']
+        record['@id'] = i
+        record['name'] = 'Record %d' % i
+        record['value'] = i
+    return factory
+
+
+def measure(function):
+    tracemalloc.start()
+    start = time.time()
+    try:
+        function()
+        return time.time() - start, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main(count=100000):
+    factory = build(count)
+    assert json.dumps(factory.as_dict()) == factory.as_json()
+    assert json.dumps(factory.as_dict(), indent=2) == factory.as_json(indent=2)
+
+    print('%-32s %10s %12s' % ('%d records' % count, 'seconds', 'peak'))
+    cases = [
+        ('json.dumps(as_dict())', lambda: json.dumps(factory.as_dict())),
+        ('write_json (compact)', lambda: factory.write_json(NullStream())),
+        ('write_json (indent=2)', lambda: factory.write_json(NullStream(), indent=2)),
+    ]
+    with open(os.devnull, 'w') as devnull:
+        cases.append(('write_json (file)', lambda: factory.write_json(devnull)))
+        for i_name, i_function in cases:
+            elapsed, peak = measure(i_function)
+            print('%-32s %10.3f %11.1fM' % (i_name, elapsed, peak / 1e6))
+
+
+if __name__ == '__main__':
+    main(*[int(i) for i in sys.argv[1:]])
@@ -0,0 +1,74 @@
+"""
+Benchmark for XmlFactory.awrite.
+
+Serializes a large document inside an asyncio event loop while a ticker task measures the longest
+time the loop was blocked, comparing the synchronous get_contents with awrite (to a writer that
+discards the data).
+
+Usage:
+    python benchmarks/bench_async.py [scale] [chunk_size]
+
+The document is the suite's wide tree, with 1000 records per unit of scale.
+"""
+from __future__ import unicode_literals, print_function
+
+import asyncio
+import sys
+import time
+
+from suite.trees import apply, wide
+from zerotk.xml_factory import XmlFactory
+
+
+class NullWriter(object):
+
+    def write(self, data):
+        pass
+
+    async def drain(self):
+        pass
+
+
+async def measure(serialize):
+    """
+    Returns (total seconds, longest loop block in seconds) of running `serialize` in the loop.
+    """
+    longest = [0.0]
+    done = [False]
+
+    async def ticker():
+        last = time.perf_counter()
+        while not done[0]:
+            await asyncio.sleep(0)
+            now = time.perf_counter()
+            longest[0] = max(longest[0], now - last)
+            last = now
+
+    task = asyncio.ensure_future(ticker())
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    await serialize()
+    elapsed = time.perf_counter() - start
+    done[0] = True
+    await task
+    return elapsed, longest[0]
+
+
+def main(scale=200, chunk_size=64 * 1024):
+    factory = XmlFactory('root')
+    apply(factory, wide(scale))
+
+    async def sync_get_contents():
+        factory.get_contents().encode('utf-8')
+
+    async def awrite():
+        await factory.awrite(NullWriter(), chunk_size=chunk_size)
+
+    print('%-24s %10s %16s' % ('%d records' % (1000 * scale), 'seconds', 'longest block ms'))
+    for i_name, i_serialize in [('get_contents', sync_get_contents), ('awrite (%d)' % chunk_size, awrite)]:
+        elapsed, longest = asyncio.run(measure(i_serialize))
+        print('%-24s %10.3f %16.2f' % (i_name, elapsed, longest * 1000))
+
+
+if __name__ == '__main__':
+    main(*[int(i) for i in sys.argv[1:]])
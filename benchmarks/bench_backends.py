@@ -0,0 +1,49 @@
+"""
+Benchmark for the XmlFactory tree backends.
+
+Builds the same document with ElementTreeBackend and NodeBackend, reporting the build time,
+serialization time and memory (tracemalloc) per node. NodeBackend only takes less memory on
+Python 2.
+
+Usage:
+    python benchmarks/bench_backends.py [records]
+"""
+from __future__ import unicode_literals, print_function
+
+import sys
+import time
+import tracemalloc
+
+from zerotk.xml_factory import ElementTreeBackend, NodeBackend, XmlFactory
+
+
+def build(backend, count):
+    factory = XmlFactory('records', backend=backend)
+    for i in range(count):
+        record = factory['record+']
+        record['@id'] = i
+        record['name'] = 'Record %d' % i
+        record['value'] = i
+        record['flags/enabled']
+    return factory
+
+
+def main(count=200000):
+    nodes = 1 + count * 5
+    print('%-20s %10s %12s %12s' % ('backend', 'build s', 'write s', 'bytes/node'))
+    for i_backend in (ElementTreeBackend, NodeBackend):
+        tracemalloc.start()
+        start = time.time()
+        factory = build(i_backend, count)
+        build_time = time.time() - start
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        start = time.time()
+        factory.get_contents()
+        write_time = time.time() - start
+        print('%-20s %10.3f %12.3f %12.1f' % (i_backend.__name__, build_time, write_time, memory / nodes))
+
+
+if __name__ == '__main__':
+    main(*[int(i) for i in sys.argv[1:]])
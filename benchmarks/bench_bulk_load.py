@@ -0,0 +1,94 @@
+"""
+Benchmark for XmlFactory bulk loading.
+
+Compares building config-sized and report-sized documents with one `factory[path] = value` call
+per value against `XmlFactory.update` (pairs) and `XmlFactory.from_dict` (nested data).
+
+Usage:
+    python benchmarks/bench_bulk_load.py [records]
+"""
+from __future__ import unicode_literals, print_function
+
+from collections import OrderedDict
+import sys
+import timeit
+
+from zerotk.xml_factory import XmlFactory
+
+
+def config_pairs():
+    result = []
+    for i in range(20):
+        section = 'sections/section%d' % i
+        result.append((section + '@enabled', 'true'))
+        for j in range(10):
+            result.append(('%s/options/option%d' % (section, j), 'value %d' % j))
+    return result
+
+
+def config_data():
+    result = OrderedDict()
+    for i in range(20):
+        options = OrderedDict(('option%d' % j, 'value %d' % j) for j in range(10))
+        result['sections/section%d' % i] = OrderedDict([('@enabled', 'true'), ('options', options)])
+    return result
+
+
+def report_data(count):
+    rows = [
+        OrderedDict([('@id', i), ('name', 'Row %d' % i), ('value', i * 0.5)])
+        for i in range(count)
+    ]
+    return {'report/rows/row': rows}
+
+
+def set_items(pairs):
+    factory = XmlFactory('root')
+    for i_path, i_value in pairs:
+        factory[i_path] = i_value
+    return factory
+
+
+def set_rows(count):
+    """
+    The usual way to build the report with __setitem__: keeping the appended row.
+    """
+    factory = XmlFactory('root')
+    for i in range(count):
+        row = factory['report/rows/row+']
+        row['@id'] = i
+        row['name'] = 'Row %d' % i
+        row['value'] = i * 0.5
+    return factory
+
+
+def update(pairs):
+    factory = XmlFactory('root')
+    factory.update(pairs)
+    return factory
+
+
+def timed(function, *args):
+    return min(timeit.repeat(lambda: function(*args), number=1, repeat=5))
+
+
+def main(count=20000):
+    pairs = config_pairs()
+    assert set_items(pairs).get_contents() == update(pairs).get_contents()
+    assert update(pairs).get_contents() == XmlFactory.from_dict('root', config_data()).get_contents()
+
+    rows = report_data(count)
+    expected = set_rows(count).get_contents()
+    assert XmlFactory.from_dict('root', rows).get_contents() == expected
+
+    print('%-24s %12s %12s %12s %9s' % ('document', '__setitem__', 'update', 'from_dict', 'speedup'))
+    config = (timed(set_items, pairs), timed(update, pairs), timed(XmlFactory.from_dict, 'root', config_data()))
+    print('%-24s %12.4f %12.4f %12.4f %8.1fx' % (('config (220 values)',) + config + (config[0] / min(config[1:]),)))
+    # Pairs can't address the row appended by a previous pair, so only from_dict applies here.
+    report = (timed(set_rows, count), timed(XmlFactory.from_dict, 'root', rows))
+    print('%-24s %12.4f %12s %12.4f %8.1fx' % (
+        'report (%d rows)' % count, report[0], '-', report[1], report[0] / report[1]))
+
+
+if __name__ == '__main__':
+    main(*[int(i) for i in sys.argv[1:]])
@@ -0,0 +1,52 @@
+"""
+Benchmark for XmlFactory.get_contents_bytes.
+
+Compares encoding the whole document after rendering it (`get_contents().encode(...)`) against
+get_contents_bytes, which encodes each chunk as it is generated, reporting time and peak memory
+(tracemalloc).
+
+Usage:
+    python benchmarks/bench_bytes.py [scale]
+
+The document is the suite's wide tree, with 1000 records per unit of scale.
+"""
+from __future__ import unicode_literals, print_function
+
+import sys
+import time
+import tracemalloc
+
+from suite.trees import apply, wide
+from zerotk.xml_factory import XmlFactory
+
+
+def measure(function):
+    start = time.time()
+    result = function()
+    elapsed = time.time() - start
+
+    tracemalloc.start()
+    try:
+        function()
+        return result, elapsed, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main(scale=200):
+    factory = XmlFactory('root')
+    apply(factory, wide(scale))
+    print('%-28s %10s %12s' % ('%d records' % (1000 * scale), 'seconds', 'peak'))
+    expected = None
+    for i_name, i_function in [
+        ('get_contents().encode()', lambda: factory.get_contents().encode('utf-8')),
+        ('get_contents_bytes()', lambda: factory.get_contents_bytes()),
+    ]:
+        result, elapsed, peak = measure(i_function)
+        assert expected is None or result == expected
+        expected = result
+        print('%-28s %10.3f %11.1fM' % (i_name, elapsed, peak / 1e6))
+
+
+if __name__ == '__main__':
+    main(*[int(i) for i in sys.argv[1:]])
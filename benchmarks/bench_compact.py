@@ -0,0 +1,46 @@
+"""
+Benchmark for the compact (pretty=False) serialization.
+
+Compares the size and the time of the pretty and compact outputs of XmlFactory.get_contents on
+the suite's wide and deep trees.
+
+Usage:
+    python benchmarks/bench_compact.py [wide_scale] [deep_scale]
+
+The wide tree has 1000 records per unit of scale, the deep tree has 10 chains of 50 levels per
+unit of scale.
+"""
+from __future__ import unicode_literals, print_function
+
+import sys
+import timeit
+
+from suite.trees import apply, deep, wide
+from zerotk.xml_factory import XmlFactory
+
+
+def build(assignments):
+    factory = XmlFactory('root')
+    apply(factory, assignments)
+    return factory
+
+
+def compare(name, factory):
+    pretty = factory.get_contents()
+    compact = factory.get_contents(pretty=False)
+    pretty_time = min(timeit.repeat(lambda: factory.get_contents(), number=1, repeat=3))
+    compact_time = min(timeit.repeat(lambda: factory.get_contents(pretty=False), number=1, repeat=3))
+    print('%-16s %12d %12d %7.1f%% %10.3f %10.3f %7.2fx' % (
+        name, len(pretty), len(compact), 100.0 * (1 - float(len(compact)) / len(pretty)),
+        pretty_time, compact_time, pretty_time / compact_time))
+
+
+def main(wide_scale=200, deep_scale=40):
+    print('%-16s %12s %12s %8s %10s %10s %8s' % (
+        'tree', 'pretty size', 'compact size', 'smaller', 'pretty s', 'compact s', 'speedup'))
+    compare('wide (%d)' % wide_scale, build(wide(wide_scale)))
+    compare('deep (%d)' % deep_scale, build(deep(deep_scale)))
+
+
+if __name__ == '__main__':
+    main(*[int(i) for i in sys.argv[1:]])
@@ -0,0 +1,62 @@
+"""
+Benchmark for XmlFactory.compile.
+
+Compares repeated `factory[path] = value` assignments with a compiled path applied to the factory
+and to the elements directly.
+
+Usage:
+    python benchmarks/bench_compile.py [count]
+"""
+from __future__ import unicode_literals, print_function
+
+import sys
+import timeit
+
+from zerotk.xml_factory import XmlFactory
+
+
+def main(count=100000):
+    def by_name():
+        factory = XmlFactory('root')
+        for i in range(count):
+            item = factory['items/item+']
+            item['price@currency'] = 'USD'
+            item['price'] = i
+        return factory
+
+    def compiled():
+        item = XmlFactory.compile('items/item+')
+        currency = XmlFactory.compile('price@currency')
+        price = XmlFactory.compile('price')
+        factory = XmlFactory('root')
+        for i in range(count):
+            element = item.get(factory)
+            currency.set(element, 'USD')
+            price.set(element, i)
+        return factory
+
+    def compiled_elements():
+        item = XmlFactory.compile('items/item+')
+        currency = XmlFactory.compile('price@currency')
+        price = XmlFactory.compile('price')
+        factory = XmlFactory('root')
+        root = factory.root
+        for i in range(count):
+            element = item.get(root)
+            currency.set(element, 'USD')
+            price.set(element, i)
+        return factory
+
+    expected = by_name().get_contents()
+    print('%-24s %10s %8s' % ('%d items' % count, 'seconds', 'speedup'))
+    base = None
+    functions = [('factory[path]', by_name), ('compiled', compiled), ('compiled (elements)', compiled_elements)]
+    for i_name, i_function in functions:
+        assert i_function().get_contents() == expected
+        elapsed = min(timeit.repeat(i_function, number=1, repeat=3))
+        base = base or elapsed
+        print('%-24s %10.3f %7.2fx' % (i_name, elapsed, base / elapsed))
+
+
+if __name__ == '__main__':
+    main(*[int(i) for i in sys.argv[1:]])
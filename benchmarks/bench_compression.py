@@ -0,0 +1,89 @@
+"""
+Benchmark for the compressed output of XmlFactory.write.
+
+Writes the same document uncompressed, compressed after writing (write, read back and compress:
+the previous approach) and compressed while streaming with each codec and a few levels, reporting
+the time, the throughput (uncompressed MB/s) and the compression ratio of each, and checking that
+every file decompresses to the same XML.
+
+Usage:
+    python benchmarks/bench_compression.py [scale] [gzip_threads]
+
+The document is the suite's wide tree, with 1000 records per unit of scale.
+"""
+from __future__ import unicode_literals, print_function
+
+import bz2
+import gzip
+import lzma
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from suite.trees import apply, wide
+from zerotk.xml_factory import XmlFactory
+
+
+MODULES = {'gzip': gzip, 'bz2': bz2, 'lzma': lzma}
+
+
+def compress_after(factory, filename, compression, level):
+    plain = filename + '.tmp'
+    factory.write(plain, encoding='utf-8', compression=None)
+    with open(plain, 'rb') as iss:
+        level_argument = 'preset' if compression == 'lzma' else 'compresslevel'
+        stream = MODULES[compression].open(filename, 'wb', **{level_argument: level})
+        try:
+            shutil.copyfileobj(iss, stream)
+        finally:
+            stream.close()
+    os.remove(plain)
+
+
+def main(scale=200, gzip_threads=4):
+    factory = XmlFactory('root')
+    apply(factory, wide(scale))
+    expected = factory.get_contents_bytes()
+    size_mb = len(expected) / (1024.0 * 1024.0)
+    print('%d records, %.1f MB' % (1000 * scale, size_mb))
+    print('%-32s %10s %10s %8s' % ('output', 'seconds', 'MB/s', 'ratio'))
+
+    directory = tempfile.mkdtemp()
+    try:
+        cases = [('plain', None, None, None, 1)]
+        for i_compression, i_levels in [('gzip', (1, 6, 9)), ('bz2', (1, 9)), ('lzma', (0, 6))]:
+            for j_level in i_levels:
+                cases.append(('%s %d' % (i_compression, j_level), i_compression, j_level, 'stream', 1))
+            cases.append(('%s %d (after)' % (i_compression, i_levels[0]), i_compression, i_levels[0], 'after', 1))
+        cases.append(('gzip 6 (%d threads)' % gzip_threads, 'gzip', 6, 'stream', gzip_threads))
+
+        for i_name, i_compression, i_level, i_mode, i_threads in cases:
+            filename = os.path.join(directory, 'output.xml')
+            start = time.time()
+            if i_mode == 'after':
+                compress_after(factory, filename, i_compression, i_level)
+            else:
+                factory.write(
+                    filename, encoding='utf-8', compression=i_compression, compression_level=i_level,
+                    compression_threads=i_threads)
+            elapsed = time.time() - start
+
+            if i_compression is None:
+                with open(filename, 'rb') as iss:
+                    contents = iss.read()
+            else:
+                stream = MODULES[i_compression].open(filename, 'rb')
+                contents = stream.read()
+                stream.close()
+            assert contents == expected, 'Output differs: %s' % i_name
+            ratio = len(expected) / float(os.path.getsize(filename))
+            print('%-32s %10.3f %10.1f %8.1f' % (i_name, elapsed, size_mb / elapsed, ratio))
+            os.remove(filename)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main(*[int(i) for i in sys.argv[1:]])
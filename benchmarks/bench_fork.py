@@ -0,0 +1,80 @@
+"""
+Benchmark for XmlFactory.fork.
+
+Creates variants of a base document changing a few paths in each one, with `copy.deepcopy` of the
+tree (previous approach) and with copy-on-write forks, reporting the time and the memory
+allocated per variant (tracemalloc) and checking that both produce the same output.
+
+Usage:
+    python benchmarks/bench_fork.py [scale] [variants]
+
+The base document is a header followed by the suite's wide tree, with 1000 records per unit of
+scale.
+"""
+from __future__ import unicode_literals, print_function
+
+import copy
+import sys
+import time
+import tracemalloc
+
+from suite.trees import apply, wide
+from zerotk.xml_factory import XmlFactory
+
+
+def build(scale):
+    factory = XmlFactory('document')
+    factory['header/title'] = 'Base'
+    factory['header/version'] = '1'
+    apply(factory, wide(scale))
+    return factory
+
+
+def change(variant, i):
+    variant['header/title'] = 'Variant %d' % i
+    variant['header/version'] = str(i)
+    variant['records/record/name'] = 'First record of %d' % i
+
+
+def deep_copies(base, variants):
+    result = []
+    for i in range(variants):
+        variant = XmlFactory(copy.deepcopy(base.root))
+        change(variant, i)
+        result.append(variant)
+    return result
+
+
+def forks(base, variants):
+    result = []
+    for i in range(variants):
+        variant = base.fork()
+        change(variant, i)
+        result.append(variant)
+    return result
+
+
+def measure(function, *args):
+    tracemalloc.start()
+    start = time.time()
+    try:
+        result = function(*args)
+        return result, time.time() - start, tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def main(scale=20, variants=50):
+    base = build(scale)
+    print('%d records, %d variants' % (1000 * scale, variants))
+    print('%-12s %14s %18s' % ('', 'ms/variant', 'KB/variant'))
+    outputs = []
+    for i_name, i_function in [('deepcopy', deep_copies), ('fork', forks)]:
+        result, elapsed, memory = measure(i_function, base, variants)
+        outputs.append([i.get_contents() for i in result[:3]])
+        print('%-12s %14.3f %18.1f' % (i_name, elapsed * 1000 / variants, memory / 1024.0 / variants))
+    assert outputs[0] == outputs[1], 'Output differs'
+
+
+if __name__ == '__main__':
+    main(*[int(i) for i in sys.argv[1:]])
@@ -0,0 +1,48 @@
+"""
+Benchmark for the instrumentation overhead.
+
+Builds and writes a document with the instrumentation disabled (which must cost the same as
+before it existed) and enabled, printing the collected statistics.
+
+Usage:
+    python benchmarks/bench_instrumentation.py [scale]
+
+The document is the suite's wide tree, with 1000 records per unit of scale.
+"""
+from __future__ import unicode_literals, print_function
+
+import sys
+import timeit
+
+from suite.trees import apply, wide
+from zerotk.xml_factory import instrumented, XmlFactory
+
+
+class NullStream(object):
+
+    def write(self, text):
+        pass
+
+
+def run(assignments):
+    factory = XmlFactory('root')
+    apply(factory, assignments)
+    factory.write(NullStream())
+    factory.as_dict()
+
+
+def main(scale=50):
+    assignments = wide(scale)
+    disabled = min(timeit.repeat(lambda: run(assignments), number=1, repeat=3))
+    with instrumented() as stats:
+        enabled = min(timeit.repeat(lambda: run(assignments), number=1, repeat=3))
+    print('%-10s %10s' % ('%d' % len(assignments), 'seconds'))
+    print('%-10s %10.3f' % ('disabled', disabled))
+    print('%-10s %10.3f %+.0f%%' % ('enabled', enabled, (enabled / disabled - 1) * 100))
+    print()
+    for i_name, i_value in sorted(stats.as_dict().items()):
+        print('%-24s %s' % (i_name, i_value))
+
+
+if __name__ == '__main__':
+    main(*[int(i) for i in sys.argv[1:]])
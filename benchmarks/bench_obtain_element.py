@@ -0,0 +1,74 @@
+"""
+Benchmark for XmlFactory path resolution on wide trees.
+
+Builds documents with N siblings under a single parent, doubling N on each round. With the child
+index the time per assignment must stay roughly constant (linear scaling); the `find` column
+shows the previous behavior (Element.find at each level) for comparison.
+
+Usage:
+    python benchmarks/bench_obtain_element.py [max_siblings]
+"""
+from __future__ import unicode_literals, print_function
+
+from collections import OrderedDict
+from xml.etree import ElementTree
+import sys
+import timeit
+
+from zerotk.xml_factory import XmlFactory
+
+
+def build_distinct(count):
+    """
+    Siblings with distinct tags: every assignment resolves a tag not yet in the parent.
+    """
+    factory = XmlFactory('root')
+    for i in range(count):
+        factory['fields/field%d' % i] = i
+    return factory
+
+
+def build_repeated(count):
+    """
+    Repeated siblings interleaved with lookups of a tag that comes after all of them.
+    """
+    factory = XmlFactory('root')
+    for i in range(count):
+        factory['records/record+/name'] = i
+        factory['records/summary@count'] = i + 1
+    return factory
+
+
+def build_distinct_find(count):
+    """
+    Same as `build_distinct` using the previous Element.find based resolution.
+    """
+    root = ElementTree.Element('root', attrib=OrderedDict())
+    for i in range(count):
+        parent = root
+        for i_part in ('fields', 'field%d' % i):
+            result = parent.find(i_part)
+            if result is None:
+                result = ElementTree.SubElement(parent, i_part, attrib=OrderedDict())
+            parent = result
+        parent.text = str(i)
+    return root
+
+
+def main(max_siblings=160000):
+    print('%10s %16s %16s %16s' % ('siblings', 'distinct us/op', 'repeated us/op', 'find us/op'))
+    count = 10000
+    while count <= max_siblings:
+        row = [count]
+        for i_builder in (build_distinct, build_repeated, build_distinct_find):
+            if i_builder is build_distinct_find and count > 40000:
+                row.append(float('nan'))  # Quadratic: too slow for larger sizes.
+                continue
+            elapsed = min(timeit.repeat(lambda: i_builder(count), number=1, repeat=3))
+            row.append(elapsed / count * 1e6)
+        print('%10d %16.2f %16.2f %16.2f' % tuple(row))
+        count *= 2
+
+
+if __name__ == '__main__':
+    main(*[int(i) for i in sys.argv[1:]])
@@ -0,0 +1,63 @@
+"""
+Benchmark for XmlFactory.write(only_if_changed=True).
+
+Writes a document over an existing file always (plain write) and with only_if_changed when the
+file is unchanged, when the first record changed (difference at the start) and when the last one
+changed (difference at the end), reporting the time of each and whether the file was replaced.
+
+Usage:
+    python benchmarks/bench_only_if_changed.py [scale] [repeat]
+
+The document is the suite's wide tree, with 1000 records per unit of scale.
+"""
+from __future__ import unicode_literals, print_function
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from suite.trees import apply, wide
+from zerotk.xml_factory import XmlFactory
+
+
+def build(assignments, first='first', last='last'):
+    factory = XmlFactory('root')
+    apply(factory, assignments)
+    records = factory.root[0]
+    records[0].set('note', first)
+    records[-1].set('note', last)
+    return factory
+
+
+def main(scale=200, repeat=5):
+    directory = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(directory, 'output.xml')
+        assignments = wide(scale)
+        base = build(assignments)
+        cases = [
+            ('write', base, False),
+            ('unchanged', base, True),
+            ('changed at start', build(assignments, first='changed'), True),
+            ('changed at end', build(assignments, last='changed'), True),
+        ]
+        print('%d records' % len(assignments))
+        print('%-20s %10s %10s' % ('case', 'seconds', 'written'))
+        for i_name, i_factory, i_only_if_changed in cases:
+            elapsed = 0.0
+            for _j in range(repeat):
+                base.write(filename, encoding='utf-8')
+                start = time.time()
+                written = i_factory.write(filename, encoding='utf-8', only_if_changed=i_only_if_changed)
+                elapsed += time.time() - start
+            with open(filename, 'rb') as iss:
+                assert iss.read() == i_factory.get_contents_bytes(), 'Output differs: %s' % i_name
+            print('%-20s %10.3f %10s' % (i_name, elapsed / repeat, written))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main(*[int(i) for i in sys.argv[1:]])
@@ -0,0 +1,46 @@
+"""
+Benchmark for the parallel serialization (XmlFactory.write(..., parallel=N)).
+
+Writes the records of the suite's wide tree (many independent children of the same parent)
+serially and with pools of worker processes, checking that the outputs are identical.
+
+Usage:
+    python benchmarks/bench_parallel.py [scale]
+
+The wide tree has 1000 records per unit of scale.
+"""
+from __future__ import unicode_literals, print_function
+
+import multiprocessing
+import sys
+import time
+
+from six import StringIO
+
+from suite.trees import apply, wide
+from zerotk.xml_factory import XmlFactory
+
+
+def measure(factory, parallel):
+    oss = StringIO()
+    start = time.time()
+    factory.write(oss, parallel=parallel)
+    return time.time() - start, oss.getvalue()
+
+
+def main(scale=200):
+    factory = XmlFactory('root')
+    apply(factory, wide(scale))
+    # The records are the children rendered in parallel.
+    factory = factory['records']
+    serial, expected = measure(factory, False)
+    print('%-16s %10s %8s' % ('%d records' % len(factory.root), 'seconds', 'speedup'))
+    print('%-16s %10.3f %8s' % ('serial', serial, '-'))
+    for i_processes in sorted({2, 4, multiprocessing.cpu_count()}):
+        elapsed, obtained = measure(factory, i_processes)
+        assert obtained == expected, 'Output differs with %d processes' % i_processes
+        print('%-16s %10.3f %7.2fx' % ('%d processes' % i_processes, elapsed, serial / elapsed))
+
+
+if __name__ == '__main__':
+    main(*[int(i) for i in sys.argv[1:]])
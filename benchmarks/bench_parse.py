@@ -0,0 +1,58 @@
+"""
+Benchmark for XmlFactory.parse.
+
+Parses a large generated template and patches a few paths near its start, comparing the patch
+time with the parse time (children are only indexed up to the ones the lookups reach). A lookup of
+a missing tag, which has to index every child of the root, is shown for reference.
+
+Usage:
+    python benchmarks/bench_parse.py [records]
+"""
+from __future__ import unicode_literals, print_function
+
+import io
+import os
+import sys
+import tempfile
+import time
+
+from zerotk.xml_factory import ElementTreeBackend, NodeBackend, XmlFactory
+
+
+def generate(filename, count):
+    with io.open(filename, 'w', encoding='utf-8') as oss:
+        oss.write('<template><header><title>Title</title><version>1</version></header>')
+        for i in range(count):
+            oss.write('<record id="%d"><name>Record %d</name><value>%d</value></record>' % (i, i, i))
+        oss.write('<footer/></template>')
+
+
+def main(count=500000):
+    fd, filename = tempfile.mkstemp(suffix='.xml')
+    os.close(fd)
+    try:
+        generate(filename, count)
+        print('%d records, %.1f MB' % (count, os.path.getsize(filename) / 1e6))
+        print('%-20s %10s %10s %12s' % ('backend', 'parse s', 'patch s', 'missing s'))
+        for i_backend in (ElementTreeBackend, NodeBackend):
+            start = time.time()
+            factory = XmlFactory.parse(filename, backend=i_backend)
+            parse_time = time.time() - start
+
+            start = time.time()
+            factory['header/title'] = 'Patched'
+            factory['header/version'] = '2'
+            factory['record/name'] = 'First record'
+            patch_time = time.time() - start
+
+            start = time.time()
+            factory['missing']
+            missing_time = time.time() - start
+
+            print('%-20s %10.3f %10.6f %12.3f' % (i_backend.__name__, parse_time, patch_time, missing_time))
+    finally:
+        os.remove(filename)
+
+
+if __name__ == '__main__':
+    main(*[int(i) for i in sys.argv[1:]])
@@ -0,0 +1,101 @@
+"""
+Benchmark for WritePrettyXMLElement.
+
+Compares the iterative, chunk-joining writer against the previous recursive implementation
+(kept here as `recursive_write`) on deep and wide trees, checking that both produce the same
+output.
+
+Usage:
+    python benchmarks/bench_pretty_xml.py [wide_count] [deep_depth]
+"""
+from __future__ import unicode_literals, print_function
+
+from xml.etree import ElementTree
+import io
+import sys
+import timeit
+
+import six
+
+from zerotk.xml_factory import WritePrettyXMLElement
+
+
+def recursive_write(oss, element, indent=0):
+    """
+    The previous (recursive) WritePrettyXMLElement implementation.
+    """
+    from xml.sax.saxutils import escape
+
+    INDENT = '  '
+
+    oss.write(INDENT * indent + '<%s' % element.tag)
+    for i_name, i_value in sorted(six.iteritems(element.attrib)):
+        oss.write(' %s="%s"' % (i_name, escape(i_value)))
+
+    if len(element) == 0 and element.text is None:
+        oss.write('/>')
+        return
+
+    oss.write('>')
+
+    for i_element in element:
+        oss.write('\n')
+        recursive_write(oss, i_element, indent + 1)
+
+    if element.text is not None:
+        oss.write(escape(element.text))
+
+    if element.text is None:
+        oss.write('\n' + INDENT * indent)
+    oss.write('</%s>' % element.tag)
+
+
+def wide_tree(count):
+    root = ElementTree.Element('records')
+    for i in range(count):
+        record = ElementTree.SubElement(root, 'record', id=str(i), kind='a<b' if i % 7 else 'plain')
+        ElementTree.SubElement(record, 'name').text = 'Record & %d' % i
+        ElementTree.SubElement(record, 'value').text = str(i * 0.5)
+        ElementTree.SubElement(record, 'empty')
+    return root
+
+
+def deep_tree(depth):
+    root = element = ElementTree.Element('level')
+    for i in range(depth):
+        element = ElementTree.SubElement(element, 'level', depth=str(i))
+        ElementTree.SubElement(element, 'leaf').text = str(i)
+    return root
+
+
+def render(writer, element):
+    oss = io.StringIO()
+    writer(oss, element)
+    return oss.getvalue()
+
+
+def compare(name, element):
+    try:
+        expected = render(recursive_write, element)
+    except RuntimeError:  # RecursionError
+        expected = None
+    obtained = render(WritePrettyXMLElement, element)
+    assert expected is None or obtained == expected, 'Output differs for %s' % name
+
+    iterative = min(timeit.repeat(lambda: render(WritePrettyXMLElement, element), number=1, repeat=3))
+    if expected is None:
+        print('%-24s %12s %12.3f %8s' % (name, 'recursion', iterative, '-'))
+    else:
+        recursive = min(timeit.repeat(lambda: render(recursive_write, element), number=1, repeat=3))
+        print('%-24s %12.3f %12.3f %7.2fx' % (name, recursive, iterative, recursive / iterative))
+
+
+def main(wide_count=200000, deep_depth=5000):
+    print('%-24s %12s %12s %8s' % ('tree', 'recursive s', 'iterative s', 'speedup'))
+    compare('wide (%d)' % wide_count, wide_tree(wide_count))
+    compare('deep (500)', deep_tree(500))
+    compare('deep (%d)' % deep_depth, deep_tree(deep_depth))
+
+
+if __name__ == '__main__':
+    main(*[int(i) for i in sys.argv[1:]])
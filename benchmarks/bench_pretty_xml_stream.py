@@ -0,0 +1,76 @@
+"""
+Benchmark for WritePrettyXML.
+
+Generates a large xml file and reformats it with the default (ElementTree.parse) and the streaming
+(iterparse) modes, reporting the throughput (input MB/s) and the peak memory allocated by Python
+for each mode, and checking that both produce the same output.
+
+Usage:
+    python benchmarks/bench_pretty_xml_stream.py [record_count]
+"""
+from __future__ import unicode_literals, print_function
+
+import filecmp
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from zerotk.xml_factory import WritePrettyXML
+
+
+def generate(filename, count):
+    with io.open(filename, 'w', encoding='utf-8') as oss:
+        oss.write('<records>')
+        for i in range(count):
+            oss.write(
+                '<record id="%d" kind="%s"><name>Record &amp; %d</name><value>%s</value>'
+                '<tags><tag>a</tag><tag>b</tag></tags><empty/></record>\n'
+                % (i, 'a&lt;b' if i % 7 else 'plain', i, i * 0.5)
+            )
+        oss.write('</records>')
+
+
+def measure(input_filename, output_filename, streaming):
+    start = time.time()
+    WritePrettyXML(input_filename, output_filename, streaming=streaming)
+    elapsed = time.time() - start
+
+    # Separate run: tracing the allocations slows everything down.
+    tracemalloc.start()
+    WritePrettyXML(input_filename, output_filename, streaming=streaming)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main(record_count=200000):
+    directory = tempfile.mkdtemp()
+    try:
+        input_filename = os.path.join(directory, 'input.xml')
+        generate(input_filename, record_count)
+        size_mb = os.path.getsize(input_filename) / (1024.0 * 1024.0)
+        print('input: %d records, %.1f MB' % (record_count, size_mb))
+        print('%-10s %10s %10s %14s' % ('mode', 'seconds', 'MB/s', 'peak memory MB'))
+
+        outputs = []
+        for i_streaming in (False, True):
+            output_filename = os.path.join(directory, 'output-%s.xml' % i_streaming)
+            elapsed, peak = measure(input_filename, output_filename, i_streaming)
+            outputs.append(output_filename)
+            print('%-10s %10.3f %10.1f %14.1f' % (
+                'streaming' if i_streaming else 'parse',
+                elapsed,
+                size_mb / elapsed,
+                peak / (1024.0 * 1024.0),
+            ))
+        assert filecmp.cmp(outputs[0], outputs[1], shallow=False), 'Output differs'
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main(*[int(i) for i in sys.argv[1:]])
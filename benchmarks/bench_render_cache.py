@@ -0,0 +1,61 @@
+"""
+Benchmark for XmlFactory.enable_render_cache.
+
+Builds a document, then repeatedly changes a few paths and renders it again, with and without the
+render cache, reporting the time per render and checking that both produce the same output.
+
+Usage:
+    python benchmarks/bench_render_cache.py [groups] [renders] [changes_per_render]
+
+Each group holds the suite's wide tree (1000 records), so only the changed groups are rendered
+again with the cache.
+"""
+from __future__ import unicode_literals, print_function
+
+import sys
+import time
+
+from suite.trees import apply, wide
+from zerotk.xml_factory import XmlFactory
+
+
+def build(groups):
+    factory = XmlFactory('document')
+    factory['header/title'] = 'Report'
+    records = wide(1)
+    for i in range(groups):
+        group = factory['groups/group+']
+        group['@id'] = str(i)
+        apply(group, records)
+    return factory
+
+
+def measure(factory, renders, changes):
+    groups = factory['groups']
+    outputs = []
+    start = time.time()
+    for i in range(renders):
+        factory['header/title'] = 'Report %d' % i
+        for j in range(changes):
+            groups['group/records/record/value'] = str(i * changes + j)
+        outputs.append(factory.get_contents())
+    return outputs, time.time() - start
+
+
+def main(groups=100, renders=20, changes=5):
+    print('%d groups of 1000 records, %d renders, %d changes per render' % (groups, renders, changes))
+    print('%-12s %14s' % ('', 'ms/render'))
+    results = []
+    for i_cache in (False, True):
+        factory = build(groups)
+        if i_cache:
+            factory.enable_render_cache()
+            factory.get_contents()  # The first render fills the cache.
+        outputs, elapsed = measure(factory, renders, changes)
+        results.append(outputs)
+        print('%-12s %14.3f' % ('cache' if i_cache else 'no cache', elapsed * 1000 / renders))
+    assert results[0] == results[1], 'Output differs'
+
+
+if __name__ == '__main__':
+    main(*[int(i) for i in sys.argv[1:]])
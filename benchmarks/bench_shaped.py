@@ -0,0 +1,66 @@
+"""
+Benchmark for the shape-specialized pretty xml writer (IterPrettyXMLElementShaped).
+
+Renders record-heavy documents (many siblings with the same structure) and a document without
+repeated structures with the generic writer (IterPrettyXMLElement) and the shaped one, reporting
+the throughput (output MB/s) of each and checking that both produce the same output.
+
+Usage:
+    python benchmarks/bench_shaped.py [record_count]
+"""
+from __future__ import unicode_literals, print_function
+
+import sys
+import time
+
+from zerotk.xml_factory import (
+    IterPrettyXMLElement, IterPrettyXMLElementShaped, NodeBackend, XmlFactory)
+
+
+def build_records(count, backend):
+    factory = XmlFactory('document', backend=backend)
+    records = factory['records']
+    for i in range(count):
+        record = records['record+']
+        record['@id'] = str(i)
+        record['@kind'] = 'a<b' if i % 7 else 'plain'
+        record['name'] = 'Record & %d' % i
+        record['value'] = str(i * 0.5)
+        record['tags/tag'] = 'a'
+        record['tags/tag+'] = 'b'
+        record['empty']
+    return factory
+
+
+def build_irregular(count, backend):
+    factory = XmlFactory('document', backend=backend)
+    for i in range(count):
+        item = factory['items/item%d+' % (i % 13)]
+        item['@id'] = str(i)
+        item['level%d/value' % (i % 5)] = str(i)
+    return factory
+
+
+def measure(function, root):
+    start = time.time()
+    contents = ''.join(function(root))
+    return contents, time.time() - start
+
+
+def main(record_count=100000):
+    print('%d records' % record_count)
+    print('%-22s %-10s %10s %10s' % ('document', 'writer', 'seconds', 'MB/s'))
+    for i_name, i_build in [('records', build_records), ('records (Node)', build_records),
+                            ('irregular', build_irregular)]:
+        factory = i_build(record_count, NodeBackend if 'Node' in i_name else None)
+        outputs = []
+        for j_writer, j_function in [('generic', IterPrettyXMLElement), ('shaped', IterPrettyXMLElementShaped)]:
+            contents, elapsed = measure(j_function, factory.root)
+            outputs.append(contents)
+            size_mb = len(contents) / (1024.0 * 1024.0)
+            print('%-22s %-10s %10.3f %10.1f' % (i_name, j_writer, elapsed, size_mb / elapsed))
+        assert outputs[0] == outputs[1], 'Output differs'
+
+
+if __name__ == '__main__':
+    main(*[int(i) for i in sys.argv[1:]])
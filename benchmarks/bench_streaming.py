@@ -0,0 +1,71 @@
+"""
+Benchmark for XmlStreamFactory.
+
+Generates documents with an increasing number of records with XmlFactory (build, then write) and
+with XmlStreamFactory, reporting time and peak memory (tracemalloc). The streaming peak must not
+grow with the number of records.
+
+Usage:
+    python benchmarks/bench_streaming.py [max_records]
+"""
+from __future__ import unicode_literals, print_function
+
+import os
+import sys
+import time
+import tracemalloc
+
+from zerotk.xml_factory import XmlFactory, XmlStreamFactory
+
+
+def fill(factory, count):
+    for i in range(count):
+        record = factory['record+']
+        record['@id'] = i
+        record['name'] = 'Record %d' % i
+        record['value'] = i
+
+
+def build_and_write(filename, count):
+    factory = XmlFactory('records')
+    fill(factory, count)
+    factory.write(filename)
+
+
+def stream(filename, count):
+    with XmlStreamFactory(filename, 'records') as factory:
+        fill(factory, count)
+
+
+def measure(function, *args):
+    tracemalloc.start()
+    start = time.time()
+    try:
+        function(*args)
+        return time.time() - start, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main(max_records=200000):
+    filename = 'bench_streaming.xml'
+    try:
+        print('%10s %12s %12s %12s %12s' % ('records', 'build s', 'build peak', 'stream s', 'stream peak'))
+        count = 25000
+        while count <= max_records:
+            build_time, build_peak = measure(build_and_write, filename, count)
+            with open(filename) as f:
+                expected = f.read()
+            stream_time, stream_peak = measure(stream, filename, count)
+            with open(filename) as f:
+                assert f.read() == expected
+            print('%10d %12.3f %11.1fM %12.3f %11.1fM' % (
+                count, build_time, build_peak / 1e6, stream_time, stream_peak / 1e6))
+            count *= 2
+    finally:
+        if os.path.exists(filename):
+            os.remove(filename)
+
+
+if __name__ == '__main__':
+    main(*[int(i) for i in sys.argv[1:]])
@@ -0,0 +1,96 @@
+"""
+Microbenchmark for XmlFactory sub-factory allocation.
+
+Counts the XmlFactory instances allocated per assignment (`factory[path] = value`,
+`factory.set(path, value)`), comparing with the previous behavior where each call returned a new
+XmlFactory. Lookups (`factory[path]`) still allocate one XmlFactory each: sub-factories are not
+cached, so the factory holds no reference to the elements it returned.
+
+Usage:
+    python benchmarks/bench_wrappers.py [count]
+"""
+from __future__ import unicode_literals, print_function
+
+import sys
+import timeit
+
+import six
+
+from zerotk.xml_factory import XmlFactory
+from zerotk.xml_factory._xml_factory import _parse_path
+
+
+class PreviousXmlFactory(XmlFactory):
+    """
+    XmlFactory allocating a new wrapper on every __setitem__/__getitem__, as before.
+    """
+
+    def __setitem__(self, name, value):
+        steps, attr_name = _parse_path(name)
+        result = self._obtain_steps(steps)
+        if attr_name is None:
+            result.text = six.text_type(value)
+        else:
+            result.set(attr_name, str(value))
+        return self._wrap(result)
+
+    def __getitem__(self, name):
+        return self._wrap(self._obtain_element(name))
+
+
+class Counter(object):
+    """
+    Counts the sub-factories created (through XmlFactory._wrap).
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __enter__(self):
+        original = self._original = XmlFactory._wrap
+
+        def counting_wrap(factory, element):
+            self.count += 1
+            return original(factory, element)
+
+        XmlFactory._wrap = counting_wrap
+        return self
+
+    def __exit__(self, *args):
+        XmlFactory._wrap = self._original
+
+
+def assign(factory, count):
+    for i in range(count):
+        factory['header/value'] = i
+
+
+def assign_set(factory, count):
+    for i in range(count):
+        factory.set('header/value', i)
+
+
+def lookup(factory, count):
+    for i in range(count):
+        factory['header']['value'] = i
+
+
+def main(count=100000):
+    print('%-28s %16s %12s' % ('operation', 'allocs/op', 'us/op'))
+    cases = [
+        ('previous factory[p] = v', PreviousXmlFactory, assign),
+        ('factory[p] = v', XmlFactory, assign),
+        ('factory.set(p, v)', XmlFactory, assign_set),
+        ('previous factory[p][q] = v', PreviousXmlFactory, lookup),
+        ('factory[p][q] = v', XmlFactory, lookup),
+    ]
+    for i_name, i_class, i_function in cases:
+        factory = i_class('root')
+        with Counter() as counter:
+            i_function(factory, count)
+        elapsed = min(timeit.repeat(lambda: i_function(factory, count), number=1, repeat=3))
+        print('%-28s %16.2f %12.3f' % (i_name, counter.count / float(count), elapsed / count * 1e6))
+
+
+if __name__ == '__main__':
+    main(*[int(i) for i in sys.argv[1:]])
@@ -0,0 +1,69 @@
+"""
+Benchmark for XmlFactory.write peak memory.
+
+Compares the peak memory (tracemalloc) of rendering the whole document to a string and writing
+it at once (previous behavior) against the streamed `write`, for increasing document sizes. The
+streamed peak must not grow with the document.
+
+Usage:
+    python benchmarks/bench_write.py [max_records]
+"""
+from __future__ import unicode_literals, print_function
+
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from zerotk.xml_factory import XmlFactory
+
+
+def build(count):
+    factory = XmlFactory('records')
+    for i in range(count):
+        record = factory['record+']
+        record['@id'] = i
+        record['name'] = 'Record %d' % i
+        record['value'] = i * 0.5
+    return factory
+
+
+def measure(function):
+    tracemalloc.start()
+    start = time.time()
+    try:
+        function()
+        return time.time() - start, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main(max_records=200000):
+    fd, filename = tempfile.mkstemp(suffix='.xml')
+    os.close(fd)
+    try:
+        print('%10s %14s %14s %14s %14s' % ('records', 'string s', 'string peak', 'stream s', 'stream peak'))
+        count = 25000
+        while count <= max_records:
+            factory = build(count)
+
+            def write_string():
+                with io.open(filename, 'w', encoding='utf-8') as f:
+                    f.write(factory.get_contents())
+
+            def write_stream():
+                factory.write(filename, encoding='utf-8')
+
+            string_time, string_peak = measure(write_string)
+            stream_time, stream_peak = measure(write_stream)
+            print('%10d %14.3f %13.1fM %14.3f %13.1fM' % (
+                count, string_time, string_peak / 1e6, stream_time, stream_peak / 1e6))
+            count *= 2
+    finally:
+        os.remove(filename)
+
+
+if __name__ == '__main__':
+    main(*[int(i) for i in sys.argv[1:]])
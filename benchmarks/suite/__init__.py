@@ -0,0 +1,10 @@
+"""
+Benchmark suite for zerotk.xml_factory.
+
+Measures the operations per second and the peak memory of the public entry points (building a tree
+with paths, looking paths up, pretty xml, as_dict and as_json) on generated trees of different
+shapes, storing the results as JSON and comparing them against a baseline.
+
+Usage (from the project root):
+    python -m benchmarks.suite [--output results.json] [--baseline baseline.json] [--threshold 0.1]
+"""
@@ -0,0 +1,44 @@
+"""
+Command line of the benchmark suite: runs it, stores the results and compares them against a baseline.
+"""
+from __future__ import unicode_literals, print_function
+
+import argparse
+import sys
+
+from .runner import compare, load_results, run_suite, save_results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.suite', description=__doc__)
+    parser.add_argument('--output', help='JSON file to store the results.')
+    parser.add_argument('--baseline', help='JSON results file to compare against.')
+    parser.add_argument(
+        '--threshold', type=float, default=0.1,
+        help='Maximum relative slowdown or memory growth before reporting a regression (default: 0.1).')
+    parser.add_argument('--scale', type=int, default=1, help='Size multiplier of the generated trees.')
+    parser.add_argument('--min-time', type=float, default=0.2, help='Minimum seconds per measurement.')
+    parser.add_argument('--repeat', type=int, default=3, help='Measurements per case (the best is kept).')
+    parser.add_argument('cases', nargs='*', help='Cases to run, as "shape.case" (default: all).')
+    options = parser.parse_args(argv)
+
+    results = run_suite(options.scale, options.min_time, options.repeat, set(options.cases))
+    if options.output:
+        save_results(options.output, results, options.scale)
+
+    if options.baseline:
+        baseline = load_results(options.baseline)
+        if baseline['scale'] != options.scale:
+            parser.error('baseline was measured with --scale %d' % baseline['scale'])
+        regressions = compare(results, baseline['results'], options.threshold)
+        if regressions:
+            print('\nREGRESSIONS (threshold %.0f%%):' % (options.threshold * 100))
+            for i_regression in regressions:
+                print('  ' + i_regression)
+            return 1
+        print('\nNo regressions (threshold %.0f%%).' % (options.threshold * 100))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
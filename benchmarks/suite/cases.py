@@ -0,0 +1,95 @@
+"""
+Benchmark cases: the public xml_factory entry points.
+
+Each case receives the assignments of a tree shape and returns a function that runs the entry
+point once and returns the number of operations done (so ops/sec is comparable across shapes).
+"""
+from __future__ import unicode_literals
+
+from zerotk.xml_factory import XmlFactory
+
+from .trees import apply, iter_paths
+
+
+class _NullStream(object):
+
+    def write(self, text):
+        pass
+
+
+def _build(assignments):
+    factory = XmlFactory('root')
+    apply(factory, assignments)
+    return factory
+
+
+def build(assignments):
+    """
+    XmlFactory.__setitem__ (path parsing and _obtain_element): one operation per assignment.
+    """
+    count = len(list(iter_paths(assignments)))
+
+    def run():
+        _build(assignments)
+        return count
+    return run
+
+
+def lookup(assignments):
+    """
+    XmlFactory.__getitem__ on existing elements: one operation per lookup.
+    """
+    factory = _build(assignments)
+    paths = [i_path.replace('+', '').partition('@')[0] for i_path in iter_paths(assignments)]
+    paths = [i_path for i_path in paths if i_path]
+
+    def run():
+        for i_path in paths:
+            factory[i_path]
+        return len(paths)
+    return run
+
+
+def pretty_xml(assignments):
+    """
+    XmlFactory.print_ (WritePrettyXMLElement): one operation per document.
+    """
+    factory = _build(assignments)
+
+    def run():
+        factory.print_(_NullStream())
+        return 1
+    return run
+
+
+def as_dict(assignments):
+    """
+    XmlFactory.as_dict: one operation per document.
+    """
+    factory = _build(assignments)
+
+    def run():
+        factory.as_dict()
+        return 1
+    return run
+
+
+def as_json(assignments):
+    """
+    XmlFactory.write_json (as_json without the final join): one operation per document.
+    """
+    factory = _build(assignments)
+
+    def run():
+        factory.write_json(_NullStream())
+        return 1
+    return run
+
+
+CASES = [
+    ('build', build),
+    ('lookup', lookup),
+    ('pretty_xml', pretty_xml),
+    ('as_dict', as_dict),
+    ('as_json', as_json),
+]
@@ -0,0 +1,112 @@
+"""
+Runs the benchmark cases on each tree shape, stores the results as JSON and compares them against
+a baseline.
+"""
+from __future__ import unicode_literals, print_function
+
+import io
+import json
+import platform
+import time
+import tracemalloc
+
+from zerotk.xml_factory import XmlFactory
+
+from .cases import CASES
+from .trees import apply, SHAPES
+
+
+def measure(run, min_time=0.2, repeat=3):
+    """
+    Returns (ops/sec, peak memory in bytes) of the given case function.
+
+    The function is called repeatedly for at least `min_time` seconds, `repeat` times, and the best
+    rate is kept. The peak memory (tracemalloc) is measured in a separate call, since tracing slows
+    the allocations down.
+    """
+    best = 0.0
+    for _i in range(repeat):
+        ops = 0
+        start = time.perf_counter()
+        while True:
+            ops += run()
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+        best = max(best, ops / elapsed)
+
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def run_suite(scale=1, min_time=0.2, repeat=3, selected=None, report=print):
+    """
+    Runs all the cases (or those named "shape.case" in `selected`).
+
+    :return dict:
+        {"shape.case": {"ops_per_sec": float, "peak_memory": int}}
+    """
+    results = {}
+    for i_shape, i_generator, i_check in SHAPES:
+        assignments = i_generator(scale)
+        factory = XmlFactory('root')
+        apply(factory, assignments)
+        i_check(factory.root, scale)
+        for i_case, i_factory in CASES:
+            name = '%s.%s' % (i_shape, i_case)
+            if selected and name not in selected:
+                continue
+            ops_per_sec, peak = measure(i_factory(assignments), min_time, repeat)
+            results[name] = {'ops_per_sec': ops_per_sec, 'peak_memory': peak}
+            report('%-32s %14.1f ops/s %12.1f KB' % (name, ops_per_sec, peak / 1024.0))
+    return results
+
+
+def save_results(filename, results, scale):
+    data = {
+        'python': platform.python_version(),
+        'scale': scale,
+        'results': results,
+    }
+    with io.open(filename, 'w', encoding='utf-8') as oss:
+        oss.write(json.dumps(data, indent=2, sort_keys=True))
+
+
+def load_results(filename):
+    with io.open(filename, 'r', encoding='utf-8') as iss:
+        return json.load(iss)
+
+
+def compare(results, baseline, threshold):
+    """
+    Compares results against the baseline ones.
+
+    :param float threshold:
+        Maximum relative slowdown (ops/sec) or memory growth accepted, ie. 0.1 for 10%.
+
+    :return list(unicode):
+        Description of each regression found.
+    """
+    regressions = []
+    for i_name, i_base in sorted(baseline.items()):
+        current = results.get(i_name)
+        if current is None:
+            continue
+        ratio = current['ops_per_sec'] / i_base['ops_per_sec']
+        if ratio < 1.0 - threshold:
+            regressions.append(
+                '%s: %.1f ops/s, %.0f%% slower than %.1f ops/s' % (
+                    i_name, current['ops_per_sec'], (1.0 - ratio) * 100, i_base['ops_per_sec']))
+        if i_base['peak_memory'] and current['peak_memory'] > i_base['peak_memory'] * (1.0 + threshold):
+            regressions.append(
+                '%s: peak memory %d bytes, %.0f%% more than %d bytes' % (
+                    i_name,
+                    current['peak_memory'],
+                    (current['peak_memory'] / float(i_base['peak_memory']) - 1.0) * 100,
+                    i_base['peak_memory']))
+    return regressions
@@ -0,0 +1,135 @@
+"""
+Generators of realistic tree shapes, as lists of (path, value) assignments for XmlFactory.
+
+A value may also be a list of (path, value) assignments relative to the element of the path: they
+are made through the sub-factory `factory[path]`, the way repeated records are filled (a later
+"records/record/name" path would find the first record, not the one just appended).
+
+Each shape has a check function asserting that the assignments build the intended tree.
+"""
+from __future__ import unicode_literals
+
+
+def apply(factory, assignments):
+    """
+    Makes the given assignments on factory.
+    """
+    for i_path, i_value in assignments:
+        if isinstance(i_value, list):
+            element = factory[i_path]
+            for j_path, j_value in i_value:
+                element[j_path] = j_value
+        else:
+            factory[i_path] = i_value
+
+
+def iter_paths(assignments):
+    """
+    Yields the path of each assignment, from the root (relative assignments are joined to the path
+    of their element, without the "+").
+    """
+    for i_path, i_value in assignments:
+        if isinstance(i_value, list):
+            prefix = i_path.replace('+', '')
+            for j_path, _j_value in i_value:
+                yield prefix + ('' if j_path.startswith('@') else '/') + j_path
+        else:
+            yield i_path
+
+
+def wide(scale):
+    """
+    Many small sibling records under the same parent (ie. rows of a report).
+    """
+    result = []
+    for i in range(1000 * scale):
+        result.append(('records/record+', [
+            ('name', 'Record %d' % i),
+            ('value', str(i)),
+            ('status', 'active' if i % 3 else 'inactive'),
+        ]))
+    return result
+
+
+def check_wide(root, scale):
+    records = root.find('records')
+    assert len(root) == 1 and len(records) == 1000 * scale
+    for i, i_record in enumerate(records):
+        assert [j.tag for j in i_record] == ['name', 'value', 'status']
+        assert i_record[1].text == str(i)
+
+
+def deep(scale):
+    """
+    Nested chains of elements, with a leaf at each level.
+    """
+    result = []
+    depth = 50 * scale
+    for i_chain in range(10):
+        path = 'chain%d' % i_chain
+        for i_level in range(depth):
+            path += '/level'
+            result.append((path + '/leaf', '%d.%d' % (i_chain, i_level)))
+    return result
+
+
+def check_deep(root, scale):
+    assert len(root) == 10
+    depth = 50 * scale
+    for i_chain, i_element in enumerate(root):
+        assert [j.tag for j in i_element] == ['level']
+        level = i_element[0]
+        for i_level in range(depth):
+            assert [j.tag for j in level] == ['leaf', 'level'] if i_level < depth - 1 else ['leaf']
+            assert level[0].text == '%d.%d' % (i_chain, i_level)
+            level = level[-1]
+
+
+def attribute_heavy(scale):
+    """
+    Elements with many attributes (and values that need escaping).
+    """
+    result = []
+    for i in range(200 * scale):
+        attributes = [('@id', str(i))]
+        for i_attribute in range(10):
+            attributes.append(('@attribute%d' % i_attribute, 'value <%d> & "%d"' % (i_attribute, i)))
+        result.append(('items/item+', attributes))
+    return result
+
+
+def check_attribute_heavy(root, scale):
+    items = root.find('items')
+    assert len(root) == 1 and len(items) == 200 * scale
+    for i, i_item in enumerate(items):
+        assert len(i_item) == 0 and len(i_item.keys()) == 11
+        assert i_item.get('id') == str(i)
+        assert i_item.get('attribute9') == 'value <9> & "%d"' % i
+
+
+def text_heavy(scale):
+    """
+    Few elements with long texts (and characters that need escaping).
+    """
+    paragraph = ' '.join(['Lorem ipsum & dolor <sit> amet'] * 40)
+    result = []
+    for i in range(100 * scale):
+        result.append(('chapters/chapter+', [('title', 'Chapter %d' % i)] + [('paragraph+', paragraph)] * 5))
+    return result
+
+
+def check_text_heavy(root, scale):
+    chapters = root.find('chapters')
+    assert len(root) == 1 and len(chapters) == 100 * scale
+    for i, i_chapter in enumerate(chapters):
+        assert [j.tag for j in i_chapter] == ['title'] + ['paragraph'] * 5
+        assert i_chapter[0].text == 'Chapter %d' % i
+
+
+# (name, generator, check)
+SHAPES = [
+    ('wide', wide, check_wide),
+    ('deep', deep, check_deep),
+    ('attribute_heavy', attribute_heavy, check_attribute_heavy),
+    ('text_heavy', text_heavy, check_text_heavy),
+]
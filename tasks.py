@@ -20,6 +20,19 @@ def test(ctx):
     ctx.run("python setup.py pytest")
 
 
+@invoke.task
+def benchmark(ctx, baseline=None, output=None):
+    """
+    Executes the benchmark suite, optionally comparing it against a baseline results file.
+    """
+    args = []
+    if baseline:
+        args.append('--baseline %s' % baseline)
+    if output:
+        args.append('--output %s' % output)
+    ctx.run("python -m benchmarks.suite %s" % ' '.join(args))
+
+
 @invoke.task
 def travis_setpass(ctx):
     """
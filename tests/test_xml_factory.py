@@ -1,10 +1,19 @@
+# -*- coding: utf-8 -*-
 from __future__ import unicode_literals, absolute_import, print_function
+from collections import OrderedDict
 from six import StringIO
 from xml.etree import ElementTree
+import io
+import weakref
 
 from zerotk.string import dedent
-from zerotk.xml_factory import WritePrettyXML, WritePrettyXMLElement, XmlFactory
+from zerotk.xml_factory import (
+    ClearEscapeCache, disable_instrumentation, ElementTreeBackend, enable_instrumentation, EscapeText,
+    GetEscapeCacheInfo, instrumented, IterCompactXMLElement, IterPrettyXMLElement, IterPrettyXMLElementShaped, Node,
+    NodeBackend, ParallelGzipWriter, WritePrettyXML, WritePrettyXMLElement, XmlFactory, XmlStreamFactory)
+from zerotk.xml_factory._render_cache import _JoinFragment
 import pytest
+import six
 
 
 class TestXmlFactory(object):
@@ -190,6 +199,972 @@ class TestXmlFactory(object):
             == dedent(self.test_trigger_class.__doc__)
         )
 
+    def test_direct_tree_edits(self):
+        '''
+        <root>
+          <alpha>Alpha</alpha>
+          <bravo>Bravo</bravo>
+          <alpha>Charlie</alpha>
+          <delta>Delta</delta>
+        </root>
+        '''
+        factory = XmlFactory('root')
+        factory['alpha'] = 'first'
+        factory['bravo'] = 'Bravo'
+
+        # Edits made directly in the ElementTree must be seen by the factory.
+        factory.root.remove(factory.root.find('alpha'))
+        factory['alpha'] = 'removed'
+        ElementTree.SubElement(factory.root, 'delta')
+        factory.root.insert(0, ElementTree.Element('alpha'))
+        factory['alpha'] = 'Alpha'
+        factory['alpha+'] = 'ignored'
+        factory.root.remove(factory.root[-1])
+        factory.root[2].text = 'Charlie'
+        factory['delta'] = 'Delta'
+        factory['.'].root.set('name', 'root')
+        del factory.root.attrib['name']
+
+        assert (
+            factory.get_contents()
+            == dedent(self.test_direct_tree_edits.__doc__)
+        )
+
+    def test_clear_index(self):
+        from zerotk.xml_factory._child_index import SCAN_LIMIT
+
+        def Edit(root, case):
+            if case == 'replace':
+                root[3] = root.makeelement('target', {})
+            elif case == 'rename':
+                root[7].tag = 'target'
+            else:
+                root.remove(root[4])
+                root.insert(6, root.makeelement('target', {}))
+
+        for i_backend in (ElementTreeBackend, NodeBackend):
+            for i_case in ('replace', 'rename', 'move'):
+                factory = XmlFactory('root', backend=i_backend)
+                for i in range(SCAN_LIMIT + 12):
+                    factory['item%d' % i] = i
+                factory['item19']  # Indexes all children.
+
+                # These edits keep the number of children and the first/last child.
+                Edit(factory.root, i_case)
+                factory.clear_index()
+                factory['target'] = 'Target'
+                assert len(factory.root) == SCAN_LIMIT + 12
+                assert [i.text for i in factory.root.findall('target')] == ['Target']
+
+        # The index doesn't keep indexed parents removed directly from the tree alive.
+        factory = XmlFactory('root')
+        for i in range(SCAN_LIMIT + 12):
+            factory['group/item%d' % i] = i
+        factory['group/item19']
+        removed = weakref.ref(factory.root[0])
+        removed_child = weakref.ref(factory.root[0][-1])
+        factory.root.remove(factory.root[0])
+        factory['group/item0'] = 'new'
+        assert removed() is None
+        assert removed_child() is None
+
+    def test_write(self, tmpdir):
+        '''
+        <root>
+          <name>Ação</name>
+          <items>
+            <item>0</item>
+            <item>1</item>
+            <item>2</item>
+          </items>
+        </root>
+        '''
+        factory = XmlFactory('root')
+        factory['name'] = 'Ação'
+        for i in range(3):
+            factory['items/item+'] = i
+        expected = dedent(self.test_write.__doc__)
+
+        filename = str(tmpdir.join('output.xml'))
+        factory.write(filename, encoding='utf-8', buffer_size=8)
+        with io.open(filename, 'r', encoding='utf-8') as f:
+            assert f.read() == expected
+
+        oss = io.BytesIO()
+        factory.write(oss, encoding='latin-1', buffer_size=8)
+        assert oss.getvalue() == expected.encode('latin-1')
+
+        oss = io.BytesIO()
+        factory.write(oss, xml_header=True)
+        assert oss.getvalue() == ('<?xml version="1.0" encoding="utf-8" ?>\n' + expected).encode('utf-8')
+
+        factory.write(filename, xml_header=True, encoding='ascii')
+        with io.open(filename, 'rb') as f:
+            contents = f.read()
+        assert contents == (
+            b'<?xml version="1.0" encoding="ascii" ?>\n' + expected.replace('Ação', 'A&#231;&#227;o').encode())
+        assert ElementTree.fromstring(contents).find('name').text == 'Ação'
+
+        assert factory.get_contents_bytes() == expected.encode('utf-8')
+        assert factory.get_contents_bytes(xml_header=True, encoding='latin-1') == \
+            ('<?xml version="1.0" encoding="latin-1" ?>\n' + expected).encode('latin-1')
+
+        oss = io.StringIO()
+        factory.write(oss)
+        assert oss.getvalue() == expected
+
+    def test_node_backend(self):
+        '''
+        <root>
+          <alpha one="1" two="2">Alpha</alpha>
+          <components>
+            <component>
+              <name>Alpha</name>
+            </component>
+            <component>
+              <name>Bravo</name>
+            </component>
+          </components>
+          <empty/>
+        </root>
+        '''
+        expected = dedent(self.test_node_backend.__doc__)
+        factories = [XmlFactory('root'), XmlFactory('root', backend=NodeBackend), XmlFactory(Node('root'))]
+        for i_factory in factories:
+            i_factory['alpha'] = 'Alpha'
+            i_factory['alpha@two'] = '2'
+            i_factory['alpha@one'] = '1'
+            i_factory['components/component+/name'] = 'Alpha'
+            i_factory['components/component+/name'] = 'Bravo'
+            i_factory['empty']
+            assert i_factory.get_contents() == expected
+        element_factory, node_factory, _ = factories
+        assert isinstance(node_factory.root, Node)
+        assert isinstance(node_factory['components'].root, Node)
+        assert node_factory.as_dict() == element_factory.as_dict()
+        assert node_factory.as_json() == element_factory.as_json()
+
+        # Node implements the Element interface used by ElementTree.
+        node = node_factory.root
+        assert node.find('components/component/name').text == 'Alpha'
+        assert [i.text for i in node.iter('name')] == ['Alpha', 'Bravo']
+        assert node.find('alpha').get('one') == '1'
+        assert (
+            ElementTree.tostring(ElementTree.ElementTree(node).getroot())
+            == ElementTree.tostring(node.to_element())
+            == ElementTree.tostring(element_factory.root)
+        )
+
+        with pytest.raises(TypeError):
+            XmlFactory(Node('root'), backend=ElementTreeBackend)
+
+    def test_update(self):
+        '''
+        <root version="1.0">
+          <alpha class="CLS">
+            <bravo>XXX</bravo>
+          </alpha>
+          <items>
+            <item>1</item>
+            <item>2</item>
+            <item name="three">
+              <value>3</value>
+            </item>
+          </items>
+          <empty/>
+        </root>
+        '''
+        expected = dedent(self.test_update.__doc__)
+        pairs = [
+            ('@version', '1.0'),
+            ('alpha/bravo', 'XXX'),
+            ('alpha@class', 'CLS'),
+            ('items/item+', 1),
+            ('items/item+', 2),
+            ('items/item+@name', 'three'),
+            ('items/item[3]/value', 3),
+            ('empty', None),
+        ]
+
+        factory = XmlFactory('root')
+        for i_path, i_value in pairs:
+            if i_value is None:
+                factory[i_path]
+            else:
+                factory[i_path] = i_value
+        assert factory.get_contents() == expected
+
+        factory = XmlFactory('root')
+        factory.update(pairs)
+        assert factory.get_contents() == expected
+
+        factory = XmlFactory.from_dict('root', OrderedDict([
+            ('@version', '1.0'),
+            ('alpha', OrderedDict([('bravo', 'XXX'), ('@class', 'CLS')])),
+            ('items/item', [1, 2, OrderedDict([('@name', 'three'), ('value', 3)])]),
+            ('empty', None),
+        ]), backend=NodeBackend)
+        assert isinstance(factory.root, Node)
+        assert factory.get_contents() == expected
+
+    def test_compile(self):
+        '''
+        <root>
+          <items>
+            <item>
+              <price currency="USD">1</price>
+            </item>
+            <item>
+              <price currency="EUR">2</price>
+            </item>
+          </items>
+        </root>
+        '''
+        price = XmlFactory.compile('items/item+/price@currency')
+        assert repr(price) == "CompiledPath('items/item+/price@currency')"
+        factory = XmlFactory('root')
+        for i_currency in ('USD', 'EUR'):
+            price.set(factory, i_currency)
+        value = XmlFactory.compile('items/item/price')
+        assert value.get(factory).root is factory['items/item/price'].root
+        value.set(factory, 1)
+        XmlFactory.compile('price').set(factory['items'].root[1], 2)
+        assert factory.get_contents() == dedent(self.test_compile.__doc__)
+
+        # Elements are looked up and created directly.
+        element = ElementTree.Element('root')
+        child = XmlFactory.compile('alpha/bravo').get(element)
+        assert child is element.find('alpha/bravo')
+        XmlFactory.compile('alpha/bravo+').set(element, 'second')
+        assert [i.text for i in element.findall('alpha/bravo')] == [None, 'second']
+
+        node = Node('root')
+        XmlFactory.compile('alpha@name').set(node, 'Alpha')
+        assert XmlFactory.compile('alpha').get(node).get('name') == 'Alpha'
+
+        with pytest.raises(AssertionError):
+            price.get(factory)
+
+    def test_set(self):
+        '''
+        <root>
+          <alpha class="CLS">Alpha</alpha>
+          <items>
+            <item>1</item>
+            <item>2</item>
+          </items>
+        </root>
+        '''
+        factory = XmlFactory('root')
+        assert factory.set('alpha', 'Alpha') is None
+        factory.set('alpha@class', 'CLS')
+
+        items = factory['items']
+        assert factory['items'].root is items.root
+        assert items['item'].root is factory['items/item'].root
+        assert factory['items/item+'].root is not factory['items/item+'].root
+        factory['items/item'] = 1
+        factory['items/item[2]'] = 2
+        removed = weakref.ref(factory['items/item[3]'].root)
+        factory.root.find('items').remove(factory.root.find('items')[-1])
+
+        assert factory.get_contents() == dedent(self.test_set.__doc__)
+        # The factory keeps no reference to the elements removed from the tree.
+        assert removed() is None
+
+    def test_as_dict_options(self):
+        factory = XmlFactory('root')
+        factory['@version'] = '1'
+        factory['alpha'] = 'Alpha'
+        factory['alpha@class'] = 'CLS'
+        factory['single/item'] = 'one'
+        factory['items/item+'] = 'a'
+        factory['items/item+'] = 'b'
+        factory['items/other'] = 'c'
+
+        # The original heuristic only looks at the first two children.
+        assert factory.as_dict() == {
+            'version': '1',
+            'alpha': {'class': 'CLS'},
+            'single': {'item': 'one'},
+            'items': {'item': ['a', 'b', 'c']},
+        }
+
+        assert factory.as_dict(dict_class=dict, attr_prefix='@', lists=True) == {
+            '@version': '1',
+            'alpha': {'@class': 'CLS', '#text': 'Alpha'},
+            'single': {'item': 'one'},
+            'items': {'item': ['a', 'b'], 'other': 'c'},
+        }
+        assert type(factory.as_dict(dict_class=dict, lists=True)['items']) is dict
+
+        assert factory.as_dict(attr_prefix='-', lists=['item'], text_key='text') == {
+            '-version': '1',
+            'alpha': {'-class': 'CLS', 'text': 'Alpha'},
+            'single': {'item': ['one']},
+            'items': {'item': ['a', 'b'], 'other': 'c'},
+        }
+
+        # No recursion limit.
+        import sys
+        factory = XmlFactory('root')
+        factory['/'.join(['level'] * (sys.getrecursionlimit() + 100))] = 'bottom'
+        result = factory.as_dict()
+        while isinstance(result, dict):
+            result = result['level']
+        assert result == 'bottom'
+
+    def test_as_json(self):
+        import json
+
+        factory = XmlFactory('root')
+        factory['@version'] = '1'
+        factory['alpha'] = 'Ação'
+        factory['items/item+'] = 'a'
+        factory['items/item+'] = 'b'
+        factory['empty/one']
+        factory['empty/two']
+
+        assert factory.as_json(indent=2) == json.dumps(factory.as_dict(), indent=2) == dedent(
+            '''
+            {
+              "version": "1",
+              "alpha": "A\\u00e7\\u00e3o",
+              "items": {
+                "item": [
+                  "a",
+                  "b"
+                ]
+              },
+              "empty": {
+                "one": null,
+                "two": null
+              }
+            }
+            '''
+        )
+        options = dict(attr_prefix='@', lists=True, ensure_ascii=False)
+        assert factory.as_json(**options) == (
+            '{"@version": "1", "alpha": "Ação", "items": {"item": ["a", "b"]}, "empty": {"one": null, "two": null}}'
+        )
+
+        oss = StringIO()
+        factory.write_json(oss, **options)
+        assert oss.getvalue() == factory.as_json(**options)
+
+        # Explicit lists are streamed from the children, even when interleaved with other tags.
+        factory = XmlFactory('root')
+        factory['@item'] = 'attribute'
+        factory['item+'] = 'a'
+        factory['other+/name'] = 'x'
+        factory['item+/name'] = 'b'
+        factory['single'] = 'one'
+        factory['item+'] = 'c'
+        factory['other+'] = 'y'
+        for i_lists in (True, ['item', 'single'], ['missing']):
+            assert factory.as_json(lists=i_lists) == json.dumps(factory.as_dict(lists=i_lists))
+        assert json.loads(factory.as_json(lists=True)) == {
+            'item': ['a', {'name': 'b'}, 'c'],
+            'other': [{'name': 'x'}, 'y'],
+            'single': 'one',
+        }
+
+    def test_stream_factory(self):
+        '''
+        <?xml version="1.0" ?>
+        <records count="3">
+          <header>Header</header>
+          <record id="0">
+            <name>Alpha</name>
+            <value>0</value>
+          </record>
+          <record id="1">
+            <name>Bravo</name>
+            <value>1</value>
+          </record>
+          <record id="2">
+            <name>Charlie</name>
+            <value>2</value>
+          </record>
+          <footer/>
+        </records>
+        '''
+        expected = dedent(self.test_stream_factory.__doc__)
+        oss = StringIO()
+        with XmlStreamFactory(oss, 'records', xml_header=True) as factory:
+            factory['@count'] = 3
+            factory['header'] = 'Header'
+            for i, i_name in enumerate(['Alpha', 'Bravo', 'Charlie']):
+                record = factory['record+']
+                record['@id'] = i
+                factory['record/name'] = i_name
+                record['value'] = i
+                # Only the current record is kept in memory.
+                assert len(factory.root) == 1
+            factory['footer']
+
+            with pytest.raises(RuntimeError):
+                factory['@late'] = 'attribute'
+        assert oss.getvalue() == expected
+
+        # Paths resolve against the children not written yet: "record" is the current record, not
+        # the first one as in a XmlFactory.
+        def Fill(factory):
+            for i in range(3):
+                factory['record+/name'] = i
+                factory['record/value'] = i
+
+        oss = StringIO()
+        with XmlStreamFactory(oss, 'records') as factory:
+            Fill(factory)
+        assert [i.findtext('value') for i in ElementTree.fromstring(oss.getvalue())] == ['0', '1', '2']
+        factory = XmlFactory('records')
+        Fill(factory)
+        assert [i.findtext('value') for i in factory.root] == ['2', None, None]
+
+        # Steps resolving to the root itself don't change the current child.
+        oss = StringIO()
+        with XmlStreamFactory(oss, 'records') as factory:
+            factory['record+']
+            factory['./record/name'] = 'a'
+            factory['.']
+            factory['./.@count'] = 1
+            assert len(factory.root) == 1
+            factory['record+/name'] = 'b'
+        assert oss.getvalue() == (
+            '<records count="1">\n'
+            '  <record>\n    <name>a</name>\n  </record>\n'
+            '  <record>\n    <name>b</name>\n  </record>\n'
+            '</records>')
+
+        oss = io.BytesIO()
+        with XmlStreamFactory(oss, 'records', backend=NodeBackend) as factory:
+            pass
+        assert oss.getvalue() == b'<records/>'
+
+    def test_parallel(self, tmpdir, monkeypatch):
+        factory = XmlFactory('root')
+        factory['@b'] = '2'
+        factory['@a'] = '<1>'
+        for i in range(20):
+            factory['record+@id'] = str(i)
+            factory['record/name'] = 'Name & %d' % i
+            factory['record/empty']
+        expected = factory.get_contents(xml_header=True)
+
+        assert factory.get_contents(xml_header=True, parallel=2) == expected
+        filename = str(tmpdir / 'parallel.xml')
+        factory.write(filename, xml_header=True, encoding='utf-8', parallel=True)
+        assert io.open(filename, 'rb').read() == factory.get_contents_bytes(xml_header=True)
+
+        # More chunks than the ones submitted at a time.
+        from zerotk.xml_factory import _parallel
+        monkeypatch.setattr(_parallel, 'MAX_CHUNK_CHILDREN', 1)
+        assert factory.get_contents(xml_header=True, parallel=2) == expected
+        monkeypatch.undo()
+
+        # Root text and Node trees (pickled where the workers can't be forked).
+        factory = XmlFactory('root', backend=NodeBackend)
+        factory['alpha+'] = 'Alpha'
+        factory['alpha+/bravo'] = 'Bravo'
+        factory.root.text = 'text'
+        assert factory.get_contents(parallel=2) == factory.get_contents()
+
+        # Serial for a single child.
+        factory = XmlFactory('root')
+        factory['alpha/bravo'] = 'Bravo'
+        assert factory.get_contents(parallel=4) == factory.get_contents()
+
+    def test_compact(self, tmpdir):
+        factory = XmlFactory('root')
+        factory['alpha@two'] = '2'
+        factory['alpha@one'] = '<1>'
+        factory['alpha/bravo'] = 'Bravo & Co'
+        factory['alpha/charlie']
+        factory['delta'] = 'Delta'
+        factory['delta/echo']
+        expected = (
+            '<root><alpha one="&lt;1&gt;" two="2"><bravo>Bravo &amp; Co</bravo><charlie/></alpha>'
+            '<delta><echo/>Delta</delta></root>'
+        )
+        assert factory.get_contents(pretty=False) == expected
+        assert factory.get_contents(pretty=False, parallel=2) == expected
+        assert factory.get_contents_bytes(xml_header=True, pretty=False) == \
+            ('<?xml version="1.0" encoding="utf-8" ?>\n' + expected).encode('utf-8')
+        filename = str(tmpdir / 'compact.xml')
+        factory.write(filename, encoding='utf-8', pretty=False)
+        assert io.open(filename, 'rb').read() == expected.encode('utf-8')
+
+        # Reformatting drops the indentation of the input.
+        factory['delta'].root.text = None
+        contents = factory.get_contents()
+        expected = expected.replace('Delta', '')
+        for i_streaming in (False, True):
+            oss = StringIO()
+            WritePrettyXML(StringIO(contents), oss, streaming=i_streaming, pretty=False)
+            assert oss.getvalue() == expected
+
+    def test_parse(self, tmpdir):
+        '''
+        <root>
+          <alpha name="Alpha">Changed</alpha>
+          <item>0</item>
+          <item>1</item>
+          <item>2</item>
+          <item>3</item>
+          <item>4</item>
+          <item>5</item>
+          <item>6</item>
+          <item>7</item>
+          <item>8</item>
+          <item>9</item>
+          <bravo>New</bravo>
+        </root>
+        '''
+        contents = '<root><alpha name="Alpha">A</alpha>%s</root>' % ''.join(
+            '<item>%d</item>' % i for i in range(10))
+        filename = str(tmpdir / 'template.xml')
+        with io.open(filename, 'w', encoding='utf-8') as f:
+            f.write(contents)
+
+        for i_backend in (ElementTreeBackend, NodeBackend):
+            for i_factory in (
+                XmlFactory.from_string(contents, backend=i_backend),
+                XmlFactory.parse(filename, backend=i_backend),
+                XmlFactory.parse(io.open(filename, 'rb'), backend=i_backend),
+            ):
+                assert i_backend.is_node(i_factory.root)
+                i_factory['alpha'] = 'Changed'
+                i_factory['bravo'] = 'New'
+                assert i_factory.get_contents() == dedent(self.test_parse.__doc__)
+
+        # Pretty templates (ie. written by XmlFactory) are patched keeping their indentation.
+        template = XmlFactory('root')
+        template['a/b'] = 'x'
+        template['c'] = 'z'
+        pretty = template.get_contents()
+        expected = '<root>\n  <a>\n    <b>x</b>\n  </a>\n  <c>z</c>\n  <d>new</d>\n</root>'
+        for i_backend in (ElementTreeBackend, NodeBackend):
+            factory = XmlFactory.from_string(pretty, backend=i_backend)
+            factory['d'] = 'new'
+            assert factory.get_contents() == expected
+            assert factory.get_contents(pretty=False) == expected.replace('\n', '').replace('  ', '')
+        factory = XmlFactory.from_string(pretty, strip_whitespace=False)
+        assert factory.root.text == '\n  '
+
+        # Lookups after edits made directly in a partially indexed parent.
+        factory = XmlFactory.from_string(contents)
+        assert factory['item'].root.text == '0'
+        factory.root.remove(factory.root[1])
+        factory['bravo'] = 'New'
+        assert factory['item'].root.text == '1'
+        assert factory['bravo'].root is factory.root[-1]
+
+    @pytest.mark.skipif(six.PY2, reason='asyncio is Python 3 only')
+    def test_async(self):
+        import asyncio
+
+        class Writer(object):
+
+            def __init__(self):
+                self.chunks = []
+                self.drains = 0
+
+            def write(self, data):
+                self.chunks.append(data)
+
+            def drain(self):
+                self.drains += 1
+                return asyncio.sleep(0)
+
+        def collect(chunks):
+            result = []
+            while True:
+                try:
+                    result.append(loop.run_until_complete(chunks.__anext__()))
+                except StopAsyncIteration:
+                    return result
+
+        factory = XmlFactory('root')
+        for i in range(100):
+            factory['item+@id'] = 'Ação %d' % i
+        expected = factory.get_contents(xml_header=True)
+
+        loop = asyncio.new_event_loop()
+        try:
+            chunks = collect(factory.aiter_chunks(chunk_size=100, xml_header=True))
+            assert ''.join(chunks) == expected
+            assert set(len(i) for i in chunks[:-1]) == {100}
+
+            chunks = collect(factory.aiter_chunks(pretty=False, encoding='ascii'))
+            assert b''.join(chunks) == factory.get_contents_bytes(pretty=False, encoding='ascii')
+
+            writer = Writer()
+            loop.run_until_complete(factory.awrite(writer, chunk_size=1000, xml_header=True))
+            assert b''.join(writer.chunks) == factory.get_contents_bytes(xml_header=True)
+            assert writer.drains == len(writer.chunks) > 1
+        finally:
+            loop.close()
+
+    def test_instrumentation(self, tmpdir):
+        original_set = XmlFactory.set
+        events = []
+        ClearEscapeCache()
+        with instrumented(lambda phase, seconds: events.append(phase)) as stats:
+            with pytest.raises(RuntimeError):
+                enable_instrumentation()
+
+            factory = XmlFactory('root')
+            factory['alpha/bravo'] = 'Bravo'
+            factory['alpha/bravo@name'] = '<b>'
+            factory['alpha/bravo@name'] = '<b>'
+            contents = factory.get_contents()
+            factory.write(str(tmpdir / 'output.xml'), encoding='utf-8')
+            factory.as_dict()
+            factory.as_json()
+
+        assert XmlFactory.set is original_set
+        assert disable_instrumentation() is None
+        assert events == ['set', 'set', 'set', 'write', 'write', 'as_dict', 'as_json']
+
+        counters = stats.as_dict()
+        assert counters['set.count'] == 3
+        assert counters['resolve.count'] == 3
+        assert counters['create.count'] == 2
+        assert counters['write.count'] == 2
+        assert counters['io.count'] == 1
+        assert counters['characters_written'] == 2 * len(contents)
+        assert counters['bytes_written'] == len(contents)
+        assert counters['path_cache.hits'] + counters['path_cache.misses'] == 3
+        assert counters['path_cache.hits'] >= 1
+        assert counters['escape_cache.hits'] == 1
+        assert counters['escape_cache.misses'] == 1
+        assert counters['as_dict.seconds'] > 0.0
+
+        # Disabled: nothing is counted.
+        factory['charlie'] = 'Charlie'
+        assert stats.counts['set'] == 3
+
+    def test_fork(self):
+        for i_backend in (ElementTreeBackend, NodeBackend):
+            base = XmlFactory('root', backend=i_backend)
+            for i in range(20):
+                base['items/item+@id'] = str(i)
+            base['header/title'] = 'Base'
+            base_item = base['items/item']
+            expected = base.get_contents()
+
+            fork = base.fork()
+            shared_items = fork.root.find('items')
+            fork['header/title'] = 'Fork'
+            fork['header/version'] = '2'
+            fork['items/item+@id'] = 'new'
+            fork.update([('header@lang', 'en'), ('footer', None)])
+            assert base.get_contents() == expected
+            assert fork.get_contents() == expected.replace('Base', 'Fork').replace(
+                '<title>Fork</title>',
+                '<title>Fork</title>\n    <version>2</version>',
+            ).replace('<header>', '<header lang="en">').replace(
+                '  </items>', '    <item id="new"/>\n  </items>',
+            ).replace('</root>', '  <footer/>\n</root>')
+            # Only the elements on the changed paths were copied.
+            assert fork.root.find('items') is not shared_items
+            assert fork.root.find('items')[0] is shared_items[0]
+
+            # The base copies on write too.
+            fork_contents = fork.get_contents()
+            base['items/item@id'] = 'changed'
+            assert fork.get_contents() == fork_contents
+            assert base['items/item'].root.get('id') == 'changed'
+            with pytest.raises(RuntimeError):
+                base_item['@id'] = 'stale'
+
+            # Forks of forks.
+            fork2 = fork.fork()
+            fork2['header/title'] = 'Fork 2'
+            assert fork.get_contents() == fork_contents
+            assert '<title>Fork 2</title>' in fork2.get_contents()
+
+        with pytest.raises(TypeError):
+            XmlStreamFactory(StringIO(), 'root').fork()
+
+    def test_pickle_and_copy(self):
+        import copy
+        import pickle
+
+        for i_backend in (ElementTreeBackend, NodeBackend):
+            factory = XmlFactory('root', backend=i_backend)
+            factory['a/b'] = 'x'
+            expected = factory.get_contents()
+
+            loaded = pickle.loads(pickle.dumps(factory))
+            assert loaded.get_contents() == expected
+            loaded['a/c'] = 'y'
+            assert factory.get_contents() == expected
+
+            # The copy is the root of its own document: it can be forked and cached.
+            copied = copy.deepcopy(factory)
+            copied.fork()
+            copied['a/c'] = 'y'
+            assert copied.get_contents() == loaded.get_contents()
+            copied.enable_render_cache()
+            copied['a/b'] = 'z'
+            assert copied._render_cache() is not None
+            assert copied.get_contents() == loaded.get_contents().replace('x', 'z')
+            assert factory.get_contents() == expected
+
+    def test_render_cache(self):
+        def full_render(factory):
+            return ''.join(IterPrettyXMLElement(factory.root))
+
+        for i_backend in (ElementTreeBackend, NodeBackend):
+            factory = XmlFactory('root', backend=i_backend)
+            for i in range(20):
+                item = factory['items/item+']
+                item['@id'] = str(i)
+                item['name'] = 'Item & %d' % i
+            factory['empty']
+            last_item = factory['items/item+']
+            factory.enable_render_cache()
+            assert factory.get_contents() == full_render(factory)
+            render = factory._document.render
+            assert _JoinFragment(render.fragments[factory.root][1]) == full_render(factory)
+
+            # Clean elements are written from their fragments.
+            factory['items/item/name'] = 'Changed'
+            factory['items/item+/name'] = 'New'
+            assert render.dirty == {factory.root, factory.root[0], factory.root[0][0],
+                                    factory.root[0][0][0], factory.root[0][-1], factory.root[0][-1][0]}
+            untouched = render.fragments[factory.root[0][1]]
+            assert factory.get_contents() == full_render(factory)
+            assert not render.dirty
+            assert render.fragments[factory.root[0][1]] is untouched
+
+            # Changes through sub-factories mark their ancestors.
+            items = factory['items']
+            factory.get_contents()
+            items['item@id'] = 'first'
+            assert factory.get_contents() == full_render(factory)
+            items.update([('extra/value', 1), ('extra@kind', 'a<b')])
+            assert factory.get_contents() == full_render(factory)
+            assert factory.get_contents(pretty=False) == ''.join(IterCompactXMLElement(factory.root))
+            with pytest.raises(RuntimeError):
+                last_item['@id'] = 'stale'
+
+            # Forks and direct edits.
+            fork = factory.fork()
+            factory['empty'] = 'base'
+            fork['empty'] = 'fork'
+            assert factory.get_contents() == full_render(factory)
+            assert '<empty>fork</empty>' in fork.get_contents()
+            factory.root.find('empty').text = 'direct'
+            factory.enable_render_cache()
+            assert factory.get_contents() == full_render(factory)
+
+            factory.disable_render_cache()
+            factory['empty'] = 'disabled'
+            assert factory.get_contents() == full_render(factory)
+
+    def test_shaped(self):
+        for i_backend in (ElementTreeBackend, NodeBackend):
+            factory = XmlFactory('root', backend=i_backend)
+            for i in range(30):
+                record = factory['records/record+']
+                if i % 3:
+                    record['@id'] = str(i)
+                if i % 5 == 0:
+                    record['@100%'] = 'a<b'
+                record['name'] = 'Record & %d%%s' % i
+                if i % 4:
+                    record['tags/tag'] = 'a'
+                if i % 7 == 0:
+                    record['tags/tag+']
+                if i == 10:
+                    record.root.text = 'mixed'
+                if i == 20:
+                    for j in range(100):
+                        record['large+'] = str(j)
+            factory['records/other'] = 'x'
+            factory['records/other+']
+
+            expected = ''.join(IterPrettyXMLElement(factory.root))
+            assert ''.join(IterPrettyXMLElementShaped(factory.root)) == expected
+            assert factory.get_contents(shaped=True) == expected
+            assert ''.join(IterPrettyXMLElementShaped(factory.root[0][1], 2)) == ''.join(
+                IterPrettyXMLElement(factory.root[0][1], 2))
+
+    def test_append_rows(self):
+        columns = OrderedDict([
+            ('@id', range(4)),
+            ('name', ['Alpha & co', 'Bravo', None, 'Delta']),
+            ('value', (0.5, 1.5, 2.5, 3.5)),
+            ('value@unit', ['m', 'm', 'km', None]),
+            ('point/x', [1, 2, 3, 4]),
+            ('point', ['a', 'b', 'c', 'd']),
+            ('tag+', ['t'] * 4),
+        ])
+        for i_backend in (ElementTreeBackend, NodeBackend):
+            factory = XmlFactory('root', backend=i_backend)
+            factory['rows/header'] = 'Header'
+            factory.append_rows('rows/row', columns)
+
+            expected = XmlFactory('root', backend=i_backend)
+            expected['rows/header'] = 'Header'
+            for i in range(4):
+                row = expected['rows/row+']
+                for j_name, j_values in columns.items():
+                    value = list(j_values)[i]
+                    if value is not None:
+                        row[j_name] = value
+                    elif '@' not in j_name:
+                        row[j_name]
+            assert factory.get_contents() == expected.get_contents()
+
+            # Forked documents own the new rows.
+            fork = factory.fork()
+            fork.append_rows('rows/row+', {'@id': ['new']})
+            assert fork._document.owned.issuperset(fork.root.find('rows')[-1].iter())
+            assert factory.get_contents() == expected.get_contents()
+            assert fork.get_contents().count('<row ') == 5
+
+            with pytest.raises(ValueError):
+                factory.append_rows('rows/row', OrderedDict([('a', [1, 2]), ('b', [1])]))
+            with pytest.raises(ValueError):
+                factory.append_rows('rows/row@id', {'a': [1]})
+
+    def test_append_rows_numpy(self):
+        numpy = pytest.importorskip('numpy')
+
+        factory = XmlFactory('root')
+        factory.append_rows('row', OrderedDict([
+            ('@id', numpy.arange(3)),
+            ('float64', numpy.array([0.1, 1e16, numpy.nan])),
+            ('float32', numpy.array([0.1, 0.2, 1 / 3.0], dtype=numpy.float32)),
+            ('flag', numpy.array([True, False, True])),
+            ('object', numpy.array([1, None, 'x'], dtype=object)),
+        ]))
+        expected = XmlFactory('root')
+        for i in range(3):
+            row = expected['row+']
+            row['@id'] = numpy.arange(3)[i]
+            row['float64'] = numpy.array([0.1, 1e16, numpy.nan])[i]
+            row['float32'] = numpy.array([0.1, 0.2, 1 / 3.0], dtype=numpy.float32)[i]
+            row['flag'] = numpy.array([True, False, True])[i]
+            if i == 1:
+                row['object']
+            else:
+                row['object'] = [1, None, 'x'][i]
+        assert factory.get_contents() == expected.get_contents()
+
+    def test_compression(self, tmpdir):
+        import bz2
+        import gzip
+
+        factory = XmlFactory('root')
+        for i in range(100):
+            factory['item+@id'] = str(i)
+        factory['text'] = 'Ação & co'
+        expected = factory.get_contents_bytes(xml_header=True)
+
+        def read(filename, module):
+            stream = module.open(filename, 'rb')
+            try:
+                return stream.read()
+            finally:
+                stream.close()
+
+        # Inferred from the extension.
+        filename = str(tmpdir / 'output.xml.gz')
+        factory.write(filename, xml_header=True)
+        assert read(filename, gzip) == expected
+        filename = str(tmpdir / 'output.xml.bz2')
+        factory.write(filename, xml_header=True, compression_level=1)
+        assert read(filename, bz2) == expected
+        if not six.PY2:
+            import lzma
+
+            filename = str(tmpdir / 'output.xml.xz')
+            factory.write(filename, xml_header=True)
+            assert read(filename, lzma) == expected
+
+        # Explicit, in binary streams, and in parallel blocks (as many gzip members).
+        oss = io.BytesIO()
+        factory.write(oss, xml_header=True, compression='gzip', compression_threads=2)
+        assert gzip.GzipFile(fileobj=io.BytesIO(oss.getvalue())).read() == expected
+        oss = io.BytesIO()
+        with ParallelGzipWriter(oss, threads=2, block_size=100) as writer:
+            for i in range(0, len(expected), 30):
+                writer.write(expected[i:i + 30])
+        assert oss.getvalue().count(b'\x1f\x8b\x08') > 10
+        assert gzip.GzipFile(fileobj=io.BytesIO(oss.getvalue())).read() == expected
+
+        # Disabled.
+        filename = str(tmpdir / 'plain.xml.gz')
+        factory.write(filename, compression=None)
+        assert io.open(filename).read() == factory.get_contents()
+
+        with pytest.raises(ValueError):
+            factory.write(io.BytesIO(), compression='zip')
+        with pytest.raises(TypeError):
+            factory.write(StringIO(), compression='gzip')
+
+        # WritePrettyXML
+        filename = str(tmpdir / 'pretty.xml.bz2')
+        WritePrettyXML(StringIO(factory.get_contents(pretty=False)), filename, streaming=True)
+        assert read(filename, bz2) == factory.get_contents_bytes()
+
+    def test_write_only_if_changed(self, tmpdir, monkeypatch):
+        import gzip
+        import os
+
+        factory = XmlFactory('root')
+        for i in range(100):
+            factory['item+@id'] = str(i)
+
+        for i_name, i_kwargs in [('output.xml', {}), ('output-utf8.xml', {'encoding': 'utf-8'}), ('output.xml.gz', {})]:
+            filename = str(tmpdir / i_name)
+            assert factory.write(filename, only_if_changed=True, **i_kwargs) is True
+            os.utime(filename, (0, 0))
+            os.chmod(filename, 0o640)
+
+            assert factory.write(filename, only_if_changed=True, **i_kwargs) is False
+            assert os.stat(filename).st_mtime == 0
+
+            # Changed, shorter and longer contents replace the file (keeping its permissions).
+            factory['item@id'] = 'changed'
+            assert factory.write(filename, only_if_changed=True, **i_kwargs) is True
+            assert os.stat(filename).st_mtime != 0
+            assert os.stat(filename).st_mode & 0o777 == 0o640
+            factory.root.remove(factory.root[-1])
+            assert factory.write(filename, only_if_changed=True, **i_kwargs) is True
+            factory['item+@id'] = '99'
+            factory['item@id'] = '0'
+            assert factory.write(filename, only_if_changed=True, **i_kwargs) is True
+
+            if i_name.endswith('.gz'):
+                assert gzip.open(filename).read() == factory.get_contents_bytes()
+            else:
+                assert io.open(filename, encoding='utf-8').read() == factory.get_contents()
+        assert sorted(os.listdir(str(tmpdir))) == ['output-utf8.xml', 'output.xml', 'output.xml.gz']
+
+        # Errors (after the temporary file was created) keep the file untouched.
+        filename = str(tmpdir / 'output.xml')
+        contents = io.open(filename).read()
+
+        def Fail(oss, element):
+            oss.write('<different/>')
+            oss.flush()
+            raise RuntimeError()
+
+        monkeypatch.setattr('zerotk.xml_factory._xml_factory.WritePrettyXMLElement', Fail)
+        with pytest.raises(RuntimeError):
+            factory.write(filename, encoding='utf-8', only_if_changed=True)
+        assert io.open(filename).read() == contents
+        assert len(os.listdir(str(tmpdir))) == 3
+
+        with pytest.raises(TypeError):
+            factory.write(StringIO(), only_if_changed=True)
+
     def test_type_error(self):
         with pytest.raises(TypeError):
             XmlFactory(9)
@@ -232,6 +1207,78 @@ class TestXmlFactory(object):
         assert element.attrib['name'] == '<no>'
         assert element.text == '> 3'
 
+    def test_escape_cache(self):
+        ClearEscapeCache()
+        assert EscapeText('plain') == 'plain'
+        assert GetEscapeCacheInfo().misses == 0
+
+        assert EscapeText('a & <b>') == 'a &amp; &lt;b&gt;'
+        assert EscapeText('a & <b>') == 'a &amp; &lt;b&gt;'
+        info = GetEscapeCacheInfo()
+        assert (info.hits, info.misses, info.currsize) == (1, 1, 1)
+
+        factory = XmlFactory('root')
+        for i in range(3):
+            factory['item+@kind'] = 'a<b'
+        assert factory.get_contents().count('kind="a&lt;b"') == 3
+        assert GetEscapeCacheInfo().hits == 3
+
+        # Long strings are escaped without going through the cache.
+        long_text = 'x & y ' * 20
+        factory = XmlFactory('root')
+        for i in range(2):
+            factory['text+@value'] = long_text
+            factory['text'] = long_text
+        escaped = long_text.replace('&', '&amp;')
+        expected = '<root>\n  <text value="%s">%s</text>\n  <text value="%s"/>\n</root>' % ((escaped,) * 3)
+        assert EscapeText(long_text) == escaped
+        assert factory.get_contents() == expected
+        assert factory.get_contents(pretty=False) == expected.replace('\n', '').replace('  ', '')
+        assert ''.join(IterPrettyXMLElementShaped(factory.root)) == expected
+        assert GetEscapeCacheInfo().currsize == 2
+
+        ClearEscapeCache()
+        assert GetEscapeCacheInfo().currsize == 0
+
+    def test_pretty_xml_streaming(self):
+        contents = (
+            '<root b="2" a="&lt;1&gt;">\n'
+            '<alpha>  <bravo/>text &amp; more<charlie x="1">c</charlie></alpha>\n'
+            '<empty></empty><delta><echo><foxtrot/></echo></delta>tail\n'
+            '</root>'
+        )
+        expected = StringIO()
+        WritePrettyXMLElement(expected, ElementTree.fromstring(contents))
+
+        oss = StringIO()
+        WritePrettyXML(StringIO(contents), oss, streaming=True)
+        assert oss.getvalue() == expected.getvalue()
+
+    def test_deep_tree(self):
+        import sys
+
+        depth = sys.getrecursionlimit() + 100
+        factory = XmlFactory('root')
+        factory['/'.join(['level'] * depth)] = 'bottom'
+
+        contents = factory.get_contents()
+        assert contents.count('<level>') == depth
+        assert contents.count('</level>') == depth
+        assert '<level>bottom</level>' in contents
+
+        # Chunks are joined in the same output.
+        assert ''.join(IterPrettyXMLElement(factory.root)) == contents
+
+        # The render cache references the fragments of the children instead of copying them.
+        factory.enable_render_cache()
+        assert factory.get_contents() == contents
+        fragments = factory._document.render.fragments
+        assert len(fragments) == depth
+        cached = sum(len(j) for _level, i_fragment in fragments.values() for j in i_fragment if type(j) is not list)
+        assert cached == len(contents)
+        factory['/'.join(['level'] * depth)] = 'changed'
+        assert factory.get_contents() == contents.replace('bottom', 'changed')
+
 
 def assert_files_equal(obtained_filename, expected_filename):
     import filecmp
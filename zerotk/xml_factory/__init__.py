@@ -1,3 +1,14 @@
 from __future__ import unicode_literals
-from ._pretty_xml import WritePrettyXML, WritePrettyXMLElement  # noqa
-from ._xml_factory import XmlFactory  # noqa
+from ._backends import ElementTreeBackend, NodeBackend  # noqa
+from ._compression import ParallelGzipWriter  # noqa
+from ._dict_conversion import ElementToDict, IterElementJson, WriteElementJson  # noqa
+from ._instrumentation import (  # noqa
+    disable_instrumentation, enable_instrumentation, instrumented, InstrumentationStats)
+from ._node import Node  # noqa
+from ._parallel import IterPrettyXMLElementParallel  # noqa
+from ._pretty_xml import (  # noqa
+    ClearEscapeCache, EscapeText, GetEscapeCacheInfo, IterCompactXMLElement, IterPrettyXMLElement, IterPrettyXMLParse,
+    WriteCompactXMLElement, WritePrettyXML, WritePrettyXMLElement)
+from ._shaped import IterPrettyXMLElementShaped, WritePrettyXMLElementShaped  # noqa
+from ._streaming import XmlStreamFactory  # noqa
+from ._xml_factory import CompiledPath, XmlFactory  # noqa
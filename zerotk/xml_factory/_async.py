@@ -0,0 +1,53 @@
+"""
+Asynchronous serialization (Python 3 only: imported on demand by XmlFactory.aiter_chunks/awrite).
+"""
+from __future__ import unicode_literals
+
+import asyncio
+
+
+async def IterChunksAsync(chunks, chunk_size, encoding=None):
+    """
+    Regroups the given text chunks in chunks of `chunk_size` characters (the last one may be
+    smaller), giving the control back to the event loop after each one.
+
+    :param iterator(unicode) chunks:
+        The text chunks (ie. from IterPrettyXMLElement), generated synchronously as needed.
+
+    :param int chunk_size:
+
+    :param unicode|None encoding:
+        If given, the chunks are encoded (characters the encoding can't represent are written as
+        character references).
+
+    :rtype: async iterator(unicode|bytes)
+    """
+    pending = ''
+    for i_chunk in chunks:
+        if pending:
+            i_chunk = pending + i_chunk
+        start = 0
+        while len(i_chunk) - start >= chunk_size:
+            result = i_chunk[start:start + chunk_size]
+            start += chunk_size
+            if encoding is not None:
+                result = result.encode(encoding, 'xmlcharrefreplace')
+            yield result
+            await asyncio.sleep(0)
+        pending = i_chunk[start:]
+    if pending:
+        if encoding is not None:
+            pending = pending.encode(encoding, 'xmlcharrefreplace')
+        yield pending
+
+
+async def WriteAsync(writer, chunks, chunk_size, encoding):
+    """
+    Writes the given text chunks in an asyncio StreamWriter (or any object with `write` and a
+    `drain` coroutine), waiting for `drain` after each chunk so a slow reader applies backpressure.
+
+    See IterChunksAsync for the parameters.
+    """
+    async for i_chunk in IterChunksAsync(chunks, chunk_size, encoding):
+        writer.write(i_chunk)
+        await writer.drain()
@@ -0,0 +1,160 @@
+from __future__ import unicode_literals
+
+from collections import OrderedDict
+from xml.etree import ElementTree
+
+from ._child_index import ChildIndex
+from ._node import Node
+import six
+
+
+if six.PY2:
+    # Keeps the attributes insertion order (used by as_dict).
+    def _new_element(tag):
+        return ElementTree.Element(tag, attrib=OrderedDict())
+
+    def _new_sub_element(parent, tag):
+        return ElementTree.SubElement(parent, tag, attrib=OrderedDict())
+else:
+    # Element attributes are already kept in an ordered dict, created only when needed.
+    _new_element = ElementTree.Element
+    _new_sub_element = ElementTree.SubElement
+
+
+class ElementTreeBackend(object):
+    """
+    XmlFactory tree backend using ElementTree.Element nodes (the default).
+
+    A backend instance holds the per-document lookup state, so it is shared between a XmlFactory
+    and the sub-factories it returns.
+    """
+
+    node_class = ElementTree.Element
+
+    def __init__(self):
+        self._index = ChildIndex()
+
+    @classmethod
+    def is_node(cls, value):
+        return isinstance(value, cls.node_class)
+
+    def create_root(self, tag):
+        return _new_element(tag)
+
+    @classmethod
+    def create_parser(cls):
+        """
+        Returns a XMLParser building a tree of this backend's nodes.
+        """
+        return ElementTree.XMLParser()
+
+    def find_child(self, parent, tag):
+        """
+        Returns the first child of parent with the given tag or None.
+        """
+        return self._index.find(parent, tag)
+
+    def append_child(self, parent, tag):
+        """
+        Creates a new child in parent with the given tag.
+        """
+        result = _new_sub_element(parent, tag)
+        self._index.append(parent, result)
+        return result
+
+    def append_children(self, parents, tag):
+        """
+        Creates a new child with the given tag in each of the given parents (in order), returning
+        the new children.
+        """
+        result = [_new_sub_element(i_parent, tag) for i_parent in parents]
+        self._index.append_many(parents, result)
+        return result
+
+    def copy_node(self, node):
+        """
+        Returns a shallow copy of node: a new element with the same tag, text, tail and
+        attributes (copied) and the same children (shared).
+        """
+        result = node.makeelement(node.tag, node.attrib.copy())
+        result.text = node.text
+        result.tail = node.tail
+        result.extend(node)
+        return result
+
+    def replace_child(self, parent, old, new):
+        """
+        Replaces the child `old` of parent by `new`, in the same position.
+        """
+        position = list(parent).index(old)
+        parent[position] = new
+        self._index.replace(parent, position, old, new)
+
+    def clear(self, element=None):
+        """
+        Forgets any cached lookup state (call after editing the tree in ways the backend can't
+        detect).
+
+        :param Element|None element:
+            Unused: the index of the whole document is dropped.
+        """
+        self._index.clear()
+
+
+class NodeBackend(object):
+    """
+    XmlFactory tree backend using the pure Python `Node` class.
+
+    Only meant for Python 2, where it takes less memory than ElementTreeBackend; on Python 3 it
+    takes more and is slower (see Node).
+
+    Nodes keep their own child-by-tag index, so no state is held by the backend.
+    """
+
+    node_class = Node
+
+    @classmethod
+    def is_node(cls, value):
+        return isinstance(value, cls.node_class)
+
+    def create_root(self, tag):
+        return Node(tag)
+
+    @classmethod
+    def create_parser(cls):
+        return ElementTree.XMLParser(target=ElementTree.TreeBuilder(element_factory=Node))
+
+    def find_child(self, parent, tag):
+        return parent.find_child(tag)
+
+    def append_child(self, parent, tag):
+        result = Node(tag)
+        parent.append(result)
+        return result
+
+    def append_children(self, parents, tag):
+        result = [Node(tag) for _i in parents]
+        for i_parent, i_child in zip(parents, result):
+            i_parent.append(i_child)
+        return result
+
+    def copy_node(self, node):
+        return node.__copy__()
+
+    def replace_child(self, parent, old, new):
+        parent.replace_child(old, new)
+
+    def clear(self, element=None):
+        """
+        Drops the child-by-tag index of the nodes of element (the only edit Node can't track is
+        changing the `tag` of a child).
+
+        :param Node|None element:
+            The root of the subtree edited, or None to keep all indexes.
+        """
+        if element is not None:
+            for i_node in element.iter():
+                i_node._by_tag = None
+
+
+BACKENDS = (ElementTreeBackend, NodeBackend)
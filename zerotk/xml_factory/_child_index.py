@@ -0,0 +1,207 @@
+from __future__ import unicode_literals
+import re
+import weakref
+
+
+# Paths that Element.find treats as a plain tag name (no ElementPath syntax).
+_PLAIN_TAG = re.compile(r'^(\{[^}]*\})?[^/\[\]()@!=:\s.*][^/\[\]()@!=:\s]*$')
+
+
+def is_plain_tag(path):
+    """
+    Returns whether Element.find(path) looks for a child with that exact tag.
+
+    :param unicode path:
+    :rtype: bool
+    """
+    return _PLAIN_TAG.match(path) is not None
+
+
+# Parents with up to this number of children are scanned instead of indexed.
+SCAN_LIMIT = 8
+
+
+class ChildIndex(object):
+    """
+    Maps (parent, tag) to the first child of parent with the given tag.
+
+    This replaces the linear scan done by `Element.find` when resolving XmlFactory paths. The
+    index for a parent is created on the first lookup once it has more than SCAN_LIMIT children and
+    is kept up to date by `append`. It is filled incrementally: a lookup only scans the children
+    not indexed yet until it finds the tag, so looking up the first children of a huge parent (ie.
+    patching a parsed document) doesn't index all of them.
+
+    Edits made directly on the elements (bypassing the index) are detected by checking the number
+    of children and the first/last child of the parent, which catches a single append, insert or
+    removal. Any cached child is also checked against its recorded position and tag before being
+    returned. Checking more would mean scanning the children again on every lookup, so edits that
+    keep the number of children and the first/last child intact are NOT detected and require a
+    call to `clear` (XmlFactory.clear_index):
+
+        parent[3] = ElementTree.Element('alpha')  # Replacing a child.
+        parent[7].tag = 'alpha'  # Renaming a child.
+        parent.remove(parent[4]); parent.insert(6, ElementTree.Element('alpha'))
+
+    Without it, looking up "alpha" may miss these children (or return a later one).
+
+    Parents are referenced weakly, so the index never keeps elements removed from the tree alive.
+    """
+
+    def __init__(self):
+        # id(parent) -> [len(parent), first child, last child, {tag: (position, child)}, scanned count,
+        # weak reference to parent]. Weak, so parents removed from the tree are dropped with their
+        # subtree (keyed by id: looking up a WeakKeyDictionary costs a lot more).
+        self._parents = {}
+
+    def __getstate__(self):
+        # Weak references can't be pickled: the index is rebuilt on demand.
+        return {}
+
+    def __setstate__(self, state):
+        self.__init__()
+
+    def find(self, parent, tag):
+        """
+        Returns the first child of parent with the given tag or None.
+
+        :param Element parent:
+        :param unicode tag:
+        :rtype: Element|None
+        """
+        entry = self._parents.get(id(parent))
+        if entry is None:
+            if len(parent) <= SCAN_LIMIT:
+                # Scanning a few children is faster (and smaller) than indexing them.
+                for i_child in parent:
+                    if i_child.tag == tag:
+                        return i_child
+                return None
+            entry = self._build(parent)
+        elif not self._is_valid(entry, parent):
+            entry = self._build(parent)
+        found = entry[3].get(tag)
+        if found is None:
+            found = self._scan(parent, entry, tag)
+            if found is None:
+                return None
+        position, child = found
+        if parent[position] is not child or child.tag != tag:
+            # Child moved or was modified in place: re-index this parent.
+            found = self._scan(parent, self._build(parent), tag)
+            if found is None:
+                return None
+            child = found[1]
+        return child
+
+    def append(self, parent, child):
+        """
+        Registers a child that has just been appended to parent.
+
+        :param Element parent:
+        :param Element child:
+        """
+        entry = self._parents.get(id(parent))
+        if entry is None:
+            return
+        count = len(parent)
+        if entry[0] != count - 1 or parent[-1] is not child:
+            # Parent was modified elsewhere, forget it and re-index on demand.
+            del self._parents[id(parent)]
+            return
+        entry[0] = count
+        if count == 1:
+            entry[1] = child
+        entry[2] = child
+        if entry[4] == count - 1:
+            # Fully scanned: index the new child, otherwise it is scanned on demand.
+            entry[3].setdefault(child.tag, (count - 1, child))
+            entry[4] = count
+
+    def append_many(self, parents, children):
+        """
+        Registers children that have just been appended to parents (children[i] to parents[i]).
+
+        :param list(Element) parents:
+        :param list(Element) children:
+        """
+        indexed = self._parents
+        for i_parent, i_child in zip(parents, children):
+            if id(i_parent) in indexed:
+                self.append(i_parent, i_child)
+
+    def replace(self, parent, position, old, new):
+        """
+        Registers that the child of parent at position was replaced (old by new).
+
+        :param Element parent:
+        :param int position:
+        :param Element old:
+        :param Element new:
+        """
+        entry = self._parents.get(id(parent))
+        if entry is None:
+            return
+        if position == 0:
+            entry[1] = new
+        if position == entry[0] - 1:
+            entry[2] = new
+        found = entry[3].get(old.tag)
+        if found is not None and found[1] is old:
+            entry[3][old.tag] = (position, new)
+
+    def clear(self):
+        """
+        Forgets all indexed parents.
+        """
+        self._parents.clear()
+
+    @staticmethod
+    def _is_valid(entry, parent):
+        count = len(parent)
+        if entry[0] != count:
+            return False
+        if count == 0:
+            return True
+        return parent[0] is entry[1] and parent[-1] is entry[2]
+
+    def _build(self, parent):
+        """
+        Creates an empty index entry for parent (filled by _scan).
+        """
+        parents = self._parents
+        key = id(parent)
+
+        def Forget(ref):
+            if key in parents and parents[key][5] is ref:
+                del parents[key]
+
+        count = len(parent)
+        if count:
+            entry = [count, parent[0], parent[-1], {}, 0, weakref.ref(parent, Forget)]
+        else:
+            entry = [0, None, None, {}, 0, weakref.ref(parent, Forget)]
+        parents[key] = entry
+        return entry
+
+    @staticmethod
+    def _scan(parent, entry, tag):
+        """
+        Indexes the children of parent not scanned yet, until finding one with the given tag.
+
+        :return tuple(int,Element)|None:
+            The (position, child) found, or None if there is no child with the tag.
+        """
+        tags = entry[3]
+        position = entry[4]
+        count = entry[0]
+        while position < count:
+            child = parent[position]
+            child_tag = child.tag
+            if child_tag not in tags:
+                tags[child_tag] = (position, child)
+            position += 1
+            if child_tag == tag:
+                entry[4] = position
+                return tags[child_tag]
+        entry[4] = position
+        return None
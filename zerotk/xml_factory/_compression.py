@@ -0,0 +1,174 @@
+from __future__ import unicode_literals
+
+from collections import deque
+import zlib
+
+import six
+
+
+# Compression inferred from the filename extension.
+EXTENSIONS = {
+    '.gz': 'gzip',
+    '.bz2': 'bz2',
+    '.xz': 'lzma',
+    '.lzma': 'lzma',
+}
+
+COMPRESSIONS = ('gzip', 'bz2', 'lzma')
+
+# Size (in bytes) of the blocks compressed by each thread of ParallelGzipWriter.
+GZIP_BLOCK_SIZE = 1024 * 1024
+
+
+def infer_compression(target, compression='infer'):
+    """
+    Returns the compression to use when writing to target.
+
+    :param unicode|file target:
+        A filename or a file-like object.
+
+    :param unicode|None compression:
+        'gzip', 'bz2', 'lzma', None (no compression) or 'infer' (from the extension of a filename,
+        no compression for file-like objects).
+
+    :rtype: unicode|None
+    """
+    if compression == 'infer':
+        if not isinstance(target, six.string_types):
+            return None
+        for i_extension, i_compression in EXTENSIONS.items():
+            if target.endswith(i_extension):
+                return i_compression
+        return None
+    if compression is not None and compression not in COMPRESSIONS:
+        raise ValueError('Unknown compression: %r (expected one of %s)' % (compression, ', '.join(COMPRESSIONS)))
+    return compression
+
+
+def open_compressor(stream, compression, level=None, threads=1):
+    """
+    Returns a binary file-like object compressing everything written to it into stream.
+
+    Closing the result finishes the compressed data, but doesn't close stream.
+
+    :param file stream:
+        A binary file-like object.
+
+    :param unicode compression:
+        'gzip', 'bz2' or 'lzma'.
+
+    :param int|None level:
+        The compression level (the lzma preset), or None for the default of the codec.
+
+    :param int|None threads:
+        Number of threads compressing gzip blocks in parallel (None for one per CPU). See
+        ParallelGzipWriter. Ignored by the other codecs.
+    """
+    if compression == 'gzip':
+        if threads is None or threads > 1:
+            return ParallelGzipWriter(stream, level, threads)
+        import gzip
+
+        # mtime=0: the same document always produces the same file.
+        return gzip.GzipFile(fileobj=stream, mode='wb', compresslevel=9 if level is None else level, mtime=0)
+    if compression == 'bz2':
+        import bz2
+
+        return bz2.BZ2File(stream, 'wb', compresslevel=9 if level is None else level)
+    if compression == 'lzma':
+        try:
+            import lzma
+        except ImportError:  # Python 2
+            raise ValueError('lzma compression is not available in this Python version')
+
+        return lzma.LZMAFile(stream, 'wb', preset=level)
+    raise ValueError('Unknown compression: %r (expected one of %s)' % (compression, ', '.join(COMPRESSIONS)))
+
+
+class ParallelGzipWriter(object):
+    """
+    Binary file-like object writing gzip data compressed by a pool of threads.
+
+    The input is split in blocks of GZIP_BLOCK_SIZE bytes, each compressed (by zlib, which
+    releases the GIL) into a separate gzip member. A gzip file made of many members decompresses
+    to their concatenation (gzip, gunzip, zcat, ...), so the result is a valid gzip file.
+    """
+
+    def __init__(self, stream, level=None, threads=None, block_size=GZIP_BLOCK_SIZE):
+        """
+        :param file stream:
+            A binary file-like object.
+
+        :param int|None level:
+            The compression level (defaults to 9, as gzip).
+
+        :param int|None threads:
+            Number of threads (defaults to the number of CPUs).
+
+        :param int block_size:
+        """
+        from multiprocessing.pool import ThreadPool
+        import multiprocessing
+
+        if threads is None:
+            threads = multiprocessing.cpu_count()
+        self._stream = stream
+        self._level = 9 if level is None else level
+        self._block_size = block_size
+        self._threads = threads
+        self._pool = ThreadPool(threads)
+        self._pending = deque()
+        self._buffer = []
+        self._buffer_size = 0
+        self._written = False
+        self.closed = False
+
+    def write(self, data):
+        self._buffer.append(data)
+        self._buffer_size += len(data)
+        if self._buffer_size >= self._block_size:
+            self._submit()
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def _submit(self):
+        """
+        Compresses the buffered data in the pool, writing the blocks already compressed (keeping
+        at most two blocks per thread in memory).
+        """
+        block = b''.join(self._buffer)
+        self._buffer = []
+        self._buffer_size = 0
+        self._pending.append(self._pool.apply_async(_CompressGzipMember, (block, self._level)))
+        self._written = True
+        while len(self._pending) > self._threads * 2:
+            self._stream.write(self._pending.popleft().get())
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if self._buffer or not self._written:
+                self._submit()
+            while self._pending:
+                self._stream.write(self._pending.popleft().get())
+        finally:
+            self._pool.terminate()
+            self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _CompressGzipMember(data, level):
+    """
+    Returns data compressed in a complete gzip member.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
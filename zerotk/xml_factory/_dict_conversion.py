@@ -0,0 +1,432 @@
+from __future__ import unicode_literals
+
+from collections import OrderedDict
+from itertools import islice
+import json
+
+from ._pretty_xml import CHUNK_FRAGMENTS
+import six
+
+
+def ElementToDict(element, dict_class=OrderedDict, attr_prefix='', lists=None, text_key='#text'):
+    '''
+    Converts an element (and its subtree) to dicts and lists.
+
+    The tree is traversed with an explicit stack, so there is no limit on its depth.
+
+    :param Element element:
+        The Element (or Node) to convert. The result holds its attributes and children.
+
+    :param type dict_class:
+        The mapping type created for each element (ie. dict, which keeps the insertion order on
+        Python 3.7+).
+
+    :param unicode attr_prefix:
+        Prefix added to the attribute names, to tell them apart from the child tags.
+
+    :param None|bool|iterable(unicode) lists:
+        How lists are detected:
+            - None: the original heuristic, kept for compatibility: an element whose first two
+              children have the same tag is a list of its children, elements with attributes have
+              their text ignored and empty texts are dropped from lists;
+            - True: children with a tag repeated among their siblings are collected in a list
+              under that tag;
+            - an iterable of tags: children with these tags are always collected in a list under
+              their tag (even if they appear only once).
+
+    :param unicode text_key:
+        Key used for the text of elements with attributes or children when `lists` is not None.
+
+    :return dict:
+    '''
+    if lists is None:
+        return _GuessListsToDict(element, dict_class, attr_prefix)
+    return _ExplicitListsToDict(element, dict_class, attr_prefix, lists, text_key)
+
+
+def _GuessListsToDict(element, dict_class, attr_prefix):
+    '''
+    ElementToDict with the original heuristics of:
+    http://code.activestate.com/recipes/410469-xml-as-dictionary/
+
+    Containers are created (and added to their parent) before being filled, so the stack holds
+    (element, container, kind) entries where kind tells how to fill the container.
+    '''
+    def attributes(element):
+        return [(attr_prefix + i_name, i_value) for i_name, i_value in element.items()]
+
+    result = dict_class(attributes(element))
+    stack = [(element, result, _DICT)]
+    while stack:
+        parent, container, kind = stack.pop()
+        if kind == _LIST:
+            append = container.append
+            for i_child in parent:
+                count = len(i_child)
+                if count:
+                    if count == 1 or i_child[0].tag != i_child[1].tag:
+                        value = dict_class(attributes(i_child))
+                        stack.append((i_child, value, _DICT))
+                    else:
+                        value = []
+                        stack.append((i_child, value, _LIST))
+                    append(value)
+                else:
+                    text = i_child.text
+                    if text:
+                        text = text.strip()
+                        if text:
+                            append(text)
+            continue
+
+        for i_child in parent:
+            count = len(i_child)
+            if count:
+                # We assume that if the first two tags in a series are different, then they are
+                # all different (dict), otherwise they are all the same (list).
+                if count == 1 or i_child[0].tag != i_child[1].tag:
+                    value = dict_class(attributes(i_child))
+                    stack.append((i_child, value, _CHILD_DICT))
+                else:
+                    items = []
+                    value = dict_class()
+                    value[i_child[0].tag] = items
+                    value.update(attributes(i_child))
+                    stack.append((i_child, items, _LIST))
+                container[i_child.tag] = value
+            else:
+                items = i_child.items()
+                if items:
+                    # Assume that elements with attributes don't have text.
+                    items.sort()
+                    container[i_child.tag] = dict_class([(attr_prefix + k, v) for k, v in items])
+                else:
+                    container[i_child.tag] = i_child.text
+
+        if kind == _CHILD_DICT:
+            # Attributes win over children with the same name.
+            container.update(attributes(parent))
+
+    return result
+
+
+# Container kinds for _GuessListsToDict: dict (root and list items), dict of a child element (its
+# attributes are applied again at the end) and list.
+_DICT = 0
+_CHILD_DICT = 1
+_LIST = 2
+
+
+def _ExplicitListsToDict(element, dict_class, attr_prefix, lists, text_key):
+    '''
+    ElementToDict with explicit list detection.
+    '''
+    if lists is True:
+        list_tags = None
+    else:
+        list_tags = frozenset(lists)
+
+    def new_container(element):
+        result = dict_class([(attr_prefix + k, v) for k, v in element.items()])
+        text = element.text
+        if text is not None and text.strip():
+            result[text_key] = text
+        return result
+
+    result = new_container(element)
+    stack = [(element, result)]
+    while stack:
+        parent, container = stack.pop()
+
+        if list_tags is None:
+            seen = set()
+            repeated = set()
+            for i_child in parent:
+                if i_child.tag in seen:
+                    repeated.add(i_child.tag)
+                else:
+                    seen.add(i_child.tag)
+        else:
+            repeated = list_tags
+
+        for i_child in parent:
+            if len(i_child):
+                value = new_container(i_child)
+                stack.append((i_child, value))
+            elif i_child.items():
+                value = new_container(i_child)
+            else:
+                value = i_child.text
+
+            tag = i_child.tag
+            if tag in repeated:
+                items = container.get(tag)
+                if not isinstance(items, list):
+                    # Children win over attributes with the same name.
+                    container[tag] = items = []
+                items.append(value)
+            else:
+                container[tag] = value
+
+    return result
+
+
+def WriteElementJson(oss, element, indent=None, ensure_ascii=True, attr_prefix='', lists=None, text_key='#text'):
+    '''
+    Writes the JSON of `ElementToDict(element)` in the given file (oss) without building the dict.
+
+    :param file oss:
+        The output file to write.
+
+    See IterElementJson for the other parameters.
+    '''
+    write = oss.write
+    for i_chunk in IterElementJson(element, indent, ensure_ascii, attr_prefix, lists, text_key):
+        write(i_chunk)
+
+
+def IterElementJson(element, indent=None, ensure_ascii=True, attr_prefix='', lists=None, text_key='#text'):
+    '''
+    Generates the JSON of `ElementToDict(element)` as a sequence of text chunks.
+
+    The output is the same as `json.dumps(ElementToDict(element, ...), indent=indent,
+    ensure_ascii=ensure_ascii)`, but the tree is encoded as it is traversed: only the keys of the
+    dicts currently open are kept in memory (to honor the dict semantics of repeated keys).
+
+    :param Element element:
+        The Element (or Node) to convert.
+
+    :param None|int|unicode indent:
+        None for compact output, otherwise the indentation (number of spaces or string) for each
+        level, as in json.dumps.
+
+    :param bool ensure_ascii:
+        As in json.dumps.
+
+    See ElementToDict for the other parameters.
+
+    :rtype: iterator(unicode)
+    '''
+    if lists is None:
+        plan = _GuessListsPlan(attr_prefix).plan
+        root = (_ELEMENT, element, _DICT)
+    else:
+        plan = _ExplicitListsPlan(attr_prefix, lists, text_key).plan
+        root = (_ELEMENT, element, None)
+
+    if ensure_ascii:
+        encode_string = json.encoder.encode_basestring_ascii
+    else:
+        encode_string = json.encoder.encode_basestring
+    encoder = json.JSONEncoder(ensure_ascii=ensure_ascii)
+
+    if indent is None:
+        item_separator = ', '
+        newline_indents = None
+    else:
+        if not isinstance(indent, six.string_types):
+            indent = ' ' * indent
+        item_separator = ','
+        newline_indents = ['\n']
+
+    out = []
+    append = out.append
+    # Stack of [entries iterator, is dict, is first entry].
+    stack = []
+    source = root
+    while source is not None:
+        # Value
+        kind = source[0]
+        if kind == _VALUE:
+            value = source[1]
+            if isinstance(value, six.string_types):
+                append(encode_string(value))
+            elif value is None:
+                append('null')
+            else:
+                append(encoder.encode(value))
+        elif kind == _ELEMENT:
+            append('{')
+            stack.append([iter(plan(source[1], source[2]).items()), True, True])
+        elif kind == _LIST:
+            append('[')
+            stack.append([_GuessListItems(source[1]), False, True])
+        else:  # _ITEMS
+            append('[')
+            stack.append([_ExplicitListItems(source[1], source[2], *source[3]), False, True])
+
+        # Next value, closing the finished containers.
+        source = None
+        while stack:
+            frame = stack[-1]
+            entry = next(frame[0], None)
+            if newline_indents is not None:
+                while len(newline_indents) <= len(stack):
+                    newline_indents.append(newline_indents[-1] + indent)
+            if entry is None:
+                stack.pop()
+                if not frame[2] and newline_indents is not None:
+                    append(newline_indents[len(stack)])
+                append('}' if frame[1] else ']')
+                continue
+
+            if frame[2]:
+                frame[2] = False
+            else:
+                append(item_separator)
+            if newline_indents is not None:
+                append(newline_indents[len(stack)])
+            if frame[1]:
+                key, source = entry
+                append(encode_string(key))
+                append(': ')
+            else:
+                source = entry
+            break
+
+        if len(out) >= CHUNK_FRAGMENTS:
+            yield ''.join(out)
+            del out[:]
+
+    if out:
+        yield ''.join(out)
+
+
+# Value sources for IterElementJson:
+#   (_VALUE, value): a scalar;
+#   (_ELEMENT, element, kind): the dict of an element, given by the plan function;
+#   (_LIST, element): the list of an element's children (_GuessListsToDict);
+#   (_ITEMS, element, tag, [start, count]): the list of an element's children with the given tag
+#   (_ExplicitListsToDict).
+_VALUE = 0
+_ELEMENT = 1
+_LIST = 2
+_ITEMS = 3
+
+# Dict kinds for _GuessListsPlan (besides _DICT and _CHILD_DICT): a dict with the element's first
+# child tag mapped to the list of its children, and the sorted attributes of an element without
+# children.
+_LIST_DICT = 3
+_SORTED_ATTRIBUTES = 4
+
+
+class _GuessListsPlan(object):
+    '''
+    Computes the dict entries of _GuessListsToDict as (key, source) pairs for IterElementJson.
+    '''
+
+    def __init__(self, attr_prefix):
+        self._attr_prefix = attr_prefix
+
+    def _attributes(self, element):
+        attr_prefix = self._attr_prefix
+        return [(attr_prefix + i_name, (_VALUE, i_value)) for i_name, i_value in element.items()]
+
+    def plan(self, element, kind):
+        if kind == _SORTED_ATTRIBUTES:
+            items = element.items()
+            items.sort()
+            return OrderedDict([(self._attr_prefix + k, (_VALUE, v)) for k, v in items])
+
+        if kind == _LIST_DICT:
+            result = OrderedDict([(element[0].tag, (_LIST, element))])
+            result.update(self._attributes(element))
+            return result
+
+        result = OrderedDict(self._attributes(element))
+        for i_child in element:
+            count = len(i_child)
+            if count:
+                if count == 1 or i_child[0].tag != i_child[1].tag:
+                    result[i_child.tag] = (_ELEMENT, i_child, _CHILD_DICT)
+                else:
+                    result[i_child.tag] = (_ELEMENT, i_child, _LIST_DICT)
+            elif i_child.items():
+                result[i_child.tag] = (_ELEMENT, i_child, _SORTED_ATTRIBUTES)
+            else:
+                result[i_child.tag] = (_VALUE, i_child.text)
+        if kind == _CHILD_DICT:
+            result.update(self._attributes(element))
+        return result
+
+
+def _GuessListItems(element):
+    '''
+    Generates the list item sources of _GuessListsToDict for the children of element.
+    '''
+    for i_child in element:
+        count = len(i_child)
+        if count:
+            if count == 1 or i_child[0].tag != i_child[1].tag:
+                yield (_ELEMENT, i_child, _DICT)
+            else:
+                yield (_LIST, i_child)
+        else:
+            text = i_child.text
+            if text:
+                text = text.strip()
+                if text:
+                    yield (_VALUE, text)
+
+
+class _ExplicitListsPlan(object):
+    '''
+    Computes the dict entries of _ExplicitListsToDict as (key, source) pairs for IterElementJson.
+    '''
+
+    def __init__(self, attr_prefix, lists, text_key):
+        self._attr_prefix = attr_prefix
+        self._list_tags = None if lists is True else frozenset(lists)
+        self._text_key = text_key
+
+    def plan(self, element, kind):
+        attr_prefix = self._attr_prefix
+        result = OrderedDict([(attr_prefix + k, (_VALUE, v)) for k, v in element.items()])
+        text = element.text
+        if text is not None and text.strip():
+            result[self._text_key] = (_VALUE, text)
+
+        repeated = self._list_tags
+        if repeated is None:
+            seen = set()
+            repeated = set()
+            for i_child in element:
+                if i_child.tag in seen:
+                    repeated.add(i_child.tag)
+                else:
+                    seen.add(i_child.tag)
+
+        # Lists are streamed from the children: only the position of their first item and their
+        # length are kept.
+        lists = {}
+        for i_index, i_child in enumerate(element):
+            tag = i_child.tag
+            if tag in repeated:
+                extent = lists.get(tag)
+                if extent is None:
+                    lists[tag] = extent = [i_index, 0]
+                    # Children win over attributes with the same name.
+                    result[tag] = (_ITEMS, element, tag, extent)
+                extent[1] += 1
+            elif len(i_child) or i_child.items():
+                result[tag] = (_ELEMENT, i_child, None)
+            else:
+                result[tag] = (_VALUE, i_child.text)
+        return result
+
+
+def _ExplicitListItems(element, tag, start, count):
+    '''
+    Generates the list item sources of _ExplicitListsToDict for the count children of element with
+    the given tag, starting at the index start.
+    '''
+    for i_child in islice(element, start, None):
+        if i_child.tag != tag:
+            continue
+        if len(i_child) or i_child.items():
+            yield (_ELEMENT, i_child, None)
+        else:
+            yield (_VALUE, i_child.text)
+        count -= 1
+        if not count:
+            break
@@ -0,0 +1,230 @@
+from __future__ import unicode_literals
+
+import contextlib
+import sys
+import time
+
+from . import _backends, _output, _pretty_xml, _xml_factory
+
+
+try:
+    _perf_counter = time.perf_counter
+except AttributeError:  # Python 2
+    _perf_counter = time.time
+
+
+class InstrumentationStats(object):
+    """
+    Counters collected while the instrumentation is enabled (see enable_instrumentation).
+
+    :ivar dict(unicode,int) counts:
+        Number of calls per phase.
+
+    :ivar dict(unicode,float) times:
+        Cumulative seconds per phase. Phases nest (ie. "set" includes the "resolve" and "create"
+        of its path), so their times don't add up.
+
+    :ivar int characters_written:
+        Characters of XML generated by print_ (and so write, get_contents, ...).
+
+    :ivar int bytes_written:
+        Bytes (or characters, for text outputs) written by write in its output.
+
+    :ivar int path_cache_hits:
+    :ivar int path_cache_misses:
+        Lookups of parsed paths.
+
+    Phases:
+        - set: XmlFactory.set/__setitem__;
+        - resolve: resolving the elements of a path (_obtain_element);
+        - create: creating an element in the tree;
+        - write: XmlFactory.print_ (WritePrettyXMLElement, and so write/get_contents);
+        - io: writing the buffered output of write in its stream;
+        - as_dict: XmlFactory.as_dict;
+        - as_json: XmlFactory.as_json/write_json.
+    """
+
+    PHASES = ('set', 'resolve', 'create', 'write', 'io', 'as_dict', 'as_json')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """
+        Zeroes all the counters.
+        """
+        self.counts = dict.fromkeys(self.PHASES, 0)
+        self.times = dict.fromkeys(self.PHASES, 0.0)
+        self.characters_written = 0
+        self.bytes_written = 0
+        self.path_cache_hits = 0
+        self.path_cache_misses = 0
+        self._escape_base = _pretty_xml.GetEscapeCacheInfo()
+
+    @property
+    def escape_cache_hits(self):
+        return _pretty_xml.GetEscapeCacheInfo().hits - self._escape_base.hits
+
+    @property
+    def escape_cache_misses(self):
+        return _pretty_xml.GetEscapeCacheInfo().misses - self._escape_base.misses
+
+    def as_dict(self):
+        """
+        Returns the counters as a flat dict (ie. "set.count", "set.seconds", "bytes_written"),
+        convenient to send to a metrics system.
+
+        :rtype: dict(unicode,int|float)
+        """
+        result = {}
+        for i_phase in self.PHASES:
+            result[i_phase + '.count'] = self.counts[i_phase]
+            result[i_phase + '.seconds'] = self.times[i_phase]
+        result['characters_written'] = self.characters_written
+        result['bytes_written'] = self.bytes_written
+        result['path_cache.hits'] = self.path_cache_hits
+        result['path_cache.misses'] = self.path_cache_misses
+        result['escape_cache.hits'] = self.escape_cache_hits
+        result['escape_cache.misses'] = self.escape_cache_misses
+        return result
+
+
+# The enabled InstrumentationStats and the original (owner, name, value) attributes replaced.
+_stats = None
+_originals = []
+
+
+def enable_instrumentation(callback=None):
+    """
+    Starts collecting statistics of the XmlFactory operations.
+
+    The instrumented functions are replaced by wrappers only while enabled: when disabled, the
+    original code runs without any overhead.
+
+    :param callable|None callback:
+        Called as `callback(phase, seconds)` after each "set", "write", "as_dict" and "as_json"
+        call (ie. to feed a metrics pipeline).
+
+    :rtype: InstrumentationStats
+    :raises RuntimeError: If the instrumentation is already enabled.
+    """
+    global _stats
+    if _stats is not None:
+        raise RuntimeError('Instrumentation is already enabled.')
+    stats = InstrumentationStats()
+
+    XmlFactory = _xml_factory.XmlFactory
+    set_ = _Timed(stats, 'set', XmlFactory.__dict__['set'], callback)
+    _Patch(XmlFactory, 'set', set_)
+    _Patch(XmlFactory, '__setitem__', set_)
+    _Patch(XmlFactory, '_obtain_steps', _Timed(stats, 'resolve', XmlFactory.__dict__['_obtain_steps']))
+    for i_backend in _backends.BACKENDS:
+        _Patch(i_backend, 'append_child', _Timed(stats, 'create', i_backend.__dict__['append_child']))
+    _Patch(XmlFactory, 'print_', _CountedPrint(stats, XmlFactory.__dict__['print_'], callback))
+    _Patch(_output.ChunkWriter, '_emit', _CountedEmit(stats, _output.ChunkWriter.__dict__['_emit']))
+    _Patch(XmlFactory, 'as_dict', _Timed(stats, 'as_dict', XmlFactory.__dict__['as_dict'], callback))
+    _Patch(XmlFactory, 'as_json', _Timed(stats, 'as_json', XmlFactory.__dict__['as_json'], callback))
+    _Patch(XmlFactory, 'write_json', _Timed(stats, 'as_json', XmlFactory.__dict__['write_json'], callback))
+    _Patch(_xml_factory, '_parse_path', _CountedParsePath(stats, _xml_factory._parse_path))
+
+    _stats = stats
+    return stats
+
+
+def disable_instrumentation():
+    """
+    Stops collecting statistics, restoring the original functions.
+
+    :return InstrumentationStats|None:
+        The statistics collected (None if the instrumentation wasn't enabled).
+    """
+    global _stats
+    while _originals:
+        owner, name, value = _originals.pop()
+        setattr(owner, name, value)
+    result, _stats = _stats, None
+    return result
+
+
+@contextlib.contextmanager
+def instrumented(callback=None):
+    """
+    Context manager enabling the instrumentation, yielding its InstrumentationStats:
+
+        with instrumented() as stats:
+            factory.write('output.xml')
+        print(stats.as_dict())
+    """
+    stats = enable_instrumentation(callback)
+    try:
+        yield stats
+    finally:
+        disable_instrumentation()
+
+
+def _Patch(owner, name, value):
+    if isinstance(owner, type):
+        original = owner.__dict__[name]
+    else:
+        original = getattr(owner, name)
+    _originals.append((owner, name, original))
+    setattr(owner, name, value)
+
+
+def _Timed(stats, phase, function, callback=None):
+    counts = stats.counts
+    times = stats.times
+
+    def wrapper(*args, **kwargs):
+        start = _perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            elapsed = _perf_counter() - start
+            counts[phase] += 1
+            times[phase] += elapsed
+            if callback is not None:
+                callback(phase, elapsed)
+    return wrapper
+
+
+class _CountingStream(object):
+
+    def __init__(self, stream, stats):
+        self._stream = stream
+        self._stats = stats
+
+    def write(self, text):
+        self._stats.characters_written += len(text)
+        self._stream.write(text)
+
+
+def _CountedPrint(stats, function, callback):
+    timed = _Timed(stats, 'write', function, callback)
+
+    def print_(self, oss=None, *args, **kwargs):
+        if oss is None:
+            oss = sys.stdout
+        return timed(self, _CountingStream(oss, stats), *args, **kwargs)
+    return print_
+
+
+def _CountedEmit(stats, function):
+    timed = _Timed(stats, 'io', function)
+
+    def _emit(self, chunk):
+        stats.bytes_written += len(chunk)
+        return timed(self, chunk)
+    return _emit
+
+
+def _CountedParsePath(stats, function):
+    cache = _xml_factory._PATH_CACHE
+
+    def _parse_path(name):
+        if name in cache:
+            stats.path_cache_hits += 1
+        else:
+            stats.path_cache_misses += 1
+        return function(name)
+    return _parse_path
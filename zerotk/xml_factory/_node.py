@@ -0,0 +1,258 @@
+from __future__ import unicode_literals
+
+from xml.etree import ElementPath, ElementTree
+
+from ._child_index import SCAN_LIMIT, is_plain_tag
+
+
+class Node(object):
+    """
+    Pure Python alternative to ElementTree.Element, for Python 2 only.
+
+    Uses __slots__ and only allocates the attributes dict, the children list and the child-by-tag
+    index when they are needed. This saves memory on Python 2, where XmlFactory gives every Element
+    an OrderedDict of attributes. On Python 3 use ElementTree.Element (the default backend): the C
+    Element also allocates these lazily, so trees of Nodes take more memory (about 190 against 170
+    bytes per node in benchmarks/bench_backends.py) and parse 2.6 times slower
+    (benchmarks/bench_parse.py).
+
+    Node implements the Element interface used by ElementTree and ElementPath (tag, text, tail,
+    attrib, items, get/set, len, iteration, indexing, find/findall/iter, ...), so it can be used
+    where an Element is expected without copying it, for instance `ElementTree.ElementTree(node)`.
+    Use `to_element` when a real Element instance is required.
+
+    The child-by-tag index is only built for nodes with many children and is kept up to date by
+    the Node methods. Changing the `tag` of a node that is already a child of another node is not
+    tracked (see XmlFactory.clear_index).
+    """
+
+    __slots__ = ('tag', 'text', 'tail', '_attrib', '_children', '_by_tag')
+
+    def __init__(self, tag, attrib=None, **extra):
+        """
+        :param unicode tag:
+        :param dict|None attrib:
+        """
+        self.tag = tag
+        self.text = None
+        self.tail = None
+        if attrib or extra:
+            self._attrib = dict(attrib or (), **extra)
+        else:
+            self._attrib = None
+        self._children = None
+        self._by_tag = None
+
+    def __repr__(self):
+        return '<Node %r at %#x>' % (self.tag, id(self))
+
+    # Attributes
+
+    @property
+    def attrib(self):
+        if self._attrib is None:
+            self._attrib = {}
+        return self._attrib
+
+    @attrib.setter
+    def attrib(self, value):
+        self._attrib = value
+
+    def get(self, key, default=None):
+        if self._attrib is None:
+            return default
+        return self._attrib.get(key, default)
+
+    def set(self, key, value):
+        if self._attrib is None:
+            self._attrib = {key: value}
+        else:
+            self._attrib[key] = value
+
+    def keys(self):
+        if self._attrib is None:
+            return []
+        return list(self._attrib.keys())
+
+    def items(self):
+        if self._attrib is None:
+            return []
+        return list(self._attrib.items())
+
+    # Children
+
+    def __len__(self):
+        if self._children is None:
+            return 0
+        return len(self._children)
+
+    def __iter__(self):
+        return iter(self._children or ())
+
+    def __getitem__(self, index):
+        if self._children is None:
+            return [][index]
+        return self._children[index]
+
+    def __setitem__(self, index, value):
+        if self._children is None:
+            self._children = []
+        self._children[index] = value
+        self._by_tag = None
+
+    def __delitem__(self, index):
+        if self._children is None:
+            del [][index]
+        del self._children[index]
+        self._by_tag = None
+
+    def append(self, child):
+        if self._children is None:
+            self._children = [child]
+        else:
+            self._children.append(child)
+        if self._by_tag is not None:
+            self._by_tag.setdefault(child.tag, child)
+
+    def extend(self, children):
+        for i_child in children:
+            self.append(i_child)
+
+    def insert(self, index, child):
+        if self._children is None:
+            self._children = []
+        self._children.insert(index, child)
+        self._by_tag = None
+
+    def remove(self, child):
+        if self._children is None:
+            [].remove(child)
+        self._children.remove(child)
+        self._by_tag = None
+
+    def clear(self):
+        self.text = self.tail = None
+        self._attrib = self._children = self._by_tag = None
+
+    def makeelement(self, tag, attrib):
+        return self.__class__(tag, attrib)
+
+    def __copy__(self):
+        """
+        Shallow copy: the children are shared, the attributes and the children list are copied.
+        """
+        result = self.__class__(self.tag)
+        result.text = self.text
+        result.tail = self.tail
+        if self._attrib is not None:
+            result._attrib = dict(self._attrib)
+        if self._children is not None:
+            result._children = list(self._children)
+        if self._by_tag is not None:
+            result._by_tag = dict(self._by_tag)
+        return result
+
+    def replace_child(self, old, new):
+        """
+        Replaces the child `old` by `new`, in the same position.
+
+        :param Node old:
+        :param Node new:
+        """
+        children = self._children or []
+        try:
+            position = children.index(old)
+        except ValueError:
+            raise ValueError('%r is not a child of %r' % (old, self))
+        children[position] = new
+        by_tag = self._by_tag
+        if by_tag is not None:
+            if new.tag != old.tag:
+                self._by_tag = None
+            elif by_tag.get(old.tag) is old:
+                by_tag[old.tag] = new
+
+    def find_child(self, tag):
+        """
+        Returns the first child with the given tag (or None), using the child-by-tag index.
+
+        :param unicode tag:
+        :rtype: Node|None
+        """
+        by_tag = self._by_tag
+        if by_tag is None:
+            children = self._children
+            if not children:
+                return None
+            if len(children) <= SCAN_LIMIT:
+                # Scanning a few children is faster (and smaller) than keeping an index.
+                for i_child in children:
+                    if i_child.tag == tag:
+                        return i_child
+                return None
+            by_tag = self._by_tag = {}
+            for i_child in reversed(self._children):
+                by_tag[i_child.tag] = i_child
+        return by_tag.get(tag)
+
+    # ElementPath
+
+    def find(self, path, namespaces=None):
+        if is_plain_tag(path):
+            return self.find_child(path)
+        return ElementPath.find(self, path, namespaces)
+
+    def findall(self, path, namespaces=None):
+        return ElementPath.findall(self, path, namespaces)
+
+    def findtext(self, path, default=None, namespaces=None):
+        return ElementPath.findtext(self, path, default, namespaces)
+
+    def iterfind(self, path, namespaces=None):
+        return ElementPath.iterfind(self, path, namespaces)
+
+    def iter(self, tag=None):
+        if tag == '*':
+            tag = None
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if tag is None or node.tag == tag:
+                yield node
+            if node._children:
+                stack.extend(reversed(node._children))
+
+    def itertext(self):
+        stack = [(self, False)]
+        while stack:
+            node, closing = stack.pop()
+            if closing:
+                if node.tail:
+                    yield node.tail
+                continue
+            if node.text:
+                yield node.text
+            if node is not self:
+                stack.append((node, True))
+            if node._children:
+                stack.extend((i_child, False) for i_child in reversed(node._children))
+
+    def to_element(self):
+        """
+        Returns a copy of this node (and its subtree) as ElementTree.Element instances.
+
+        :rtype: Element
+        """
+        result = ElementTree.Element(self.tag, dict(self._attrib or ()))
+        result.text = self.text
+        result.tail = self.tail
+        stack = [(self, result)]
+        while stack:
+            node, element = stack.pop()
+            for i_child in node._children or ():
+                child_element = ElementTree.SubElement(element, i_child.tag, dict(i_child._attrib or ()))
+                child_element.text = i_child.text
+                child_element.tail = i_child.tail
+                if i_child._children:
+                    stack.append((i_child, child_element))
+        return result
@@ -0,0 +1,293 @@
+from __future__ import unicode_literals
+
+import contextlib
+import io
+import mmap
+import os
+import stat
+import uuid
+
+import six
+
+from ._compression import infer_compression, open_compressor
+
+
+DEFAULT_BUFFER_SIZE = 64 * 1024
+
+
+def is_binary_stream(stream):
+    """
+    Returns whether the given file-like object expects bytes instead of text.
+
+    :param file stream:
+    :rtype: bool
+    """
+    if isinstance(stream, io.TextIOBase):
+        return False
+    if isinstance(stream, (io.RawIOBase, io.BufferedIOBase)):
+        return True
+    return 'b' in getattr(stream, 'mode', '')
+
+
+class ChunkWriter(object):
+    """
+    File-like object that buffers the written text and writes it in large chunks to a stream.
+
+    Keeps at most (about) `buffer_size` characters in memory, so serializing a document through
+    it never holds the whole output at once.
+    """
+
+    def __init__(self, stream, buffer_size=DEFAULT_BUFFER_SIZE, encoding=None):
+        """
+        :param file stream:
+            The output stream.
+
+        :param int buffer_size:
+            Number of characters to accumulate before writing to the stream.
+
+        :param unicode|None encoding:
+            If given, chunks are encoded with it before being written (for binary streams).
+            Characters the encoding can't represent are written as character references.
+        """
+        self._stream = stream
+        self._buffer_size = buffer_size
+        self.encoding = encoding
+        # Whether the output was written (False when an unchanged file was kept, see IfChangedFile).
+        self.written = True
+        self._pending = []
+        self._pending_size = 0
+
+    def write(self, text):
+        self._pending.append(text)
+        self._pending_size += len(text)
+        if self._pending_size >= self._buffer_size:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        chunk = ''.join(self._pending)
+        self._pending = []
+        self._pending_size = 0
+        if self.encoding is not None:
+            chunk = chunk.encode(self.encoding, 'xmlcharrefreplace')
+        self._emit(chunk)
+
+    def _emit(self, chunk):
+        """
+        Writes a (possibly encoded) chunk in the stream.
+        """
+        self._stream.write(chunk)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.flush()
+
+
+@contextlib.contextmanager
+def open_chunk_writer(
+        target, encoding=None, buffer_size=DEFAULT_BUFFER_SIZE, compression='infer', compression_level=None,
+        compression_threads=1, only_if_changed=False):
+    """
+    Context manager returning a ChunkWriter for the given filename or stream.
+
+    :param unicode|file target:
+        A filename or a file-like object opened for writing (text or binary). Files opened here are
+        closed on exit.
+
+    :param unicode|None encoding:
+        The output encoding for filenames and binary streams (defaults to utf-8), which are written
+        in binary mode, encoding each chunk directly. Filenames without an encoding are written in
+        text mode with the platform encoding. Ignored for text streams.
+
+    :param int buffer_size:
+        See ChunkWriter.
+
+    :param unicode|None compression:
+        'gzip', 'bz2', 'lzma', None or 'infer' (the default): from the extension of filenames
+        (".gz", ".bz2", ".xz" or ".lzma"), no compression for streams. The chunks are compressed as
+        they are written (in utf-8 if no encoding is given); streams must be binary.
+
+    :param int|None compression_level:
+        The compression level (the preset for lzma), defaults to the codec default.
+
+    :param int|None compression_threads:
+        Number of threads compressing gzip blocks in parallel (None for one per CPU). See
+        ParallelGzipWriter.
+
+    :param bool only_if_changed:
+        If True, the output is compared with the current contents of the file (target must be a
+        filename), which is only replaced if they differ (see IfChangedFile).
+
+    The `encoding` attribute of the resulting ChunkWriter is the encoding of the output (None when
+    writing text). After closing it, its `written` attribute tells whether the file was written.
+    """
+    compression = infer_compression(target, compression)
+    if only_if_changed:
+        if not isinstance(target, six.string_types):
+            raise TypeError('only_if_changed requires a filename')
+        stream = IfChangedFile(target)
+        try:
+            output = stream
+            if encoding is None and compression is None:
+                # Text mode, as io.open(target, 'w').
+                output = io.TextIOWrapper(stream)
+            with open_chunk_writer(
+                    output, encoding, buffer_size, compression, compression_level, compression_threads) as result:
+                yield result
+            if output is not stream:
+                output.detach()
+        except BaseException:
+            stream.discard()
+            raise
+        stream.commit()
+        result.written = stream.changed
+    elif compression is not None:
+        if isinstance(target, six.string_types):
+            stream = io.open(target, 'wb')
+        elif is_binary_stream(target):
+            stream = target
+        else:
+            raise TypeError('Compressed output requires a filename or a binary stream')
+        try:
+            with contextlib.closing(
+                    open_compressor(stream, compression, compression_level, compression_threads)) as compressor:
+                with ChunkWriter(compressor, buffer_size, encoding or 'utf-8') as result:
+                    yield result
+        finally:
+            if stream is not target:
+                stream.close()
+    elif isinstance(target, six.string_types):
+        if encoding is None:
+            with io.open(target, 'w') as stream:
+                with ChunkWriter(stream, buffer_size) as result:
+                    yield result
+        else:
+            with io.open(target, 'wb') as stream:
+                with ChunkWriter(stream, buffer_size, encoding) as result:
+                    yield result
+    elif is_binary_stream(target):
+        with ChunkWriter(target, buffer_size, encoding or 'utf-8') as result:
+            yield result
+    else:
+        with ChunkWriter(target, buffer_size) as result:
+            yield result
+
+
+class IfChangedFile(io.RawIOBase):
+    """
+    Binary file-like object that only replaces a file when the data written differs from its
+    current contents.
+
+    The data is compared with a memory map of the file as it is written, so nothing is written
+    while it is the same. At the first difference, the contents matched so far are copied to a
+    temporary file in the same directory, where the rest of the data is written. `commit` then
+    replaces the file with the temporary file (atomically, keeping its permissions) or, if nothing
+    differs, keeps the file untouched (as its modification time).
+    """
+
+    def __init__(self, filename):
+        """
+        :param unicode filename:
+        """
+        self.name = filename
+        self.mode = 'wb'
+        self.changed = False
+        self._offset = 0
+        self._output = None
+        self._temp_filename = None
+        self._map = None
+        try:
+            self._file = io.open(filename, 'rb')
+        except (IOError, OSError):  # Doesn't exist (or can't be read): always written.
+            self._file = None
+            self._size = None
+        else:
+            self._size = os.fstat(self._file.fileno()).st_size
+            if self._size:
+                self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if self._output is None:
+            end = self._offset + len(data)
+            if self._map is not None and self._map[self._offset:end] == data:
+                self._offset = end
+                return len(data)
+            self._start_output()
+        self._output.write(data)
+        return len(data)
+
+    def _start_output(self):
+        """
+        Creates the temporary file with the contents matched so far.
+        """
+        self.changed = True
+        self._temp_filename = '%s.%s.tmp' % (self.name, uuid.uuid4().hex[:12])
+        # Created with the default permissions (as the file would be), those of the current file
+        # are copied in commit.
+        descriptor = os.open(
+            self._temp_filename, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666)
+        self._output = io.open(descriptor, 'wb')
+        if self._offset:
+            self._output.write(self._map[:self._offset])
+
+    def commit(self):
+        """
+        Finishes writing: replaces the file if the data written differs from its contents.
+        """
+        if self._output is None and self._offset != self._size:
+            # Shorter than the current contents (or no file).
+            self._start_output()
+        self._close_input()
+        if self._output is not None:
+            try:
+                self._output.close()
+                if self._size is not None:
+                    os.chmod(self._temp_filename, stat.S_IMODE(os.stat(self.name).st_mode))
+                _replace(self._temp_filename, self.name)
+            except BaseException:
+                self.discard()
+                raise
+            self._output = None
+        self.close()
+
+    def discard(self):
+        """
+        Drops the data written, keeping the file untouched.
+        """
+        self._close_input()
+        if self._output is not None:
+            self._output.close()
+            self._output = None
+        if self._temp_filename is not None and os.path.exists(self._temp_filename):
+            os.remove(self._temp_filename)
+        self.close()
+
+    def _close_input(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+# Atomic rename over an existing file (os.rename does that only on POSIX in Python 2).
+_replace = getattr(os, 'replace', os.rename)
+
+
+def xml_header(encoding=None):
+    """
+    Returns the xml declaration, followed by a new line.
+
+    :param unicode|None encoding:
+        The encoding to declare, if any.
+    """
+    if encoding is None:
+        return '<?xml version="1.0" ?>\n'
+    return '<?xml version="1.0" encoding="%s" ?>\n' % encoding
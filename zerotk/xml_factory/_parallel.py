@@ -0,0 +1,137 @@
+from __future__ import unicode_literals
+
+from collections import deque
+import multiprocessing
+
+from ._pretty_xml import EscapeText, IterCompactXMLElement, IterPrettyXMLElement, _StartTag
+
+
+# Minimum number of chunks of children given to each worker process: more chunks balance uneven
+# subtrees better, fewer chunks have less overhead.
+CHUNKS_PER_PROCESS = 16
+
+# Maximum number of children in each chunk, so the text of a chunk doesn't grow with the document.
+MAX_CHUNK_CHILDREN = 1000
+
+# Maximum number of chunks submitted (being rendered or rendered and not written yet) per process.
+PENDING_PER_PROCESS = 2
+
+# The children being rendered, inherited by the forked worker processes (so the tree is never
+# pickled).
+_shared_children = None
+
+
+def IterPrettyXMLElementParallel(element, processes=None, pretty=True):
+    '''
+    Generates the pretty xml of an element as a sequence of text chunks, rendering the subtrees of
+    its children in a pool of worker processes.
+
+    The children are split in consecutive chunks, rendered by the workers at the proper indentation
+    and generated in order, so the output is the same as IterPrettyXMLElement(element) (or
+    IterCompactXMLElement(element)).
+
+    Where available, the workers are forked and read the tree inherited from this process, so only
+    the rendered text is transferred. Otherwise the children are pickled to the workers.
+
+    Chunks have at most MAX_CHUNK_CHILDREN children and only PENDING_PER_PROCESS chunks per process
+    are submitted at a time (the next one when the oldest is generated), so at most
+    `processes * PENDING_PER_PROCESS` rendered chunks are held in memory, whatever the document size.
+
+    :param Element element:
+        The Element (or Node) instance.
+
+    :param int|None processes:
+        Number of worker processes (defaults to the number of CPUs).
+
+    :param bool pretty:
+        If False, generates compact xml.
+
+    :rtype: iterator(unicode)
+    '''
+    global _shared_children
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    children = list(element)
+    if processes < 2 or len(children) < 2:
+        if pretty:
+            chunks = IterPrettyXMLElement(element)
+        else:
+            chunks = IterCompactXMLElement(element)
+        for i_chunk in chunks:
+            yield i_chunk
+        return
+
+    chunk_count = max(processes * CHUNKS_PER_PROCESS, -(-len(children) // MAX_CHUNK_CHILDREN))
+    chunk_count = min(len(children), chunk_count)
+    bounds = (
+        (len(children) * i // chunk_count, len(children) * (i + 1) // chunk_count, pretty)
+        for i in range(chunk_count)
+    )
+
+    yield _StartTag(element) + '>'
+
+    context = _GetForkContext()
+    if context is not None:
+        _shared_children = children
+        try:
+            pool = context.Pool(processes)
+        finally:
+            _shared_children = None
+        function = _RenderSharedChildren
+        tasks = bounds
+    else:
+        pool = multiprocessing.Pool(processes)
+        function = _RenderChildren
+        tasks = ((children[start:stop], pretty) for start, stop, _pretty in bounds)
+    try:
+        pending = deque()
+        for i_task in tasks:
+            pending.append(pool.apply_async(function, (i_task,)))
+            if len(pending) >= processes * PENDING_PER_PROCESS:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+    finally:
+        pool.terminate()
+        pool.join()
+
+    text = element.text
+    if pretty and text is None:
+        yield '\n</%s>' % element.tag
+    elif not pretty and (not text or text.isspace()):
+        yield '</%s>' % element.tag
+    else:
+        yield '%s</%s>' % (EscapeText(text), element.tag)
+
+
+def _GetForkContext():
+    '''
+    Returns the multiprocessing context that forks the worker processes, or None if not available.
+    '''
+    try:
+        return multiprocessing.get_context('fork')
+    except (AttributeError, ValueError):  # Python 2 or platform without fork.
+        return None
+
+
+def _RenderSharedChildren(task):
+    start, stop, pretty = task
+    return _RenderChildren((_shared_children[start:stop], pretty))
+
+
+def _RenderChildren(task):
+    '''
+    Returns the xml of the given (root children, pretty) task: in pretty xml each child starts in a
+    new line.
+    '''
+    children, pretty = task
+    out = []
+    if pretty:
+        for i_child in children:
+            out.append('\n')
+            out.extend(IterPrettyXMLElement(i_child, 1))
+    else:
+        for i_child in children:
+            out.extend(IterCompactXMLElement(i_child))
+    return ''.join(out)
@@ -1,9 +1,99 @@
 from __future__ import unicode_literals
+from collections import namedtuple
 from xml.etree import ElementTree
-import six
+from xml.sax.saxutils import escape
 
+from ._output import open_chunk_writer
 
-def WritePrettyXML(iss, oss):
+
+INDENT = '  '
+
+# Number of fragments (tags, attributes, texts) joined in each chunk generated by
+# IterPrettyXMLElement.
+CHUNK_FRAGMENTS = 4096
+
+# Maximum number of escaped strings kept by EscapeText.
+ESCAPE_CACHE_SIZE = 4096
+
+# Longer strings are escaped without the cache (it is meant for short repeated values).
+ESCAPE_CACHE_MAX_LENGTH = 64
+
+
+try:
+    from functools import lru_cache
+except ImportError:  # Python 2
+    _CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+    def lru_cache(maxsize):
+        '''
+        Minimal functools.lru_cache replacement: the cache is emptied when full.
+        '''
+        def decorator(function):
+            cache = {}
+            stats = [0, 0]
+
+            def wrapper(arg):
+                try:
+                    result = cache[arg]
+                except KeyError:
+                    stats[1] += 1
+                    if len(cache) >= maxsize:
+                        cache.clear()
+                    result = cache[arg] = function(arg)
+                    return result
+                stats[0] += 1
+                return result
+
+            def cache_clear():
+                cache.clear()
+                stats[:] = [0, 0]
+
+            wrapper.cache_info = lambda: _CacheInfo(stats[0], stats[1], maxsize, len(cache))
+            wrapper.cache_clear = cache_clear
+            return wrapper
+        return decorator
+
+
+_cached_escape = lru_cache(ESCAPE_CACHE_SIZE)(escape)
+
+
+def EscapeText(text):
+    '''
+    Escapes "&", "<" and ">" in text (like xml.sax.saxutils.escape).
+
+    Strings without these characters are returned as they are; the others are escaped through a
+    bounded LRU cache, since documents tend to repeat the same values. Only strings of up to
+    ESCAPE_CACHE_MAX_LENGTH characters are cached, so the cache stays small. See GetEscapeCacheInfo.
+
+    :param unicode text:
+    :rtype: unicode
+    '''
+    if '&' in text or '<' in text or '>' in text:
+        if len(text) <= ESCAPE_CACHE_MAX_LENGTH:
+            return _cached_escape(text)
+        return escape(text)
+    return text
+
+
+def GetEscapeCacheInfo():
+    '''
+    Returns the statistics of the EscapeText cache (only strings that need escaping reach it).
+
+    :return CacheInfo:
+        A named tuple with hits, misses, maxsize and currsize (as functools.lru_cache).
+    '''
+    return _cached_escape.cache_info()
+
+
+def ClearEscapeCache():
+    '''
+    Empties the EscapeText cache and resets its statistics.
+    '''
+    _cached_escape.cache_clear()
+
+
+def WritePrettyXML(
+        iss, oss, streaming=False, pretty=True, compression='infer', compression_level=None, compression_threads=1):
     '''
     Writes the iss file in pretty xml.
 
@@ -14,24 +104,109 @@ def WritePrettyXML(iss, oss):
     :type oss: unicode or file
     :param oss:
         The oss filename or file opened for writing.
+
+    :param bool streaming:
+        If True, the input is parsed incrementally and each element is written (and discarded) as
+        soon as it ends, so the memory usage doesn't depend on the input size. The output is the
+        same.
+
+    :param bool pretty:
+        If False, writes compact xml (no indentation or new lines), as IterCompactXMLElement, which
+        also drops the indentation of the input.
+
+    :param unicode|None compression:
+    :param int|None compression_level:
+    :param int|None compression_threads:
+        Compresses the output as it is written, see XmlFactory.write.
+    '''
+    with open_chunk_writer(
+            oss, compression=compression, compression_level=compression_level,
+            compression_threads=compression_threads) as out_stream:
+        if streaming:
+            chunks = IterPrettyXMLParse(iss, pretty)
+        else:
+            tree = ElementTree.parse(iss)  # @UndefinedVariable
+            if pretty:
+                chunks = IterPrettyXMLElement(tree.getroot())
+            else:
+                chunks = IterCompactXMLElement(tree.getroot())
+        write = out_stream.write
+        for i_chunk in chunks:
+            write(i_chunk)
+
+
+def IterPrettyXMLParse(iss, pretty=True):
     '''
-    if isinstance(oss, six.string_types):
-        out_stream = open(oss, 'w')
-        close_output = True
+    Parses the iss file incrementally, generating its pretty xml as a sequence of text chunks.
+
+    Produces the same output as IterPrettyXMLElement (or IterCompactXMLElement) for the parsed root
+    element, but each element is written when it ends and then removed from its parent, so only
+    the elements currently open are kept in memory.
+
+    :type iss: unicode or file
+    :param iss:
+        The iss filename or file object.
+
+    :param bool pretty:
+        If False, generates compact xml.
+
+    :rtype: iterator(unicode)
+    '''
+    if pretty:
+        newline_indents = ['\n']
+        indent = INDENT
     else:
-        out_stream = oss
-        close_output = False
-    try:
-        tree = ElementTree.parse(iss)  # @UndefinedVariable
-        WritePrettyXMLElement(out_stream, tree.getroot())
-    finally:
-        if close_output:
-            out_stream.close()
+        newline_indents = ['']
+        indent = ''
+
+    out = []
+    append = out.append
+    # Stack of [element, has children] for the elements currently open.
+    stack = []
+    for i_event, i_element in ElementTree.iterparse(iss, events=('start', 'end')):
+        if i_event == 'start':
+            if stack:
+                parent = stack[-1]
+                if not parent[1]:
+                    append('>')
+                    parent[1] = True
+                level = len(stack)
+                while len(newline_indents) <= level:
+                    newline_indents.append(newline_indents[-1] + indent)
+                append(newline_indents[level])
+            append(_StartTag(i_element))
+            stack.append([i_element, False])
+            continue
+
+        has_children = stack.pop()[1]
+        text = i_element.text
+        if not has_children:
+            if text is None:
+                append('/>')
+            else:
+                append('>%s</%s>' % (EscapeText(text), i_element.tag))
+        else:
+            if text is None or (not pretty and not text.strip()):
+                append(newline_indents[len(stack)])
+            else:
+                append(EscapeText(text))
+            append('</%s>' % i_element.tag)
+
+        if stack:
+            # All the children of the parent are done: free them.
+            del stack[-1][0][:]
+
+        if len(out) >= CHUNK_FRAGMENTS:
+            yield ''.join(out)
+            del out[:]
+
+    if out:
+        yield ''.join(out)
 
 
 def WritePrettyXMLElement(oss, element, indent=0):
     '''
-    Writes an xml element in the given file (oss) recursively, in pretty xml.
+    Writes an xml element in the given file (oss), in pretty xml.
 
     :param file oss:
         The output file to write
@@ -41,33 +216,194 @@ def WritePrettyXMLElement(oss, element, indent=0):
 
     :param int indent:
         The level of indentation to write the tag.
-        This is used internally for pretty printing.
     '''
-    from xml.sax.saxutils import escape
+    write = oss.write
+    for i_chunk in IterPrettyXMLElement(element, indent):
+        write(i_chunk)
+
+
+def IterPrettyXMLElement(element, indent=0):
+    '''
+    Generates the pretty xml of an element as a sequence of text chunks.
+
+    The tree is traversed with an explicit stack (no recursion limit on deep trees) and the
+    fragments are joined in chunks of about CHUNK_FRAGMENTS fragments.
+
+    :param Element element:
+        The Element instance (ElementTree)
+
+    :param int indent:
+        The level of indentation to write the tag.
+
+    :rtype: iterator(unicode)
+    '''
+    cached_escape = _cached_escape
+    max_length = ESCAPE_CACHE_MAX_LENGTH
+    tags = {}
+    newline_indents = []
+
+    out = []
+    append = out.append
+    stack = []
+    node = element
+    level = indent
+    append(INDENT * indent)
+    while node is not None:
+        # Start tag
+        tag = node.tag
+        try:
+            start_tag, end_tag = tags[tag]
+        except KeyError:
+            start_tag, end_tag = tags[tag] = ('<%s' % tag, '</%s>' % tag)
+        append(start_tag)
+        attributes = node.items()
+        if attributes:
+            if len(attributes) > 1:
+                attributes.sort()
+            for i_name, i_value in attributes:
+                if '&' in i_value or '<' in i_value or '>' in i_value:
+                    i_value = cached_escape(i_value) if len(i_value) <= max_length else escape(i_value)
+                append(' %s="%s"' % (i_name, i_value))
+
+        if len(node) == 0 and node.text is None:
+            append('/>')
+        else:
+            append('>')
+            stack.append((node, level, end_tag, iter(node)))
+            while len(newline_indents) <= level + 1:
+                newline_indents.append('\n' + INDENT * len(newline_indents))
+
+        # Next element to start, closing the finished ones.
+        node = None
+        while stack:
+            parent, parent_level, end_tag, children = stack[-1]
+            node = next(children, None)
+            if node is not None:
+                level = parent_level + 1
+                append(newline_indents[level])
+                break
+            stack.pop()
+
+            # Text
+            text = parent.text
+            if text is None:
+                append(newline_indents[parent_level])
+            elif '&' in text or '<' in text or '>' in text:
+                append(cached_escape(text) if len(text) <= max_length else escape(text))
+            else:
+                append(text)
+
+            # End tag
+            append(end_tag)
+
+        if len(out) >= CHUNK_FRAGMENTS:
+            yield ''.join(out)
+            del out[:]
+
+    if out:
+        yield ''.join(out)
+
+
+def WriteCompactXMLElement(oss, element):
+    '''
+    Writes an xml element in the given file (oss), in compact xml: as WritePrettyXMLElement,
+    without indentation and new lines.
+
+    :param file oss:
+        The output file to write
+
+    :param Element element:
+        The Element instance (ElementTree)
+    '''
+    write = oss.write
+    for i_chunk in IterCompactXMLElement(element):
+        write(i_chunk)
+
+
+def IterCompactXMLElement(element):
+    '''
+    Generates the compact xml of an element as a sequence of text chunks.
+
+    The same as IterPrettyXMLElement (including the sorted attributes and the text after the
+    children) without any indentation or new lines. Whitespace-only texts of elements with children
+    are dropped too, since they are usually the indentation of a parsed pretty xml.
 
-    INDENT = '  '
+    :param Element element:
+        The Element instance (ElementTree)
 
-    # Start tag
-    oss.write(INDENT * indent + '<%s' % element.tag)
-    for i_name, i_value in sorted(six.iteritems(element.attrib)):
-        oss.write(' %s="%s"' % (i_name, escape(i_value)))
+    :rtype: iterator(unicode)
+    '''
+    cached_escape = _cached_escape
+    max_length = ESCAPE_CACHE_MAX_LENGTH
+    tags = {}
 
-    if len(element) == 0 and element.text is None:
-        oss.write('/>')
-        return
+    out = []
+    append = out.append
+    stack = []
+    node = element
+    while node is not None:
+        # Start tag
+        tag = node.tag
+        try:
+            start_tag, end_tag = tags[tag]
+        except KeyError:
+            start_tag, end_tag = tags[tag] = ('<%s' % tag, '</%s>' % tag)
+        append(start_tag)
+        attributes = node.items()
+        if attributes:
+            if len(attributes) > 1:
+                attributes.sort()
+            for i_name, i_value in attributes:
+                if '&' in i_value or '<' in i_value or '>' in i_value:
+                    i_value = cached_escape(i_value) if len(i_value) <= max_length else escape(i_value)
+                append(' %s="%s"' % (i_name, i_value))
 
-    oss.write('>')
+        if len(node) == 0:
+            # Leaf: text and end tag right away.
+            text = node.text
+            if text is None:
+                append('/>')
+            else:
+                if '&' in text or '<' in text or '>' in text:
+                    text = cached_escape(text) if len(text) <= max_length else escape(text)
+                append('>')
+                append(text)
+                append(end_tag)
+        else:
+            append('>')
+            stack.append((node, end_tag, iter(node)))
 
-    # Sub-elements
-    for i_element in element:
-        oss.write('\n')
-        WritePrettyXMLElement(oss, i_element, indent + 1)
+        # Next element to start, closing the finished ones.
+        node = None
+        while stack:
+            parent, end_tag, children = stack[-1]
+            node = next(children, None)
+            if node is not None:
+                break
+            stack.pop()
 
-    # Text
-    if element.text is not None:
-        oss.write(escape(element.text))
+            text = parent.text
+            if text and not text.isspace():
+                if '&' in text or '<' in text or '>' in text:
+                    text = cached_escape(text) if len(text) <= max_length else escape(text)
+                append(text)
+            append(end_tag)
 
-    # End tag
-    if element.text is None:
-        oss.write('\n' + INDENT * indent)
-    oss.write('</%s>' % element.tag)
+        if len(out) >= CHUNK_FRAGMENTS:
+            yield ''.join(out)
+            del out[:]
+
+    if out:
+        yield ''.join(out)
+
+
+def _StartTag(element):
+    '''
+    Returns the pretty xml start tag of element, without the closing ">" or "/>".
+    '''
+    result = ['<%s' % element.tag]
+    attributes = element.items()
+    attributes.sort()
+    for i_name, i_value in attributes:
+        result.append(' %s="%s"' % (i_name, EscapeText(i_value)))
+    return ''.join(result)
@@ -0,0 +1,164 @@
+from __future__ import unicode_literals
+
+from ._pretty_xml import _StartTag, EscapeText, INDENT
+
+
+class RenderCache(object):
+    """
+    Pretty xml fragments of the elements of a document, reused while the elements are unchanged
+    (see XmlFactory.enable_render_cache).
+
+    The fragment of each element with children is kept (with its indentation level) after it is
+    rendered. The XmlFactory marks every element reached by a path as dirty, along with its
+    ancestors, so rendering again only visits the dirty elements and their direct children: every
+    clean child is written from its fragment. Re-rendering after changing a few paths costs about
+    the size of these paths (and of the children of the elements on them) plus joining the output,
+    not rendering the whole document.
+
+    A fragment is a list of strings and of the fragments of the children (referenced, not copied),
+    only joined for the output, so the cache takes about the size of the output whatever the
+    nesting depth.
+    """
+
+    def __init__(self):
+        # Elements changed since the last render (always along with their ancestors).
+        self.dirty = set()
+        # child -> parent, for the elements reached by paths (to mark the ancestors dirty).
+        self.parents = {}
+        # element -> (indentation level, fragment: list of strings and fragments)
+        self.fragments = {}
+        # (root, pretty xml) of the last render.
+        self._output = None
+
+    def touch(self, element, root):
+        """
+        Marks the element and its ancestors as dirty.
+
+        :param Element element:
+            An element reached by a path (or the root).
+
+        :param Element|None root:
+            The document root.
+        """
+        dirty = self.dirty
+        parents = self.parents
+        if element not in parents and element is not root:
+            raise RuntimeError(
+                'This XmlFactory was obtained before its render cache was enabled: obtain it again.')
+        while element is not None and element not in dirty:
+            dirty.add(element)
+            element = parents.get(element)
+
+    def forget(self, element):
+        """
+        Drops what is known about an element that was removed from the document.
+        """
+        self.fragments.pop(element, None)
+        self.parents.pop(element, None)
+        self.dirty.discard(element)
+
+    def render(self, element):
+        """
+        Returns the pretty xml of the document root (the same as IterPrettyXMLElement), reusing
+        the fragments of the clean elements (and the whole output when nothing changed).
+
+        :param Element element:
+            The document root.
+
+        :rtype: unicode
+        """
+        dirty = self.dirty
+        fragments = self.fragments
+        newline_indents = ['\n']
+
+        output = self._output
+        if output is not None and output[0] is element and element not in dirty:
+            return output[1]
+
+        # Each item: (element, level, children iterator, fragment parts)
+        stack = []
+        node = element
+        level = 0
+        while True:
+            # Start an element with no usable fragment.
+            parts = [_StartTag(node)]
+            fragment = None
+            if len(node) == 0:
+                text = node.text
+                if text is None:
+                    parts.append('/>')
+                else:
+                    parts.append('>%s</%s>' % (EscapeText(text), node.tag))
+                fragment = ''.join(parts)
+            else:
+                parts.append('>')
+                stack.append((node, level, iter(node), parts))
+                while len(newline_indents) <= level + 1:
+                    newline_indents.append('\n' + INDENT * len(newline_indents))
+
+            # Next element to start, finishing the completed ones.
+            node = None
+            while stack:
+                parent, parent_level, children, parent_parts = stack[-1]
+                child_level = parent_level + 1
+                newline_indent = newline_indents[child_level]
+                if fragment is not None:
+                    parent_parts.append(newline_indent)
+                    parent_parts.append(fragment)
+                    fragment = None
+                for i_child in children:
+                    cached = fragments.get(i_child)
+                    if cached is not None and cached[0] == child_level and i_child not in dirty:
+                        parent_parts.append(newline_indent)
+                        parent_parts.append(cached[1])
+                    else:
+                        node = i_child
+                        level = child_level
+                        break
+                if node is not None:
+                    break
+                stack.pop()
+
+                text = parent.text
+                if text is None:
+                    parent_parts.append(newline_indents[parent_level])
+                else:
+                    parent_parts.append(EscapeText(text))
+                parent_parts.append('</%s>' % parent.tag)
+                fragment = parent_parts
+                fragments[parent] = (parent_level, fragment)
+
+            if node is None:
+                break
+
+        dirty.clear()
+        result = _JoinFragment(fragment) if isinstance(fragment, list) else fragment
+        self._output = (element, result)
+        return result
+
+    def clear(self):
+        """
+        Forgets all fragments (ie. after editing elements directly).
+        """
+        self.dirty.clear()
+        self.parents.clear()
+        self.fragments.clear()
+        self._output = None
+
+
+def _JoinFragment(fragment):
+    """
+    Returns the text of a fragment (a list of strings and fragments).
+    """
+    out = []
+    append = out.append
+    stack = [iter(fragment)]
+    while stack:
+        for i_part in stack[-1]:
+            if type(i_part) is list:
+                stack.append(iter(i_part))
+                break
+            append(i_part)
+        else:
+            stack.pop()
+    return ''.join(out)
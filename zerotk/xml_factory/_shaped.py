@@ -0,0 +1,267 @@
+from __future__ import unicode_literals
+
+from xml.sax.saxutils import escape
+
+import six
+
+from ._pretty_xml import _cached_escape, CHUNK_FRAGMENTS, ESCAPE_CACHE_MAX_LENGTH, INDENT
+
+
+# Subtrees with more elements than this are never specialized.
+MAX_SHAPE_ELEMENTS = 64
+
+# Maximum number of generated render functions kept (the cache is emptied when full).
+MAX_RENDERERS = 256
+
+# (shape, indentation level) -> render function
+_renderers = {}
+
+
+def IterPrettyXMLElementShaped(element, indent=0):
+    '''
+    Generates the pretty xml of an element as a sequence of text chunks, rendering repeated
+    sibling subtrees with specialized functions.
+
+    When a child has the same tag as its previous sibling, the shape of its subtree (tags,
+    attribute names, which elements have text and the nesting) is computed and a render function
+    is generated for it: a single format string filled with the escaped values. The function is
+    reused for the following siblings, checking that each one has the same shape while reading its
+    values; children that don't match are rendered through the shape they actually have, and
+    subtrees of more than MAX_SHAPE_ELEMENTS elements are rendered generically.
+
+    The output is the same as IterPrettyXMLElement(element, indent).
+
+    :param Element element:
+        The Element (or Node) instance.
+
+    :param int indent:
+        The level of indentation to write the tag.
+
+    :rtype: iterator(unicode)
+    '''
+    cached_escape = _cached_escape
+    max_length = ESCAPE_CACHE_MAX_LENGTH
+    tags = {}
+    newline_indents = []
+
+    out = []
+    append = out.append
+    # Each item: [element, level, end tag, children iterator, last child tag, last child renderer]
+    stack = []
+    node = element
+    level = indent
+    append(INDENT * indent)
+    while node is not None:
+        # Start tag
+        tag = node.tag
+        try:
+            start_tag, end_tag = tags[tag]
+        except KeyError:
+            start_tag, end_tag = tags[tag] = ('<%s' % tag, '</%s>' % tag)
+        append(start_tag)
+        attributes = node.items()
+        if attributes:
+            if len(attributes) > 1:
+                attributes.sort()
+            for i_name, i_value in attributes:
+                if '&' in i_value or '<' in i_value or '>' in i_value:
+                    i_value = cached_escape(i_value) if len(i_value) <= max_length else escape(i_value)
+                append(' %s="%s"' % (i_name, i_value))
+
+        if len(node) == 0 and node.text is None:
+            append('/>')
+        else:
+            append('>')
+            stack.append([node, level, end_tag, iter(node), None, None])
+            while len(newline_indents) <= level + 1:
+                newline_indents.append('\n' + INDENT * len(newline_indents))
+
+        # Next element to start, closing the finished ones.
+        node = None
+        while stack:
+            frame = stack[-1]
+            child_level = frame[1] + 1
+            for i_child in frame[3]:
+                append(newline_indents[child_level])
+                child_tag = i_child.tag
+                if child_tag == frame[4]:
+                    # Repeated tag: try the renderer of the previous sibling, then its own shape
+                    # (False once a sibling was too large to specialize).
+                    renderer = frame[5]
+                    if renderer is not False:
+                        text = None if renderer is None else renderer(i_child)
+                        if text is None:
+                            renderer = frame[5] = _GetRenderer(i_child, child_level) or False
+                            if renderer:
+                                text = renderer(i_child)
+                        if text is not None:
+                            append(text)
+                            continue
+                else:
+                    frame[4] = child_tag
+                    frame[5] = None
+                node = i_child
+                level = child_level
+                break
+            if node is not None:
+                break
+            stack.pop()
+            parent = frame[0]
+
+            # Text
+            text = parent.text
+            if text is None:
+                append(newline_indents[frame[1]])
+            elif '&' in text or '<' in text or '>' in text:
+                append(cached_escape(text) if len(text) <= max_length else escape(text))
+            else:
+                append(text)
+
+            # End tag
+            append(frame[2])
+
+        if len(out) >= CHUNK_FRAGMENTS:
+            yield ''.join(out)
+            del out[:]
+
+    if out:
+        yield ''.join(out)
+
+
+def WritePrettyXMLElementShaped(oss, element, indent=0):
+    '''
+    Writes the pretty xml of an element in the given file (oss), as IterPrettyXMLElementShaped.
+
+    :param file oss:
+        The output file to write
+
+    :param Element element:
+        The Element instance (ElementTree)
+
+    :param int indent:
+        The level of indentation to write the tag.
+    '''
+    write = oss.write
+    for i_chunk in IterPrettyXMLElementShaped(element, indent):
+        write(i_chunk)
+
+
+def _GetShape(element):
+    '''
+    Returns the shape of the subtree of element or None if it has more than MAX_SHAPE_ELEMENTS
+    elements.
+
+    :return tuple|None:
+        (tag, sorted attribute names, has text, children shapes)
+    '''
+    count = [0]
+
+    def GetShape(node):
+        count[0] += 1
+        if count[0] > MAX_SHAPE_ELEMENTS:
+            return None
+        children = []
+        for i_child in node:
+            shape = GetShape(i_child)
+            if shape is None:
+                return None
+            children.append(shape)
+        keys = node.keys()
+        keys.sort()
+        return (node.tag, tuple(keys), node.text is not None, tuple(children))
+
+    return GetShape(element)
+
+
+def _GetRenderer(element, level):
+    '''
+    Returns the render function for the shape of element at the given indentation level, or None
+    if the subtree of element is too large.
+    '''
+    shape = _GetShape(element)
+    if shape is None:
+        return None
+    key = (shape, level)
+    try:
+        return _renderers[key]
+    except KeyError:
+        pass
+    if len(_renderers) >= MAX_RENDERERS:
+        _renderers.clear()
+    result = _renderers[key] = _CompileRenderer(shape, level)
+    return result
+
+
+def _CompileRenderer(shape, level):
+    '''
+    Generates the function that renders elements of the given shape at the given indentation
+    level (without the indentation of the start tag).
+
+    The function returns the pretty xml of an element or None if it doesn't have the shape.
+    '''
+    lines = ['def render(e0):']
+    # Literal parts of the output, None for each value.
+    formats = []
+    values = []
+    names = [0]
+
+    def NewName(prefix):
+        names[0] += 1
+        return '%s%d' % (prefix, names[0])
+
+    def Check(condition):
+        lines.append('    if %s: return None' % condition)
+
+    def AddValue(expression):
+        value = NewName('v')
+        lines.append('    %s = %s' % (value, expression))
+        Check('%s is None' % value)
+        lines.append(
+            "    if '&' in %s or '<' in %s or '>' in %s: %s = esc(%s) if len(%s) <= %d else escape(%s)"
+            % ((value,) * 6 + (ESCAPE_CACHE_MAX_LENGTH, value)))
+        values.append(value)
+        formats.append(None)
+
+    def AddElement(variable, shape, level):
+        tag, keys, has_text, children = shape
+        Check('%s.tag != %r' % (variable, tag))
+        Check('len(%s) != %d' % (variable, len(children)))
+        if keys:
+            Check('len(%s.keys()) != %d' % (variable, len(keys)))
+        else:
+            Check('%s.items()' % variable)
+        formats.append('<%s' % tag)
+        for i_key in keys:
+            formats.append(' %s="' % i_key)
+            AddValue('%s.get(%r)' % (variable, i_key))
+            formats.append('"')
+
+        if not has_text:
+            Check('%s.text is not None' % variable)
+        if not children and not has_text:
+            formats.append('/>')
+            return
+
+        formats.append('>')
+        if children:
+            child_variables = [NewName('e') for _i in children]
+            lines.append('    %s, = %s' % (', '.join(child_variables), variable))
+            for i_variable, i_shape in zip(child_variables, children):
+                formats.append('\n' + INDENT * (level + 1))
+                AddElement(i_variable, i_shape, level + 1)
+        if has_text:
+            AddValue('%s.text' % variable)
+        else:
+            formats.append('\n' + INDENT * level)
+        formats.append('</%s>' % tag)
+
+    AddElement('e0', shape, level)
+    if values:
+        format_string = ''.join('%s' if i is None else i.replace('%', '%%') for i in formats)
+        lines.append('    return %r %% (%s,)' % (format_string, ', '.join(values)))
+    else:
+        lines.append('    return %r' % ''.join(formats))
+
+    namespace = {'esc': _cached_escape, 'escape': escape}
+    six.exec_('\n'.join(lines), namespace)
+    return namespace['render']
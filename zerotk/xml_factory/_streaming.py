@@ -0,0 +1,154 @@
+from __future__ import unicode_literals
+
+from ._output import DEFAULT_BUFFER_SIZE, open_chunk_writer, xml_header
+from ._pretty_xml import _StartTag, EscapeText, IterPrettyXMLElement
+from ._xml_factory import _parse_path, XmlFactory
+
+
+class XmlStreamFactory(XmlFactory):
+    """
+    XmlFactory that writes the children of the root element as soon as they are complete.
+
+    A child of the root is complete when a path leads to another child of the root: it is then
+    written (in pretty xml) and removed from the tree, so arbitrarily large documents can be
+    generated in constant memory. The pretty xml written is the same as `write` of the tree the
+    root had if its children were never removed.
+
+    Paths resolve against what is still in the tree, so they do NOT always mean the same as in a
+    XmlFactory: since the written children are gone, a path to a tag finds the current child with
+    it (or creates a new one), never the first one in the document. For instance:
+
+        with XmlStreamFactory('records.xml', 'records') as xml:
+            for i_record in records:
+                xml['record+/name'] = i_record.name  # Writes the previous record
+                xml['record/value'] = i_record.value  # The current record
+
+    writes a value in every record, while the same code with a XmlFactory sets all values in the
+    first record. Use the factory returned by the "+" path (`record = xml['record+']`) to get the
+    same output with both. XmlFactory instances obtained for written elements must not be used
+    anymore.
+
+    Root attributes must be set before the first child is written.
+    """
+
+    def __init__(self, oss, root_element, xml_header=False, backend=None, encoding=None,
+                 buffer_size=DEFAULT_BUFFER_SIZE):
+        """
+        :param unicode|file oss:
+            A filename or a file-like object opened for writing (text or binary).
+
+        :param str|Element|Node root_element:
+            See XmlFactory.
+
+        :param bool xml_header:
+            Writes the xml header before the root element.
+
+        :param type|None backend:
+            See XmlFactory.
+
+        :param unicode|None encoding:
+        :param int buffer_size:
+            See XmlFactory.write.
+        """
+        XmlFactory.__init__(self, root_element, backend=backend)
+        self._output = open_chunk_writer(oss, encoding, buffer_size)
+        self._oss = None
+        self._xml_header = xml_header
+        self._current = None
+        self._started = False
+        self._closed = False
+
+    def __enter__(self):
+        self._oss = self._output.__enter__()
+        if self._xml_header:
+            self._oss.write(xml_header(self._oss.encoding))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        return self._output.__exit__(exc_type, exc_value, traceback)
+
+    def set(self, name, value):
+        if self._started:
+            steps, attr_name = _parse_path(name)
+            if not steps and attr_name is not None:
+                raise RuntimeError('The root start tag was already written: %s' % name)
+        XmlFactory.set(self, name, value)
+
+    __setitem__ = set
+
+    def _obtain_steps(self, steps, start=None):
+        if steps and (start is None or start is self.root):
+            # The first step leading out of the root (ie. not ".") gives the current child.
+            root = self.root
+            for i_index in range(len(steps)):
+                child = XmlFactory._obtain_steps(self, steps[i_index:i_index + 1])
+                if child is not root:
+                    break
+            else:
+                return root
+            if child is not self._current:
+                self._flush_children(child)
+                self._current = child
+            return XmlFactory._obtain_steps(self, steps[i_index + 1:], child)
+        return XmlFactory._obtain_steps(self, steps, start)
+
+    def update(self, items):
+        # The bulk update resolves the paths on its own: go through _obtain_steps instead.
+        if hasattr(items, 'items'):
+            items = items.items()
+        for i_name, i_value in items:
+            if i_value is None:
+                self[i_name]
+            else:
+                self[i_name] = i_value
+
+    def fork(self):
+        raise TypeError("A XmlStreamFactory can't be forked: its elements are discarded once written.")
+
+    def flush(self):
+        """
+        Writes all children of the root except the current one (the last one used).
+        """
+        self._flush_children(self._current)
+
+    def _flush_children(self, keep):
+        root = self.root
+        children = [i for i in root if i is not keep]
+        if not children:
+            return
+
+        write = self._oss.write
+        if not self._started:
+            write(_StartTag(root) + '>')
+            self._started = True
+        for i_child in children:
+            write('\n')
+            for j_chunk in IterPrettyXMLElement(i_child, 1):
+                write(j_chunk)
+            root.remove(i_child)
+
+        # Forget everything about the written elements.
+        self._backend.clear()
+
+    def close(self):
+        """
+        Writes the remaining children and the end of the root element.
+
+        Called when leaving the `with` block.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if not self._started:
+            for i_chunk in IterPrettyXMLElement(self.root):
+                self._oss.write(i_chunk)
+        else:
+            self._flush_children(None)
+            if self.root.text is None:
+                self._oss.write('\n</%s>' % self.root.tag)
+            else:
+                self._oss.write('%s</%s>' % (EscapeText(self.root.text), self.root.tag))
+        self._current = None
+        self._oss.flush()
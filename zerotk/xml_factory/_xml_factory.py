@@ -1,13 +1,68 @@
 from __future__ import unicode_literals
 
 from collections import OrderedDict
+from xml.etree import ElementTree
+import io
 
 from six import StringIO
-from ._pretty_xml import WritePrettyXMLElement
-from xml.etree import ElementTree
+from ._backends import _new_sub_element, BACKENDS, ElementTreeBackend
+from ._child_index import is_plain_tag
+from ._dict_conversion import ElementToDict, IterElementJson, WriteElementJson
+from ._node import Node
+from ._output import DEFAULT_BUFFER_SIZE, open_chunk_writer, xml_header as _xml_header
+from ._parallel import IterPrettyXMLElementParallel
+from ._render_cache import RenderCache
+from ._shaped import WritePrettyXMLElementShaped
+from ._pretty_xml import IterCompactXMLElement, IterPrettyXMLElement, WriteCompactXMLElement, WritePrettyXMLElement
 import six
 
 
+# Path step modes.
+_FIND = 0  # Reuse the first child with the tag, creating it if necessary.
+_APPEND = 1  # Always create a new child ("tag+").
+_QUERY = 2  # ElementPath expression (ie. "." or "*"), delegated to Element.find.
+
+_PATH_CACHE = {}
+_PATH_CACHE_MAX = 1024
+
+
+def _parse_path(name):
+    """
+    Parses a XmlFactory path, caching the result.
+
+    :param unicode name:
+        A XML path, optionally ending with an attribute definition ("alpha/bravo@name").
+
+    :return tuple(tuple(tuple(unicode,int)),unicode|None):
+        The path steps as (tag, mode) pairs and the attribute name (None if not given).
+    """
+    try:
+        return _PATH_CACHE[name]
+    except KeyError:
+        pass
+
+    if '@' in name:
+        element_name, attr_name = name.rsplit('@')
+    else:
+        element_name, attr_name = name, None
+
+    steps = []
+    if element_name != '':
+        for i_part in element_name.split('/'):
+            if i_part.endswith('+'):
+                steps.append((i_part[:-1], _APPEND))
+            elif i_part == '' or is_plain_tag(i_part):
+                steps.append((i_part, _FIND))
+            else:
+                steps.append((i_part, _QUERY))
+    result = (tuple(steps), attr_name)
+
+    if len(_PATH_CACHE) >= _PATH_CACHE_MAX:
+        _PATH_CACHE.clear()
+    _PATH_CACHE[name] = result
+    return result
+
+
 class XmlFactory(object):
     """
     Fast and easy XML creation class.
@@ -25,43 +80,159 @@ class XmlFactory(object):
         xml.Write('filename.xml') # Always write with a pretty XML format
     """
 
-    def __init__(self, root_element):
+    def __init__(self, root_element, backend=None):
         """
-        :param str|Element root_element:
+        :param str|Element|Node root_element:
+
+        :param type|None backend:
+            The tree backend class: ElementTreeBackend (ElementTree.Element nodes) or NodeBackend
+            (pure Python Node nodes, only smaller on Python 2). Defaults to the backend of the given
+            root_element or ElementTreeBackend when creating a new root.
         """
         if isinstance(root_element, six.string_types):
-            self.root = ElementTree.Element(root_element, attrib=OrderedDict())
-        elif isinstance(root_element, ElementTree.Element):
+            backend = backend or ElementTreeBackend
+            self._backend = backend()
+            self.root = self._backend.create_root(root_element)
+        else:
+            if backend is None:
+                for i_backend in BACKENDS:
+                    if i_backend.is_node(root_element):
+                        backend = i_backend
+                        break
+            if backend is None or not backend.is_node(root_element):
+                raise TypeError("Unknown root_element parameter type: %s" % type(root_element))
+            self._backend = backend()
             self.root = root_element
+        # Whether this is the factory of the document root (not a sub-factory).
+        self._top = True
+        self._document = _DocumentState(self.root)
+
+    def _wrap(self, element):
+        """
+        Returns a XmlFactory for the given element sharing this factory's backend.
+
+        :param Element|Node element:
+        :rtype: XmlFactory
+        """
+        result = XmlFactory.__new__(XmlFactory)
+        result.root = element
+        result._backend = self._backend
+        result._top = False
+        result._document = self._document
+        return result
+
+    def fork(self):
+        """
+        Returns a copy-on-write copy of this document.
+
+        The new factory shares the whole tree with this one: an element is only copied (with its
+        ancestors) when the paths of any of the two factories reach it, so forking and changing a
+        few paths costs about the size of these paths, not the size of the document. Both factories
+        remain independent: changes in one are never seen by the other.
+
+        Notes:
+            - Elements are only copied when reached through paths (set, __getitem__, update, ...).
+              Elements obtained before the fork (ie. `root` or the elements of sub-factories) are
+              shared, so edit them directly only after obtaining them again.
+            - Sub-factories obtained before the fork can't be used to make changes (RuntimeError),
+              since the elements they point to are shared.
+            - The root of a document is copied by its first change after a fork, so `root` changes.
+            - The new factory has no render cache (see enable_render_cache).
+
+        :rtype: XmlFactory
+        :returns:
+            A XmlFactory for the root of this factory.
+        """
+        # Everything this document (and its sub-factories) has is shared from now on.
+        self._document.owned = set()
+        self._document.tracked = True
+
+        result = XmlFactory.__new__(XmlFactory)
+        result.root = self.root
+        result._backend = self._backend.__class__()
+        result._top = True
+        result._document = _DocumentState(result.root)
+        result._document.owned = set()
+        result._document.tracked = True
+        return result
+
+    def enable_render_cache(self):
+        """
+        Keeps the pretty xml of the document elements, so rendering it again after changing a few
+        paths only renders the elements along these paths (see RenderCache).
+
+        The output of print_, write, get_contents, ... is the same as without the cache. Only pretty
+        xml written by the factory of the document root (not sub-factories, nor in parallel) uses
+        the cache.
+
+        Notes:
+            - Changes are tracked through paths (set, __getitem__, update, ...). Call this again
+              after editing elements directly, so the cache starts over.
+            - Sub-factories obtained before enabling the cache can't be used to make changes
+              (RuntimeError): obtain them again.
+        """
+        document = self._document
+        if document.render is None:
+            document.render = RenderCache()
         else:
-            raise TypeError("Unknown root_element parameter type: %s" % type(root_element))
+            document.render.clear()
+        document.tracked = True
+
+    def disable_render_cache(self):
+        """
+        Stops tracking changes and drops the render cache (see enable_render_cache).
+        """
+        document = self._document
+        document.render = None
+        document.tracked = document.owned is not None
+
+    def clear_index(self):
+        """
+        Drops the child-by-tag index used to resolve paths (see ChildIndex).
 
-    def __setitem__(self, name, value):
+        Call it after editing elements directly in ways the index doesn't detect: replacing a child
+        in place (`parent[i] = element`), changing the `tag` of a child or removing and inserting
+        children in the same parent (keeping its number of children). Otherwise paths may miss the
+        edited children, creating duplicates of them.
+
+        The index is rebuilt on demand. For the NodeBackend, only the nodes of this factory are
+        affected.
+        """
+        self._backend.clear(self.root)
+
+    def _render_cache(self):
+        """
+        Returns the RenderCache to render this factory with, or None.
+        """
+        document = self._document
+        if document.render is not None and self._top:
+            return document.render
+        return None
+
+    def set(self, name, value):
         """
         Create a new element or attribute:
 
+        This is the same as `xml[name] = value`.
+
         :param unicode name:
             A XML path including or not an attribute definition
 
         :param unicode value:
             The value to associate with the element or attribute
 
-        :returns Element:
-            Returns the element created.
-            If setting an attribute value, returns the owner element.
-
         @examples:
             xml['alpha/bravo'] = 'XXX' # Create bravo tag with 'XXX' as text contents
-            xml['alpha.class'] = 'CLS' # Create alpha with the attribute class='CLS'
+            xml['alpha@class'] = 'CLS' # Create alpha with the attribute class='CLS'
         """
-        if '@' in name:
-            element_name, attr_name = name.rsplit('@')
-            result = self._obtain_element(element_name)
-            result.attrib[attr_name] = str(value)
-        else:
-            result = self._obtain_element(name)
+        steps, attr_name = _parse_path(name)
+        result = self._obtain_steps(steps)
+        if attr_name is None:
             result.text = six.text_type(value)
-        return XmlFactory(result)
+        else:
+            result.set(attr_name, str(value))
+
+    __setitem__ = set
 
     def __getitem__(self, name):
         """
@@ -70,13 +241,35 @@ class XmlFactory(object):
         :param unicode name:
             A XML path including or not an attribute definition.
 
-        :rtype: Element
+        :rtype: XmlFactory
         :returns:
-            Returns the element created.
+            Returns a XmlFactory for the element created.
         """
         assert '@' not in name, 'The "at" (@) is used for attribute definitions'
-        result = self._obtain_element(name)
-        return XmlFactory(result)
+        return self._get_steps(_parse_path(name)[0])
+
+    def _get_steps(self, steps):
+        """
+        Implements __getitem__ for the given parsed path.
+        """
+        return self._wrap(self._obtain_steps(steps))
+
+    @staticmethod
+    def compile(path):
+        """
+        Parses a XmlFactory path once, returning an object to apply it repeatedly (like re.compile).
+
+        Example:
+            price = XmlFactory.compile('items/item+/price@currency')
+            for i_currency in currencies:
+                price.set(factory, i_currency)
+
+        :param unicode path:
+            A XML path including or not an attribute definition.
+
+        :rtype: CompiledPath
+        """
+        return CompiledPath(path)
 
     def _obtain_element(self, name):
         """
@@ -87,24 +280,395 @@ class XmlFactory(object):
             If any of the parts ends with a "+" it creates a new sub-element in that part even if
             it already exists.
         """
-        parent = self.root
-        if name == '':
-            # On Python 2.7 parent.find('') returns None instead of the parent itself
-            result = parent
+        return self._obtain_steps(_parse_path(name)[0])
+
+    def _obtain_steps(self, steps, start=None):
+        """
+        Create and returns the xml element for the given parsed path.
+
+        :param tuple(tuple(unicode,int)) steps:
+            Path steps, as returned by `_parse_path`.
+
+        :param Element|None start:
+            The element the path is relative to. Defaults to the root.
+        """
+        if self._document.tracked:
+            return self._obtain_steps_tracked(steps, start)
+
+        backend = self._backend
+        # On Python 2.7 parent.find('') returns None instead of the parent itself, so an empty
+        # path (no steps) resolves to the root.
+        result = self.root if start is None else start
+        for i_tag, i_mode in steps:
+            parent = result
+            if i_mode == _FIND:
+                result = backend.find_child(parent, i_tag)
+            elif i_mode == _QUERY:
+                result = parent.find(i_tag)
+            else:
+                result = None
+            if result is None:
+                result = backend.append_child(parent, i_tag)
+        return result
+
+    def _obtain_steps_tracked(self, steps, start=None):
+        """
+        _obtain_steps for forked documents (copies the shared elements along the path) and
+        documents with a render cache (marks the elements along the path as dirty).
+        """
+        backend = self._backend
+        document = self._document
+        owned = document.owned
+        render = document.render
+        if start is None:
+            result = self.root
+            if owned is not None and result not in owned:
+                if not self._top:
+                    raise RuntimeError(
+                        'This XmlFactory was obtained before its document was forked: obtain it again.')
+                if render is not None:
+                    render.forget(result)
+                result = self.root = document.root = backend.copy_node(result)
+                owned.add(result)
         else:
-            parts = name.split('/')
-            for i_part in parts:
-                if i_part.endswith('+'):
-                    i_part = i_part[:-1]
-                    result = ElementTree.SubElement(parent, i_part, attrib=OrderedDict())
+            result = start
+        if render is not None:
+            render.touch(result, document.root)
+            parents = render.parents
+            dirty = render.dirty
+
+        for i_tag, i_mode in steps:
+            parent = result
+            if i_mode == _FIND:
+                result = backend.find_child(parent, i_tag)
+            elif i_mode == _QUERY:
+                result = parent.find(i_tag)
+            else:
+                result = None
+            if result is None:
+                result = backend.append_child(parent, i_tag)
+                if owned is not None:
+                    owned.add(result)
+            elif result is parent:
+                continue
+            elif owned is not None and result not in owned:
+                # Queries of a single step only reach the parent itself or its children.
+                copy = backend.copy_node(result)
+                backend.replace_child(parent, result, copy)
+                if render is not None:
+                    render.forget(result)
+                result = copy
+                owned.add(result)
+            if render is not None:
+                parents[result] = parent
+                dirty.add(result)
+        return result
+
+    def update(self, items):
+        """
+        Sets many paths at once.
+
+        Equivalent to `self[path] = value` for each pair, in order, but elements on the path
+        shared with the previous pair are not resolved again, so grouping paths with a common
+        prefix (as a sorted or nested source naturally does) is much faster.
+
+        :param iterable(tuple(unicode,object))|dict items:
+            Pairs of (path, value) using the same syntax as __setitem__ (including "+" and
+            "@attribute"). A value of None only creates the element (as in `self[path]`).
+
+        @examples:
+            xml.update([
+                ('alpha/bravo', 'XXX'),
+                ('alpha/bravo@class', 'CLS'),
+                ('alpha/item+', 1),
+                ('alpha/item+', 2),
+            ])
+        """
+        if hasattr(items, 'items'):
+            items = items.items()
+
+        if self._document.tracked:
+            # Forked or caching renders: resolve each path through _obtain_steps_tracked.
+            for i_name, i_value in items:
+                if i_value is None:
+                    self._obtain_element(i_name)
                 else:
-                    result = parent.find(i_part)
-                    if result is None:
-                        result = ElementTree.SubElement(parent, i_part, attrib=OrderedDict())
+                    self.set(i_name, i_value)
+            return
+
+        backend = self._backend
+        root = self.root
+        text_type = six.text_type
+
+        # Elements obtained by the last path: chain[i] is the result of previous_steps[i].
+        previous_steps = ()
+        chain = []
+        for i_name, i_value in items:
+            steps, attr_name = _parse_path(i_name)
+
+            # Reuse the elements found (not appended) by the previous path.
+            common = 0
+            for i_step, i_previous in zip(steps, previous_steps):
+                if i_step != i_previous or i_step[1] != _FIND:
+                    break
+                common += 1
+            del chain[common:]
+
+            result = chain[-1] if chain else root
+            for i_tag, i_mode in steps[common:]:
                 parent = result
+                if i_mode == _FIND:
+                    result = backend.find_child(parent, i_tag)
+                elif i_mode == _QUERY:
+                    result = parent.find(i_tag)
+                else:
+                    result = None
+                if result is None:
+                    result = backend.append_child(parent, i_tag)
+                chain.append(result)
+            previous_steps = steps
+
+            if i_value is None:
+                continue
+            if attr_name is None:
+                result.text = text_type(i_value)
+            else:
+                result.set(attr_name, str(i_value))
+
+    def append_rows(self, path, columns):
+        """
+        Appends one element per row, filled from columns of values.
+
+        Equivalent to the following, but the parent is resolved once, the values of each column
+        are converted to text in a single pass (NumPy arrays through `tolist`/`astype`) and the
+        elements are created column by column:
+
+            for i in range(row_count):
+                row = self[path + '+']
+                for i_name, i_values in columns.items():
+                    row[i_name] = i_values[i]
+
+        :param unicode path:
+            Path of the row elements. A new element is always appended for each row (a trailing
+            "+" is optional).
+
+        :param dict columns:
+            Maps paths relative to the row element ("tag", "@attribute", "tag@attribute", "a/b",
+            ...) to sequences of values (lists, tuples, NumPy arrays, ...) with the same length.
+            The children are created in the order of the columns, so use an OrderedDict on old
+            Pythons. A value of None only creates the element (as in update) or skips the
+            attribute.
+
+        @examples:
+            xml.append_rows('rows/row', OrderedDict([
+                ('@id', [1, 2, 3]),
+                ('name', ['Alpha', 'Bravo', 'Charlie']),
+                ('value', numpy.array([0.5, 1.5, 2.5])),
+                ('value@unit', ['m', 'm', 'km']),
+            ]))
+        """
+        steps, attr_name = _parse_path(path)
+        if attr_name is not None or not steps or steps[-1][1] == _QUERY:
+            raise ValueError('append_rows requires a path ending in a tag name: %r' % path)
+
+        # Texts of each column, grouped by the element they go to.
+        row_count = None
+        groups = OrderedDict()
+        for i_name, i_values in columns.items():
+            column_steps, column_attr_name = _parse_path(i_name)
+            texts = _ColumnTexts(i_values, six.text_type if column_attr_name is None else str)
+            if row_count is None:
+                row_count = len(texts)
+            elif len(texts) != row_count:
+                raise ValueError(
+                    'Column %r has %d values, expected %d' % (i_name, len(texts), row_count))
+            groups.setdefault(column_steps, []).append((column_attr_name, texts))
+        if row_count is None:
+            return
+
+        parent = self._obtain_steps(steps[:-1])
+        rows = self._append_rows(parent, steps[-1][0], row_count, groups)
+
+        owned = self._document.owned
+        if owned is not None:
+            for i_row in rows:
+                owned.update(i_row.iter())
+
+    def _append_rows(self, parent, tag, row_count, groups):
+        """
+        Creates the elements of append_rows.
+
+        :param Element parent:
+        :param unicode tag:
+        :param int row_count:
+
+        :param dict(tuple,list(tuple(unicode|None,list(unicode|None)))) groups:
+            The (attribute name, texts) of the columns, by the steps of their elements.
+
+        :return list(Element):
+            The rows.
+        """
+        backend = self._backend
+        append_child = backend.append_child
+        rows = backend.append_children([parent] * row_count, tag)
+
+        # Columns of a single tag (not used by longer paths) are appended directly to each row.
+        nested_tags = set(i_steps[0][0] for i_steps in groups if len(i_steps) > 1)
+        for i_steps, i_columns in groups.items():
+            if not i_steps:
+                elements = rows
+            elif len(i_steps) == 1 and i_steps[0][1] != _QUERY and i_steps[0][0] not in nested_tags:
+                elements = backend.append_children(rows, i_steps[0][0])
+            else:
+                # The rows are new: no need to track the elements created inside them.
+                elements = []
+                for j_row in rows:
+                    result = j_row
+                    for k_tag, k_mode in i_steps:
+                        child = result
+                        if k_mode == _FIND:
+                            result = backend.find_child(child, k_tag)
+                        elif k_mode == _QUERY:
+                            result = child.find(k_tag)
+                        else:
+                            result = None
+                        if result is None:
+                            result = append_child(child, k_tag)
+                    elements.append(result)
+
+            for j_attr_name, j_texts in i_columns:
+                if j_attr_name is None:
+                    for k_element, k_text in zip(elements, j_texts):
+                        if k_text is not None:
+                            k_element.text = k_text
+                else:
+                    for k_element, k_text in zip(elements, j_texts):
+                        if k_text is not None:
+                            k_element.set(j_attr_name, k_text)
+
+        return rows
+
+    @classmethod
+    def from_dict(cls, root_element, data, backend=None):
+        """
+        Creates a XmlFactory from nested dicts and lists.
+
+        Keys are paths relative to the enclosing dict's element, using the same syntax as
+        __setitem__ ("alpha/bravo", "alpha+", "@attribute", "alpha@attribute"). Values can be:
+            - dict: the element contents;
+            - list: one new element for each item (dicts, scalars or None);
+            - None: an empty element;
+            - other: the element text (or the attribute value).
+
+        Each element is resolved only once, no matter how many values it contains.
+
+        :param str|Element|Node root_element:
+            See __init__.
+
+        :param dict data:
+
+        :param type|None backend:
+            See __init__.
+
+        :rtype: XmlFactory
+
+        @examples:
+            xml = XmlFactory.from_dict('root', {
+                '@version': '1.0',
+                'alpha': {'bravo': 'XXX', 'bravo@class': 'CLS'},
+                'items/item': [1, 2, {'@name': 'three', 'value': 3}],
+            })
+        """
+        result = cls(root_element, backend=backend)
+        append_child = result._backend.append_child
+        obtain_steps = result._obtain_steps
+        text_type = six.text_type
+
+        stack = [(result.root, iter(data.items()))]
+        while stack:
+            element, items = stack[-1]
+            for i_name, i_value in items:
+                steps, attr_name = _parse_path(i_name)
+
+                if attr_name is None and isinstance(i_value, (list, tuple)):
+                    if not steps:
+                        raise ValueError('A list value requires an element name: %r' % i_name)
+                    parent = obtain_steps(steps[:-1], element)
+                    tag = steps[-1][0]
+                    children = []
+                    for j_item in i_value:
+                        target = append_child(parent, tag)
+                        if isinstance(j_item, dict):
+                            children.append((target, iter(j_item.items())))
+                        elif j_item is not None:
+                            target.text = text_type(j_item)
+                    if children:
+                        # Fill the items after the ones already being processed, in order.
+                        stack.extend(reversed(children))
+                        break
+                    continue
+
+                target = obtain_steps(steps, element) if steps else element
+                if attr_name is not None:
+                    target.set(attr_name, str(i_value))
+                elif isinstance(i_value, dict):
+                    stack.append((target, iter(i_value.items())))
+                    break
+                elif i_value is not None:
+                    target.text = text_type(i_value)
+            else:
+                stack.pop()
         return result
 
-    def print_(self, oss=None, xml_header=False):
+    @classmethod
+    def parse(cls, source, backend=None, strip_whitespace=True):
+        """
+        Creates a XmlFactory for an existing XML document.
+
+        Nothing is indexed while parsing: the child lookups of the paths used later index only
+        the children they scan, so patching a few paths of a large document costs about the parse.
+
+        :param unicode|file source:
+            A filename or a file object to read the XML from.
+
+        :param type|None backend:
+            The tree backend class (see __init__). Defaults to ElementTreeBackend.
+
+        :param bool strip_whitespace:
+            Drops the whitespace-only texts of the elements with children and the whitespace-only
+            tails: the indentation of a pretty xml. Otherwise the pretty xml written would have
+            the indentation of the input after the children of each element (misindenting the end
+            tags). Pass False to keep them (ie. for compact documents, saving a pass over the
+            parsed tree).
+
+        :rtype: XmlFactory
+        """
+        backend = backend or ElementTreeBackend
+        root = ElementTree.parse(source, parser=backend.create_parser()).getroot()
+        if strip_whitespace:
+            _StripWhitespace(root)
+        return cls(root, backend=backend)
+
+    @classmethod
+    def from_string(cls, text, backend=None, strip_whitespace=True):
+        """
+        Creates a XmlFactory for the given XML document contents.
+
+        :param unicode|bytes text:
+
+        See parse for the other parameters.
+
+        :rtype: XmlFactory
+        """
+        backend = backend or ElementTreeBackend
+        parser = backend.create_parser()
+        parser.feed(text)
+        root = parser.close()
+        if strip_whitespace:
+            _StripWhitespace(root)
+        return cls(root, backend=backend)
+
+    def print_(self, oss=None, xml_header=False, parallel=False, encoding=None, pretty=True, shaped=False):
         """
         Prints the resulting XML in the stdout or the given output stream.
 
@@ -112,6 +676,23 @@ class XmlFactory(object):
         :param oss:
             A file-like object where to write the XML output. If None, writes the output in the
             stdout.
+
+        :param unicode|None encoding:
+            The encoding declared in the xml header (the text is written as is).
+
+        :param bool pretty:
+            If False, writes compact xml, without indentation and new lines (the attributes are
+            still sorted).
+
+        :param bool|int parallel:
+            If True (or a number of processes), the subtrees of the root children are rendered in
+            a pool of worker processes (one per CPU by default). The output is the same: this only
+            pays off for large documents. See IterPrettyXMLElementParallel.
+
+        :param bool shaped:
+            If True, repeated sibling subtrees (ie. records) are written by render functions
+            generated for their structure. The output is the same: this pays off for documents
+            with many elements of the same shape. See IterPrettyXMLElementShaped.
         """
 
         if oss is None:
@@ -119,112 +700,380 @@ class XmlFactory(object):
             oss = sys.stdout
 
         if xml_header:
-            oss.write('<?xml version="1.0" ?>\n')
-        WritePrettyXMLElement(oss, self.root)
+            oss.write(_xml_header(encoding))
+        if parallel:
+            processes = None if parallel is True else parallel
+            write = oss.write
+            for i_chunk in IterPrettyXMLElementParallel(self.root, processes, pretty):
+                write(i_chunk)
+        elif pretty:
+            render = self._render_cache()
+            if render is not None:
+                oss.write(render.render(self.root))
+            elif shaped:
+                WritePrettyXMLElementShaped(oss, self.root)
+            else:
+                WritePrettyXMLElement(oss, self.root)
+        else:
+            WriteCompactXMLElement(oss, self.root)
 
-    def write(self, filename, xml_header=False):
+    def write(
+            self, filename, xml_header=False, encoding=None, buffer_size=DEFAULT_BUFFER_SIZE, parallel=False,
+            pretty=True, shaped=False, compression='infer', compression_level=None, compression_threads=1,
+            only_if_changed=False):
         """
         Writes the XML in a file with the given filename.
 
-        :param unicode filename:
-            A filename.
+        The output is streamed in chunks of `buffer_size` characters, so the whole document is
+        never held in memory as a string. Compressed output is compressed as it is generated.
+
+        :param unicode|file filename:
+            A filename or a file-like object opened for writing (text or binary).
+
+        :param unicode|None encoding:
+            The output encoding for filenames and binary streams (defaults to utf-8). The output is
+            encoded directly in binary mode, chunk by chunk, and the encoding is declared in the
+            xml header. Filenames without an encoding are written in text mode with the platform
+            encoding. Ignored for text streams.
+
+        :param int buffer_size:
+            Number of characters buffered before each write.
+
+        :param bool|int parallel:
+            See print_.
+
+        :param bool pretty:
+        :param bool shaped:
+            See print_.
+
+        :param unicode|None compression:
+            'gzip', 'bz2', 'lzma', None or 'infer' (the default): from the extension of the
+            filename (".gz", ".bz2", ".xz" or ".lzma"). Compressed output is encoded in utf-8 if no
+            encoding is given, so streams must be binary.
+
+        :param int|None compression_level:
+            The compression level (the preset for lzma), defaults to the codec default.
+
+        :param int|None compression_threads:
+            For gzip, the number of threads compressing blocks of the output in parallel (None for
+            one per CPU). The blocks are written as consecutive gzip members.
+
+        :param bool only_if_changed:
+            If True, the output is compared with the current contents of the file as it is
+            generated, and the file is only replaced (atomically) if they differ, so unchanged
+            files keep their modification time. Requires a filename.
+
+        :return bool:
+            Whether the file was written (False only when only_if_changed kept an unchanged file).
         """
-        with open(filename, 'w') as f:
-            f.write(self.get_contents(xml_header=xml_header))
+        with open_chunk_writer(
+                filename, encoding, buffer_size, compression, compression_level, compression_threads,
+                only_if_changed) as oss:
+            self.print_(
+                oss, xml_header=xml_header, parallel=parallel, encoding=oss.encoding, pretty=pretty, shaped=shaped)
+        return oss.written
 
-    def get_contents(self, xml_header=False):
+    def get_contents(self, xml_header=False, parallel=False, pretty=True, shaped=False):
         """
         Returns the resulting XML.
 
+        :param bool|int parallel:
+            See print_.
+
+        :param bool pretty:
+        :param bool shaped:
+            See print_.
+
         :return unicode:
         """
         oss = StringIO()
-        self.print_(oss, xml_header=xml_header)
+        self.print_(oss, xml_header=xml_header, parallel=parallel, pretty=pretty, shaped=shaped)
         return oss.getvalue()
 
-    def as_dict(self):
+    def _iter_chunks(self, xml_header=False, encoding=None, pretty=True):
+        """
+        Generates the resulting XML as a sequence of text chunks.
+        """
+        if xml_header:
+            yield _xml_header(encoding)
+        render = self._render_cache()
+        if pretty and render is not None:
+            chunks = [render.render(self.root)]
+        elif pretty:
+            chunks = IterPrettyXMLElement(self.root)
+        else:
+            chunks = IterCompactXMLElement(self.root)
+        for i_chunk in chunks:
+            yield i_chunk
+
+    def aiter_chunks(self, chunk_size=DEFAULT_BUFFER_SIZE, xml_header=False, encoding=None, pretty=True):
+        """
+        Asynchronous iterator over the resulting XML (Python 3 only).
+
+        The XML is generated as the chunks are consumed, giving the control back to the event
+        loop between chunks, so serializing a large document doesn't block it:
+
+            async for chunk in factory.aiter_chunks():
+                ...
+
+        :param int chunk_size:
+            Number of characters in each chunk (the last one may be smaller).
+
+        :param unicode|None encoding:
+            If given, the chunks are bytes in this encoding (declared in the xml header).
+
+        :param bool pretty:
+            See print_.
+
+        :rtype: async iterator(unicode|bytes)
+        """
+        from ._async import IterChunksAsync
+
+        return IterChunksAsync(self._iter_chunks(xml_header, encoding, pretty), chunk_size, encoding)
+
+    def awrite(self, writer, chunk_size=DEFAULT_BUFFER_SIZE, xml_header=False, encoding='utf-8', pretty=True):
+        """
+        Writes the resulting XML in an asyncio StreamWriter (Python 3 only):
+
+            await factory.awrite(writer)
+
+        Waits for `writer.drain()` after each chunk, so the writing respects the stream
+        backpressure, and gives the control back to the event loop between chunks.
+
+        :param asyncio.StreamWriter writer:
+            The stream (or any object with `write(bytes)` and a `drain()` coroutine).
+
+        :param unicode encoding:
+            The output encoding, declared in the xml header.
+
+        See aiter_chunks for the other parameters.
+        """
+        from ._async import WriteAsync
+
+        return WriteAsync(writer, self._iter_chunks(xml_header, encoding, pretty), chunk_size, encoding)
+
+    def get_contents_bytes(self, xml_header=False, encoding='utf-8', parallel=False, pretty=True, shaped=False):
+        """
+        Returns the resulting XML encoded, ready to be sent over a socket or written in a binary
+        file.
+
+        The output is encoded in chunks as it is generated (no intermediate unicode document).
+
+        :param unicode encoding:
+            The output encoding, declared in the xml header. Characters it can't represent are
+            written as character references.
+
+        :param bool|int parallel:
+            See print_.
+
+        :param bool pretty:
+        :param bool shaped:
+            See print_.
+
+        :return bytes:
+        """
+        oss = io.BytesIO()
+        self.write(oss, xml_header=xml_header, encoding=encoding, parallel=parallel, pretty=pretty, shaped=shaped)
+        return oss.getvalue()
+
+    def as_dict(self, dict_class=OrderedDict, attr_prefix='', lists=None, text_key='#text'):
         """
         Returns the data-structure as dict.
 
-        :return dict:
+        :param type dict_class:
+            The mapping type created for each element (ie. dict).
 
-        Code from: http://code.activestate.com/recipes/410469-xml-as-dictionary/
-        """
-
-        def xml_to_list(aList):
-            result = []
-            for element in aList:
-                if element:
-                    # treat like dict
-                    if len(element) == 1 or element[0].tag != element[1].tag:
-                        result.append(xml_to_dict(element))
-                    # treat like list
-                    elif element[0].tag == element[1].tag:
-                        result.append(xml_to_list(element))
-                elif element.text:
-                    text = element.text.strip()
-                    if text:
-                        result.append(text)
-            return result
-
-        def xml_to_dict(parent_element):
-            """
-            Example usage:
-
-            >>> tree = ElementTree.parse('your_file.xml')
-            >>> root = tree.getroot()
-            >>> xmldict = XmlDictConfig(root)
-
-            Or, if you want to use an XML string:
-
-            >>> root = ElementTree.XML(xml_string)
-            >>> xmldict = XmlDictConfig(root)
-
-            And then use xmldict for what it is... a dict.
-            """
-            def _dict(*values):
-                return OrderedDict(values)
-
-            result = _dict()
-            if parent_element.items():
-                result.update(dict(parent_element.items()))
-            for element in parent_element:
-                if element:
-                    # treat like dict - we assume that if the first two tags
-                    # in a series are different, then they are all different.
-                    if len(element) == 1 or element[0].tag != element[1].tag:
-                        aDict = xml_to_dict(element)
-                    # treat like list - we assume that if the first two tags
-                    # in a series are the same, then the rest are the same.
-                    else:
-                        # here, we put the list in dictionary; the key is the
-                        # tag name the list elements all share in common, and
-                        # the value is the list itself
-                        aDict = _dict((element[0].tag, xml_to_list(element)))
-                    # if the tag has attributes, add those to the dict
-                    if element.items():
-                        aDict.update(dict(element.items()))
-                    result.update(_dict((element.tag, aDict)))
-                # this assumes that if you've got an attribute in a tag,
-                # you won't be having any text. This may or may not be a
-                # good idea -- time will tell. It works for the way we are
-                # currently doing XML configuration files...
-                elif element.items():
-                    result.update(_dict((element.tag, OrderedDict(sorted(element.items())))))
-                # finally, if there are no child tags and no attributes, extract
-                # the text
-                else:
-                    result.update(_dict((element.tag, element.text)))
-            return result
+        :param unicode attr_prefix:
+            Prefix added to the attribute names.
+
+        :param None|bool|iterable(unicode) lists:
+            How lists are detected: None guesses from the first two children of each element (the
+            original behavior), True makes lists of repeated tags and an iterable of tags always
+            makes lists of children with these tags. See ElementToDict.
 
-        # return _elem2list(self.root, return_children=True)
-        return xml_to_dict(self.root)
+        :param unicode text_key:
+            Key for the text of elements with attributes or children (when `lists` is given).
 
-    def as_json(self):
+        :return dict:
+        """
+        return ElementToDict(self.root, dict_class, attr_prefix, lists, text_key)
+
+    def as_json(self, indent=None, ensure_ascii=True, attr_prefix='', lists=None, text_key='#text'):
         """
         Returns the data-structure as a JSON.
 
+        The JSON is encoded directly from the tree, without building the as_dict result.
+
+        :param None|int|unicode indent:
+            None for compact output, otherwise the indentation for each level (as in json.dumps).
+
+        :param bool ensure_ascii:
+            As in json.dumps.
+
+        See as_dict for the other parameters.
+
         :return unicode:
         """
-        import json
-        return json.dumps(self.as_dict())
+        return ''.join(IterElementJson(self.root, indent, ensure_ascii, attr_prefix, lists, text_key))
+
+    def write_json(self, oss, indent=None, ensure_ascii=True, attr_prefix='', lists=None, text_key='#text'):
+        """
+        Writes the data-structure as a JSON in the given stream, as it is encoded.
+
+        :param unicode|file oss:
+            A filename (written in utf-8) or a file-like object opened for writing text.
+
+        See as_json for the other parameters.
+        """
+        if isinstance(oss, six.string_types):
+            with io.open(oss, 'w', encoding='utf-8') as f:
+                WriteElementJson(f, self.root, indent, ensure_ascii, attr_prefix, lists, text_key)
+        else:
+            WriteElementJson(oss, self.root, indent, ensure_ascii, attr_prefix, lists, text_key)
+
+
+def _ColumnTexts(values, convert):
+    """
+    Converts a column of values for XmlFactory.append_rows.
+
+    :param sequence values:
+        A sequence or a NumPy array.
+
+    :param callable convert:
+        Converts a value to text (six.text_type for element texts, str for attributes).
+
+    :return list(unicode|None):
+        The texts (None for None values).
+    """
+    dtype = getattr(values, 'dtype', None)
+    if dtype is not None and getattr(values, 'ndim', None) == 1:
+        # NumPy array: tolist() gives Python objects formatted as the NumPy scalars are, except
+        # for floats other than float64 (formatted with their own precision by astype).
+        if dtype.kind in 'biu' or (dtype.kind == 'f' and dtype.itemsize == 8):
+            values = values.tolist()
+        elif dtype.kind != 'O':
+            return values.astype(six.text_type).tolist()
+        else:
+            values = values.tolist()
+    elif not isinstance(values, list):
+        values = list(values)
+    if None in values:
+        return [None if i is None else convert(i) for i in values]
+    return list(map(convert, values))
+
+
+def _StripWhitespace(root):
+    """
+    Drops the whitespace-only texts of the elements with children and the whitespace-only tails in
+    the tree of root (see XmlFactory.parse).
+    """
+    for i_element in root.iter():
+        tail = i_element.tail
+        if tail is not None and tail.isspace():
+            i_element.tail = None
+        text = i_element.text
+        if text is not None and len(i_element) and text.isspace():
+            i_element.text = None
+
+
+class _DocumentState(object):
+    """
+    State shared by a XmlFactory and its sub-factories: copy-on-write (see XmlFactory.fork) and
+    render cache (see XmlFactory.enable_render_cache).
+    """
+
+    __slots__ = ('root', 'owned', 'render', 'tracked')
+
+    def __init__(self, root):
+        # The root element of the document (changed when a fork copies it).
+        self.root = root
+        # Elements this document can change in place: None (all of them) until the first fork.
+        self.owned = None
+        # The RenderCache, if enabled.
+        self.render = None
+        # Whether paths are resolved by _obtain_steps_tracked (owned or render is set).
+        self.tracked = False
+
+
+class CompiledPath(object):
+    """
+    A pre-parsed XmlFactory path (see XmlFactory.compile).
+
+    Applies the path to XmlFactory instances (with the same semantics as `factory[path]`) or
+    directly to elements (ElementTree.Element or Node), without parsing it again.
+    """
+
+    __slots__ = ('path', '_steps', '_attr_name')
+
+    def __init__(self, path):
+        """
+        :param unicode path:
+            A XML path including or not an attribute definition.
+        """
+        self.path = path
+        self._steps, self._attr_name = _parse_path(path)
+
+    def __repr__(self):
+        return 'CompiledPath(%r)' % (self.path,)
+
+    def set(self, target, value):
+        """
+        Same as `target[path] = value`.
+
+        :param XmlFactory|Element|Node target:
+            The factory or the element the path is relative to.
+
+        :param unicode value:
+        """
+        if isinstance(target, XmlFactory):
+            element = target._obtain_steps(self._steps)
+        else:
+            element = self.element(target)
+        if self._attr_name is None:
+            element.text = six.text_type(value)
+        else:
+            element.set(self._attr_name, str(value))
+
+    def get(self, target):
+        """
+        Same as `target[path]`, creating the elements as necessary.
+
+        :param XmlFactory|Element|Node target:
+            The factory or the element the path is relative to.
+
+        :rtype: XmlFactory|Element|Node
+        :returns:
+            A XmlFactory for the element (for a XmlFactory target) or the element itself.
+        """
+        assert self._attr_name is None, 'The "at" (@) is used for attribute definitions'
+        if isinstance(target, XmlFactory):
+            return target._get_steps(self._steps)
+        return self.element(target)
+
+    def element(self, target):
+        """
+        Returns the element of the path (ignoring the attribute), creating the elements as
+        necessary.
+
+        :param XmlFactory|Element|Node target:
+            The factory or the element the path is relative to. Elements are looked up directly
+            (without the index of a XmlFactory backend).
+
+        :rtype: Element|Node
+        """
+        if isinstance(target, XmlFactory):
+            return target._obtain_steps(self._steps)
+        result = target
+        for i_tag, i_mode in self._steps:
+            parent = result
+            if i_mode == _APPEND:
+                result = None
+            else:
+                result = parent.find(i_tag)
+            if result is None:
+                if isinstance(parent, Node):
+                    result = Node(i_tag)
+                    parent.append(result)
+                else:
+                    result = _new_sub_element(parent, i_tag)
+        return result